@@ -0,0 +1,142 @@
+# app/ann_index.py
+
+from typing import Optional
+import math
+import os
+import faiss
+import numpy as np
+
+# ---------- Configuration ----------
+# flat | ivf_flat | ivf_pq | hnsw
+INDEX_BACKEND = os.getenv("INDEX_BACKEND", "flat")
+# Corpora smaller than this stay on exact flat search regardless of INDEX_BACKEND
+INDEX_REBUILD_THRESHOLD = int(os.getenv("INDEX_REBUILD_THRESHOLD", "50000"))
+TRAIN_SAMPLE_SIZE = int(os.getenv("INDEX_TRAIN_SAMPLE_SIZE", "100000"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = 4 * sqrt(N)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("PQ_M", "48"))  # sub-quantizers; must divide the embedding dim
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+BACKENDS = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# Upper bounds accepted for the per-query knobs; nprobe is further capped at the index's nlist
+MAX_NPROBE = 65536
+MAX_EF_SEARCH = 4096
+MIN_POINTS_PER_CENTROID = 39  # below this k-means training warns and degrades
+
+
+def new_index(dim: int) -> faiss.Index:
+    """Empty exact index addressed by row id."""
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+
+def backend_of(index: faiss.Index) -> str:
+    """Which of BACKENDS an index was built as ("legacy" for un-mapped flat files)."""
+    is_mapped = isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+    inner = faiss.downcast_index(index.index) if is_mapped else index
+    if isinstance(index, faiss.IndexFlat):
+        return "legacy"
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    return "flat"
+
+
+def target_backend(n_vectors: int, backend: str = None) -> str:
+    backend = backend or INDEX_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown index backend {backend!r}; expected one of {BACKENDS}")
+    return backend if n_vectors >= INDEX_REBUILD_THRESHOLD else "flat"
+
+
+def needs_rebuild(index: faiss.Index, n_vectors: int, backend: str = None) -> bool:
+    """True when the corpus size calls for a different backend or a retrained IVF."""
+    current = backend_of(index)
+    target = target_backend(n_vectors, backend)
+    if current != target:
+        return True
+    if target.startswith("ivf") and not IVF_NLIST:
+        # retrain once the corpus has outgrown the centroid count it was trained for
+        nlist = faiss.extract_index_ivf(index).nlist
+        return _auto_nlist(n_vectors) >= 2 * nlist
+    return False
+
+
+def _auto_nlist(n_vectors: int) -> int:
+    nlist = IVF_NLIST or int(4 * math.sqrt(max(n_vectors, 1)))
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID or 1))
+
+
+def build_index(dim: int, vectors: np.ndarray, ids: np.ndarray, backend: str = None) -> faiss.Index:
+    """
+    Build an index of the requested backend over vectors/ids.
+    Trainable backends are trained on a random sample of at most TRAIN_SAMPLE_SIZE vectors.
+    """
+    backend = target_backend(len(vectors), backend)
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    ids = np.ascontiguousarray(ids, dtype="int64")
+
+    if backend == "flat":
+        index = new_index(dim)
+    elif backend == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, HNSW_M)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        hnsw.hnsw.efSearch = HNSW_EF_SEARCH
+        index = faiss.IndexIDMap2(hnsw)
+    else:
+        nlist = _auto_nlist(len(vectors))
+        quantizer = faiss.IndexFlatL2(dim)
+        if backend == "ivf_pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, PQ_NBITS)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        index.nprobe = min(IVF_NPROBE, nlist)
+        # hashtable direct map lets reconstruct()/remove_ids() address vectors by arbitrary id
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index.train(_training_sample(vectors))
+        # keep the quantizer alive as long as the index (SWIG does not own it)
+        index.own_fields = True
+        quantizer.this.disown()
+
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def _training_sample(vectors: np.ndarray) -> np.ndarray:
+    if len(vectors) <= TRAIN_SAMPLE_SIZE:
+        return vectors
+    rng = np.random.default_rng(0)
+    pick = rng.choice(len(vectors), TRAIN_SAMPLE_SIZE, replace=False)
+    return vectors[np.sort(pick)]
+
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, sel=None):
+    """SearchParameters carrying per-query knobs for whatever backend `index` is."""
+    backend = backend_of(index)
+    if backend.startswith("ivf"):
+        ivf = faiss.extract_index_ivf(index)
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(nprobe, ivf.nlist) if nprobe is not None else ivf.nprobe
+    elif backend == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search if ef_search is not None else HNSW_EF_SEARCH
+    else:
+        params = faiss.SearchParameters()
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+           sel=None):
+    """index.search with runtime nprobe/efSearch and an optional IDSelector. Returns (distances, ids) like faiss."""
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    if backend_of(index) == "legacy":
+        return index.search(queries, k)
+    return index.search(queries, k, params=search_params(index, nprobe, ef_search, sel=sel))
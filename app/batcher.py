@@ -0,0 +1,137 @@
+# app/batcher.py
+
+from collections import deque
+from typing import Callable, List, Any, Dict
+import asyncio
+import time
+import os
+import numpy as np
+from workers import run_cpu
+import metrics
+
+# ---------- Configuration ----------
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+# How long the first request of a batch waits for company; 0 disables batching
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into one call of `process_batch`.
+
+    submit() enqueues an item and awaits its result. A collector task takes the
+    first waiting item, gathers more for up to `window_ms` or until `max_size`
+    items, runs `process_batch(items) -> results` on the CPU pool and fans the
+    results back out. A result that is an exception fails only its own
+    request; process_batch raising fails the whole batch. Batches are
+    dispatched without waiting for the previous one to finish, so collection
+    and processing overlap. Stages of a batch are recorded in the trace of
+    every sampled request in it.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_size: int = QUERY_BATCH_MAX_SIZE,
+                 window_ms: float = QUERY_BATCH_WINDOW_MS, name: str = "batcher"):
+        self.process_batch = process_batch
+        self.max_size = max(1, max_size)
+        self.window = window_ms / 1000.0
+        self.name = name
+        self._queue = None
+        self._collector = None
+        self._in_flight = set()
+        # metrics
+        self.batches = 0
+        self.items = 0
+        self.size_histogram = {b: 0 for b in BATCH_SIZE_BUCKETS}
+        self.size_histogram["+Inf"] = 0
+        self._recent_delays = deque(maxlen=2048)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_size > 1
+
+    async def submit(self, item):
+        if not self.enabled:
+            result = await run_cpu(self.process_batch, [item])
+            self._record(1, [0.0], [None])
+            if isinstance(result[0], Exception):
+                raise result[0]
+            return result[0]
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter(), metrics.current_trace()))
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch):
+        dispatched = time.perf_counter()
+        self._record(len(batch), [dispatched - enqueued for _, _, enqueued, _ in batch],
+                     [trace for _, _, _, trace in batch])
+        traces = [trace for _, _, _, trace in batch if trace is not None]
+        try:
+            # the collector task inherited the context of whichever request started it
+            with metrics.use_trace(metrics.TraceGroup(traces) if traces else None):
+                results = await run_cpu(self.process_batch, [item for item, _, _, _ in batch])
+        except Exception as e:
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _record(self, size: int, delays: List[float], traces: List):
+        self.batches += 1
+        self.items += size
+        bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), "+Inf")
+        self.size_histogram[bucket] += 1
+        self._recent_delays.extend(delays)
+        if not metrics.METRICS_ENABLED:
+            return
+        now = time.perf_counter()
+        for delay, trace in zip(delays, traces):
+            metrics.STAGE_SECONDS.observe(delay, stage=f"{self.name}_queue_wait")
+            if trace is not None:
+                trace.add_span(f"{self.name}_queue_wait", now - delay, delay, batch=size)
+
+    def stats(self) -> Dict:
+        delays_ms = np.array(self._recent_delays) * 1000 if self._recent_delays else np.zeros(1)
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "max_size": self.max_size,
+            "window_ms": self.window * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in self.size_histogram.items()},
+            "queue_delay_ms": {
+                "mean": round(float(delays_ms.mean()), 3),
+                "p50": round(float(np.percentile(delays_ms, 50)), 3),
+                "p95": round(float(np.percentile(delays_ms, 95)), 3),
+                "max": round(float(delays_ms.max()), 3),
+            },
+        }
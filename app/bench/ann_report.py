@@ -0,0 +1,108 @@
+# app/bench/ann_report.py
+"""
+Recall-vs-latency report for the ANN index backends against exact flat search.
+
+    python bench/ann_report.py                      # synthetic 100k x 384 corpus
+    python bench/ann_report.py --from-store         # vectors stored in database/metadata
+    python bench/ann_report.py --n 500000 --out ann_report.json
+
+For every backend and every nprobe / efSearch setting it reports recall@k
+(fraction of the exact top-k found) and mean / p95 per-query latency.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ann_index  # noqa: E402
+
+NPROBE_GRID = [1, 4, 8, 16, 32, 64]
+EF_SEARCH_GRID = [16, 32, 64, 128, 256]
+
+
+def synthetic_corpus(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered, L2-normalized vectors, closer to sentence embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 500), dim)).astype("float32")
+    x = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def stored_corpus(dim: int) -> np.ndarray:
+    from global_resources import META_DIR
+    from metadata_store import MetadataStore
+    store = MetadataStore(META_DIR, dim)
+    store.load()
+    return np.ascontiguousarray(store.vectors())
+
+
+def timed_search(index, queries, k, **knobs):
+    latencies = []
+    ids = []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, I = ann_index.search(index, q[None, :], k, **knobs)
+        latencies.append(time.perf_counter() - t0)
+        ids.append(I[0])
+    lat_ms = np.array(latencies) * 1000
+    return np.vstack(ids), float(lat_ms.mean()), float(np.percentile(lat_ms, 95))
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--from-store", action="store_true")
+    parser.add_argument("--backends", default=",".join(ann_index.BACKENDS[1:]))
+    parser.add_argument("--out", default=None, help="write the report as JSON here")
+    args = parser.parse_args()
+
+    x = stored_corpus(args.dim) if args.from_store else synthetic_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = x[rng.choice(len(x), args.queries, replace=False)] + 0.05 * rng.standard_normal((args.queries, x.shape[1])).astype("float32")
+    ids = np.arange(len(x))
+
+    flat = ann_index.build_index(x.shape[1], x, ids, backend="flat")
+    truth, flat_mean, flat_p95 = timed_search(flat, queries, args.k)
+    rows = [{"backend": "flat", "knob": None, "recall": 1.0, "mean_ms": flat_mean, "p95_ms": flat_p95, "build_s": 0.0}]
+
+    # build every requested backend even below the configured rebuild threshold
+    ann_index.INDEX_REBUILD_THRESHOLD = 0
+    for backend in args.backends.split(","):
+        t0 = time.perf_counter()
+        index = ann_index.build_index(x.shape[1], x, ids, backend=backend)
+        build_s = time.perf_counter() - t0
+        if backend == "hnsw":
+            grid = [("ef_search", v) for v in EF_SEARCH_GRID]
+        else:
+            nlist = ann_index.faiss.extract_index_ivf(index).nlist
+            grid = [("nprobe", v) for v in NPROBE_GRID if v <= nlist]
+        for knob, value in grid:
+            found, mean_ms, p95_ms = timed_search(index, queries, args.k, **{knob: value})
+            rows.append({"backend": backend, "knob": f"{knob}={value}", "recall": recall(found, truth),
+                         "mean_ms": mean_ms, "p95_ms": p95_ms, "build_s": build_s})
+
+    print(f"corpus={len(x)} dim={x.shape[1]} queries={args.queries} k={args.k}")
+    print(f"{'backend':<10}{'knob':<16}{'recall@k':>10}{'mean ms':>10}{'p95 ms':>10}{'build s':>10}")
+    for r in rows:
+        print(f"{r['backend']:<10}{r['knob'] or '-':<16}{r['recall']:>10.3f}{r['mean_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['build_s']:>10.1f}")
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"n": len(x), "dim": x.shape[1], "k": args.k, "results": rows}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# app/bench/chunker_bench.py
+"""
+Chunking throughput: offset-mapping chunker vs the previous decode-per-window one.
+
+    python bench/chunker_bench.py                       # synthetic 2 MB document
+    python bench/chunker_bench.py --mb 20 --docs 8      # several large documents, batched
+    python bench/chunker_bench.py --pdf big.pdf --out chunker_bench.json
+
+Reports MB/s and chunks/s per implementation, and how many chunks are exact
+substrings of the source text (decoded chunks are normalized by the tokenizer).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import chunker  # noqa: E402
+
+WORDS = ("retrieval index embedding vector query latency throughput tokenizer document "
+         "section paragraph budget shard replica cache policy invoice contract Q3 2024 "
+         "revenue e-mail naïve résumé").split()
+
+
+def synthetic_document(mb: float, seed: int = 0) -> str:
+    """Sentences, paragraphs and headings until the text reaches `mb` megabytes."""
+    rng = np.random.default_rng(seed)
+    parts, size, section = [], 0, 1
+    while size < mb * 1_000_000:
+        if rng.random() < 0.05:
+            block = f"\n\n{section}. Section heading {section}\n"
+            section += 1
+        else:
+            sentences = [" ".join(rng.choice(WORDS, rng.integers(6, 24))).capitalize() + "."
+                         for _ in range(rng.integers(2, 8))]
+            block = "\n\n" + " ".join(sentences)
+        parts.append(block)
+        size += len(block)
+    return "".join(parts)
+
+
+def run(name, fn, texts):
+    started = time.perf_counter()
+    chunks = fn(texts)
+    seconds = time.perf_counter() - started
+    mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    flat = [c for doc in chunks for c in doc]
+    exact = sum(1 for t, doc_chunks in zip(texts, chunks) for c, _, _ in doc_chunks if c in t)
+    result = {"impl": name, "seconds": round(seconds, 3), "mb_per_s": round(mb / seconds, 2),
+              "chunks": len(flat), "chunks_per_s": round(len(flat) / seconds, 1),
+              "exact_substring_pct": round(100.0 * exact / max(1, len(flat)), 1)}
+    print(f"{name:>16}: {result['seconds']:>8.3f}s  {result['mb_per_s']:>7.2f} MB/s  "
+          f"{result['chunks']:>6} chunks  {result['exact_substring_pct']:>5.1f}% exact")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=2.0, help="size of each synthetic document")
+    parser.add_argument("--docs", type=int, default=1)
+    parser.add_argument("--pdf", help="benchmark on the text of this PDF instead")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.pdf:
+        from pdf_extract import extract_text_from_pdf_bytes
+        with open(args.pdf, "rb") as fh:
+            texts = [extract_text_from_pdf_bytes(fh.read())]
+    else:
+        texts = [synthetic_document(args.mb, seed=i) for i in range(args.docs)]
+    print(f"{len(texts)} document(s), {sum(len(t) for t in texts) / 1e6:.1f}M chars")
+
+    results = [
+        run("decode", lambda ts: [chunker.chunk_text_by_decode(t) for t in ts], texts),
+        run("offsets", lambda ts: [chunker.chunk_text_token_level(t, boundaries="token") for t in ts], texts),
+        run("offsets+batch", lambda ts: chunker.chunk_texts(ts, boundaries="token"), texts),
+        run("sentence", lambda ts: chunker.chunk_texts(ts, boundaries="sentence"), texts),
+    ]
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"documents": len(texts), "chars": sum(len(t) for t in texts), "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# app/bench/connector_bench.py
+"""
+Connector download throughput against local stand-in servers (no network):
+pooled keep-alive session vs a new connection per request, with injected
+latency (per request and per connection handshake), 503s and 429s.
+
+    python bench/connector_bench.py
+    python bench/connector_bench.py --docs 500 --workers 16 --latency 0.02 --throttle-rate 0.05
+    python bench/connector_bench.py --out connector_bench.json
+
+Checks every document arrives intact despite the faults, and reports docs/s,
+MB/s, retries and TCP connections opened per connector.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import http_pool  # noqa: E402
+from connectors import DriveConnector, NotionConnector, SupabaseStorageConnector, GOOGLE_DOC_MIME  # noqa: E402
+from standin_servers import StandinCorpus, StandinServers  # noqa: E402
+
+WORDS = "retrieval index embedding vector query latency throughput invoice contract manual printer".split()
+
+
+def build_corpus(docs: int, kb: int, seed: int = 0) -> StandinCorpus:
+    rng = np.random.default_rng(seed)
+
+    def text(n_bytes):
+        return " ".join(rng.choice(WORDS, max(1, n_bytes // 8)))
+
+    drive = []
+    for i in range(docs):
+        if i % 2:
+            drive.append({"id": f"f{i}", "name": f"file{i}.pdf", "mimeType": "application/pdf",
+                          "modifiedTime": "2024-01-01T00:00:00Z", "content": rng.bytes(kb * 1024)})
+        else:
+            drive.append({"id": f"f{i}", "name": f"doc{i}", "mimeType": GOOGLE_DOC_MIME,
+                          "modifiedTime": "2024-01-01T00:00:00Z", "content": text(kb * 1024).encode()})
+    notion = {f"page-{i:05d}": [text(512) for _ in range(max(1, kb * 2))] for i in range(docs)}
+    objects = {f"manuals/m{i}.pdf": rng.bytes(kb * 1024) for i in range(docs)}
+    return StandinCorpus(drive, notion, "Pdfs", objects)
+
+
+def expected(connector, corpus: StandinCorpus):
+    """id -> bytes each connector should return."""
+    if isinstance(connector, DriveConnector):
+        return {f["id"]: f["content"] for f in corpus.drive_files}
+    if isinstance(connector, NotionConnector):
+        return {i: "\n".join(texts).encode() for i, texts in corpus.notion_pages.items()}
+    return dict(corpus.objects)
+
+
+def run(name, make_connector, corpus, servers, workers, pooled):
+    connector = make_connector()
+    if not pooled:
+        # previous behaviour: a fresh client (and TCP connection) for every request
+        connector.client.session = requests.Session
+    before = servers.stats()
+    metrics_before = connector.metrics.stats()
+    started = time.perf_counter()
+    refs = list(connector.list_documents())
+    want = expected(connector, corpus)
+    ok = failed = 0
+    n_bytes = 0
+    for ref, doc in connector.fetch_many(refs, workers=workers):
+        if isinstance(doc, Exception):
+            failed += 1
+            continue
+        got = doc.content if doc.content is not None else doc.text.encode()
+        ok += got == want[ref.id]
+        n_bytes += len(got)
+    seconds = time.perf_counter() - started
+    after, metrics = servers.stats(), connector.metrics.stats()
+    result = {"connector": name, "pooled": pooled, "documents": len(refs), "intact": ok, "failed": failed,
+              "seconds": round(seconds, 3), "docs_per_s": round(len(refs) / seconds, 1),
+              "mb_per_s": round(n_bytes / 2 ** 20 / seconds, 2),
+              "requests": after["requests"] - before["requests"],
+              "connections": after["connections"] - before["connections"],
+              "retries": metrics["retries"] - metrics_before["retries"],
+              "throttled": metrics["throttled"] - metrics_before["throttled"]}
+    print(f"{name:>9} {'pooled' if pooled else 'fresh':>6}: {result['seconds']:>7.2f}s  "
+          f"{result['docs_per_s']:>7.1f} docs/s  {result['mb_per_s']:>6.2f} MB/s  "
+          f"{result['intact']}/{len(refs)} intact  {result['retries']:>4} retries  "
+          f"{result['connections']:>5} connections")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200, help="documents per connector")
+    parser.add_argument("--kb", type=int, default=64, help="size of each document")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every response")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="seconds added to every new connection")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of requests answered 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="share of requests answered 429")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+    # injected faults should cost milliseconds, not the production backoff
+    http_pool.HTTP_BACKOFF_BASE = 0.01
+
+    corpus = build_corpus(args.docs, args.kb)
+    results = []
+    with StandinServers(corpus, latency=args.latency, error_rate=args.error_rate,
+                        throttle_rate=args.throttle_rate, retry_after=0.05,
+                        connect_latency=args.connect_latency) as servers:
+        connectors = {
+            "drive": lambda: DriveConnector({"refresh_token": "r", "client_id": "c", "client_secret": "s",
+                                             "token_uri": servers.token_url}, query="trashed=false",
+                                            base_url=servers.drive_url),
+            "notion": lambda: NotionConnector("key", "db", base_url=servers.notion_url),
+            "supabase": lambda: SupabaseStorageConnector(prefix="manuals", url=servers.supabase_url, key="key"),
+        }
+        for name, make in connectors.items():
+            for pooled in (False, True):
+                results.append(run(name, make, corpus, servers, args.workers, pooled))
+        server_stats = servers.stats()
+    lost = [r for r in results if r["intact"] != r["documents"]]
+    print("PASS" if not lost else f"FAIL: {len(lost)} run(s) lost documents")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"args": vars(args), "server": server_stats, "connectors": http_pool.all_connector_stats(),
+                       "results": results}, fh, indent=2)
+    sys.exit(1 if lost else 0)
+
+
+if __name__ == "__main__":
+    main()
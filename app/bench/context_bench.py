@@ -0,0 +1,151 @@
+# app/bench/context_bench.py
+"""
+Prompt size and build time: the previous context (every hit's metadata dict
+dumped as text) vs the token-budgeted context builder, on a throwaway store.
+
+    python bench/context_bench.py                                  # 40 docs, 200 queries, top-4 hits
+    python bench/context_bench.py --top-k 8 --budget 1600 --out context_bench.json
+    LLM_BACKEND=gemini python bench/context_bench.py --llm-calls 20  # also time real answers
+
+Questions are sentences taken from the documents, so hits cluster in
+neighbouring (overlapping) chunks the way real questions about one section
+do. Reports prompt tokens and characters, duplicated tokens sent, context
+build time, and (with --llm-calls) answer latency per variant and the
+change against the previous prompt.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import context_builder  # noqa: E402
+import global_resources  # noqa: E402
+import llm  # noqa: E402
+from index_store import IndexStore  # noqa: E402
+from ingest_pipeline import ingest_documents  # noqa: E402
+from routers.main import assistant, compose_prompt, search_query  # noqa: E402
+
+WORDS = ("retrieval index embedding vector query latency throughput tokenizer document section paragraph "
+         "budget shard replica cache policy invoice contract revenue refund printer warranty customer "
+         "support account region quarterly report error firmware").split()
+
+
+def synthetic_documents(n: int, sentences: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    docs = []
+    for d in range(n):
+        text = " ".join(" ".join(rng.choice(WORDS, rng.integers(8, 20))).capitalize() + f" (doc {d} s{s})."
+                        for s in range(sentences))
+        docs.append({"id": f"doc{d}", "name": f"manual-{d}.pdf", "mimeType": "application/pdf", "text": text})
+    return docs
+
+
+def legacy_prompt(query: str, rows) -> str:
+    """compose_prompt() as it was: each hit's metadata dict as text."""
+    return compose_prompt(query, "\n\n".join(f"{row}" for row in rows))
+
+
+def duplicated_tokens(rows) -> int:
+    """Tokens sent more than once because hits of one document overlap."""
+    by_doc = {}
+    for row in rows:
+        by_doc.setdefault(row["doc_id"], []).append((row["start_token"], row["end_token"]))
+    total = sum(end - start for spans in by_doc.values() for start, end in spans)
+    covered = 0
+    for spans in by_doc.values():
+        reach = None
+        for start, end in sorted(spans):
+            if reach is None or start >= reach:
+                covered, reach = covered + end - start, end
+            elif end > reach:
+                covered, reach = covered + end - reach, end
+    return total - covered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--sentences", type=int, default=200, help="sentences per document")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--budget", type=int, default=context_builder.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--neighbors", type=int, default=max(1, context_builder.CONTEXT_EXPAND_NEIGHBORS))
+    parser.add_argument("--llm-calls", type=int, default=0, help="answers generated per variant (LLM_BACKEND)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="context-bench-")
+    store = IndexStore(os.path.join(tmp, "faiss_index.bin"), os.path.join(tmp, "metadata"), global_resources.EMBED_DIM)
+    store.load()
+    docs = synthetic_documents(args.docs, args.sentences, args.seed)
+    report = ingest_documents(docs, store=store, use_process_pool=False)
+    snapshot = store.snapshot()
+    print(f"🔹 {report.chunks} chunks from {len(docs)} documents in {tmp}")
+
+    rng = np.random.default_rng(args.seed + 1)
+    tokenizer = global_resources.get_tokenizer()
+    variants = {"previous": None, "merged": 0, "merged+neighbors": args.neighbors}
+    prompts = {name: [] for name in variants}
+    build_seconds = {name: [] for name in variants}
+    extra = {name: {"hits_dropped": 0, "neighbors_added": 0} for name in variants}
+    dup_tokens = 0
+    for _ in range(args.queries):
+        doc = docs[rng.integers(len(docs))]["text"].split(". ")
+        q = doc[rng.integers(len(doc))]
+        rows = search_query(q, top_k=args.top_k, snapshot=snapshot, mode="hybrid")
+        dup_tokens += duplicated_tokens(rows)
+        for name, neighbors in variants.items():
+            started = time.perf_counter()
+            if neighbors is None:
+                prompt = legacy_prompt(q, rows)
+            else:
+                context = context_builder.build_context(rows, snapshot, budget=args.budget, neighbors=neighbors)
+                prompt = compose_prompt(q, context.text())
+                extra[name]["hits_dropped"] += context.hits_dropped
+                extra[name]["neighbors_added"] += context.neighbors_added
+            build_seconds[name].append(time.perf_counter() - started)
+            prompts[name].append((q, prompt))
+
+    results = {}
+    for name in variants:
+        tokens = [len(tokenizer.encode(p, add_special_tokens=False)) for _, p in prompts[name]]
+        ms = np.array(build_seconds[name]) * 1000
+        results[name] = {"prompt_tokens_mean": round(float(np.mean(tokens)), 1),
+                         "prompt_tokens_p95": round(float(np.percentile(tokens, 95)), 1),
+                         "prompt_chars_mean": round(float(np.mean([len(p) for _, p in prompts[name]])), 1),
+                         "build_p50_ms": round(float(np.percentile(ms, 50)), 4),
+                         "build_p95_ms": round(float(np.percentile(ms, 95)), 4), **extra[name]}
+        if args.llm_calls:
+            latencies = []
+            for _, prompt in prompts[name][:args.llm_calls]:
+                started = time.perf_counter()
+                asyncio.run(llm.agenerate(assistant, prompt))
+                latencies.append(time.perf_counter() - started)
+            results[name]["llm_mean_ms"] = round(1000 * float(np.mean(latencies)), 1)
+    base = results["previous"]
+    for name, r in results.items():
+        r["prompt_tokens_change_pct"] = round(100 * (r["prompt_tokens_mean"] / base["prompt_tokens_mean"] - 1), 1)
+        if "llm_mean_ms" in r:
+            r["llm_latency_change_pct"] = round(100 * (r["llm_mean_ms"] / base["llm_mean_ms"] - 1), 1)
+        print(f"{name:>17}: {r['prompt_tokens_mean']:>7.1f} tokens ({r['prompt_tokens_change_pct']:+.1f}%)  "
+              f"{r['prompt_chars_mean']:>8.1f} chars  build p50 {r['build_p50_ms']:.3f} ms"
+              + (f"  LLM {r['llm_mean_ms']:.0f} ms ({r['llm_latency_change_pct']:+.1f}%)" if "llm_mean_ms" in r else ""))
+    print(f"duplicated (overlapping) hit tokens per query before merging: {dup_tokens / args.queries:.1f}")
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"args": vars(args), "llm_backend": llm.LLM_BACKEND, "chunks": report.chunks,
+                       "duplicated_tokens_per_query": round(dup_tokens / args.queries, 1), "results": results},
+                      fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
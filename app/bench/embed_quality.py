@@ -0,0 +1,111 @@
+# app/bench/embed_quality.py
+"""
+Quality + speed check of an embedding backend against the fp32 PyTorch baseline.
+
+    python bench/embed_quality.py --backend onnx_int8
+    python bench/embed_quality.py --backend onnx --from-store --k 10 --out embed_quality.json
+
+Reports per-text cosine agreement with the baseline embeddings, retrieval
+overlap@k (share of the baseline's top-k the candidate also returns for the
+same query), and encode throughput. Exits non-zero when the candidate falls
+below --min-cosine / --min-overlap, so it can gate switching EMBED_BACKEND.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import embedder  # noqa: E402
+from global_resources import MODEL_NAME, META_DIR, EMBED_DIM  # noqa: E402
+
+WORDS = ("the quarterly revenue report shows growth in cloud services while hardware sales declined "
+         "customers asked about refund policy shipping delays invoice errors and account access "
+         "our onboarding guide explains how to configure single sign on and rotate api keys").split()
+
+
+def synthetic_texts(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # mix of short (query-like) and long (chunk-like) texts to exercise length bucketing
+    return [" ".join(rng.choice(WORDS, rng.integers(4, 300 if i % 3 else 20))) for i in range(n)]
+
+
+def stored_texts(n: int, seed: int = 0):
+    from metadata_store import MetadataStore
+    store = MetadataStore(META_DIR, EMBED_DIM)
+    store.load()
+    live = store.live_rows(len(store))
+    if not len(live):
+        raise SystemExit("no chunks in the metadata store")
+    rows = np.random.default_rng(seed).choice(live, min(n, len(live)), replace=False)
+    return [store.text(int(r)) for r in rows]
+
+
+def timed_encode(model, texts):
+    model.encode(texts[:8])  # warm-up
+    started = time.perf_counter()
+    embs = model.encode(texts)
+    return embs, time.perf_counter() - started
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="onnx_int8", choices=embedder.BACKENDS)
+    parser.add_argument("--baseline", default="torch", choices=embedder.BACKENDS)
+    parser.add_argument("--n", type=int, default=2000, help="corpus texts")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=embedder.EMBED_THREADS)
+    parser.add_argument("--from-store", action="store_true", help="use stored chunk texts instead of synthetic ones")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="required mean cosine agreement")
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="required mean overlap@k")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    texts = stored_texts(args.n) if args.from_store else synthetic_texts(args.n)
+    rng = np.random.default_rng(1)
+    # queries: leading words of random corpus texts
+    queries = [" ".join(texts[i].split()[:12]) for i in rng.integers(0, len(texts), args.queries)]
+
+    results = {"model": MODEL_NAME, "texts": len(texts), "queries": len(queries), "k": args.k}
+    embs = {}
+    for name in (args.baseline, args.backend):
+        model = embedder.create_embedder(MODEL_NAME, backend=name, threads=args.threads)
+        corpus, seconds = timed_encode(model, texts)
+        q, _ = timed_encode(model, queries)
+        embs[name] = (corpus, q)
+        results[name] = {"seconds": round(seconds, 3), "texts_per_s": round(len(texts) / seconds, 1)}
+        print(f"{name:>10}: {seconds:.3f}s  {len(texts) / seconds:.1f} texts/s")
+
+    base_corpus, base_q = embs[args.baseline]
+    cand_corpus, cand_q = embs[args.backend]
+    cos = np.sum(base_corpus * cand_corpus, axis=1) / (
+        np.linalg.norm(base_corpus, axis=1) * np.linalg.norm(cand_corpus, axis=1))
+    base_top, cand_top = top_k(base_corpus, base_q, args.k), top_k(cand_corpus, cand_q, args.k)
+    overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(base_top, cand_top)])
+    top1 = float(np.mean(base_top[:, 0] == cand_top[:, 0]))
+    results["agreement"] = {
+        "cosine_mean": round(float(cos.mean()), 5), "cosine_p01": round(float(np.percentile(cos, 1)), 5),
+        "cosine_min": round(float(cos.min()), 5), f"overlap@{args.k}": round(float(overlap), 4),
+        "top1_agreement": round(top1, 4),
+        "speedup": round(results[args.baseline]["seconds"] / results[args.backend]["seconds"], 2),
+    }
+    passed = cos.mean() >= args.min_cosine and overlap >= args.min_overlap
+    results["passed"] = bool(passed)
+    print(json.dumps(results["agreement"], indent=2))
+    print("PASS" if passed else "FAIL")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(results, fh, indent=2)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
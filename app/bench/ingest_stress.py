@@ -0,0 +1,167 @@
+# app/bench/ingest_stress.py
+"""
+Stress test: parallel ingest jobs and queries against one IndexStore.
+
+    python bench/ingest_stress.py                         # 16 jobs x 20 docs, 8 query threads
+    python bench/ingest_stress.py --jobs 64 --job-workers 4 --delete-every 5 --out stress.json
+
+Ingests go through the same JobQueue + IngestPipeline as /fetchData and
+/pdfData, into a throwaway store in a temp dir; query threads search
+snapshots the whole time. Embeddings come from a deterministic hash so the
+run measures the store, not the model. Afterwards it checks that:
+
+  - every job succeeded and no query raised,
+  - every query hit (vector and BM25) was a row of the snapshot it searched,
+  - the live chunk count equals the chunks ingested minus the ones deleted,
+  - every ingested chunk_id resolves, and each document can find itself
+    by vector and by keyword,
+  - a fresh load from disk sees exactly the same corpus.
+
+Exits non-zero on any violation.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from global_resources import EMBED_DIM  # noqa: E402
+from index_store import IndexStore  # noqa: E402
+from ingest_pipeline import ingest_documents  # noqa: E402
+from jobs import JobQueue  # noqa: E402
+
+
+def hash_embed(texts):
+    out = np.empty((len(texts), EMBED_DIM), dtype="float32")
+    for i, t in enumerate(texts):
+        seed = int.from_bytes(hashlib.sha1(t.encode("utf-8")).digest()[:8], "little")
+        out[i] = np.random.default_rng(seed).standard_normal(EMBED_DIM)
+    return out
+
+
+def make_docs(job: int, n: int):
+    return [{"id": f"job{job}-doc{i}", "name": f"doc {i}", "mimeType": "text/plain",
+             "text": f"job {job} document {i} " + " ".join(f"w{job}_{i}_{j}" for j in range(40))}
+            for i in range(n)]
+
+
+def open_store(root: str) -> IndexStore:
+    store = IndexStore(os.path.join(root, "faiss_index.bin"), os.path.join(root, "metadata"), EMBED_DIM)
+    store.load()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=16)
+    parser.add_argument("--docs", type=int, default=20, help="documents per job")
+    parser.add_argument("--job-workers", type=int, default=2, help="ingest jobs running at once")
+    parser.add_argument("--query-threads", type=int, default=8)
+    parser.add_argument("--delete-every", type=int, default=0, help="every Nth job deletes the previous job's docs")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="ingest-stress-")
+    store = open_store(root)
+    queue = JobQueue(workers=args.job_workers, name="stress-job")
+    stop = threading.Event()
+    errors, violations = [], []
+    query_latencies = []
+    probe = hash_embed(["probe query"])
+
+    def querier():
+        while not stop.is_set():
+            snapshot = store.snapshot()
+            started = time.perf_counter()
+            try:
+                _, ids = snapshot.search(probe, 10)
+            except Exception as e:
+                errors.append(f"query: {e}")
+                continue
+            query_latencies.append(time.perf_counter() - started)
+            rows, _ = snapshot.lexical_search("document w3_1_1", 10)
+            for row in list(ids[0]) + list(rows):
+                if row >= len(snapshot.metadata):
+                    violations.append(f"query returned row {row} outside snapshot v{snapshot.version}")
+
+    def ingest(job_no):
+        def run(job):
+            try:
+                report = ingest_documents(make_docs(job_no, args.docs), store=store, embed_fn=hash_embed,
+                                          use_process_pool=False, flush_chunks=16, embed_batch=8,
+                                          on_progress=lambda r: job.update(r.as_dict()))
+                if args.delete_every and job_no % args.delete_every == 0 and job_no > 0:
+                    done[job_no - 1].wait()
+                    store.delete_docs([d["id"] for d in make_docs(job_no - 1, args.docs)])
+                return {"chunks_added": report.vectors_added}
+            finally:
+                done[job_no].set()
+        return run
+
+    readers = [threading.Thread(target=querier, daemon=True) for _ in range(args.query_threads)]
+    for t in readers:
+        t.start()
+    started = time.time()
+    done = [threading.Event() for _ in range(args.jobs)]
+    submitted = [queue.submit("stress", ingest(i)) for i in range(args.jobs)]
+    while any(j.finished_at is None for j in submitted):
+        time.sleep(0.05)
+    seconds = time.time() - started
+    stop.set()
+    for t in readers:
+        t.join()
+
+    failed = [j.as_dict() for j in submitted if j.status != "succeeded"]
+    deleted_jobs = {i - 1 for i in range(1, args.jobs) if args.delete_every and i % args.delete_every == 0}
+    expected_docs = [d for i in range(args.jobs) if i not in deleted_jobs for d in make_docs(i, args.docs)]
+    added = sum(j.result["chunks_added"] for j in submitted if j.result)
+    snapshot = store.snapshot()
+
+    missing = []
+    for doc in expected_docs:
+        rows = store.metadata_store.rows_for_docs([doc["id"]])
+        if not len(rows) or store.metadata_store.row_for_chunk(f"{doc['id']}__0") is None:
+            missing.append(doc["id"])
+            continue
+        _, ids = snapshot.search(hash_embed([store.metadata_store.text(int(rows[0]))]), 1)
+        if ids[0][0] not in rows:
+            violations.append(f"{doc['id']} does not find itself")
+        job_no, doc_no = doc["id"][3:].split("-doc")
+        hits, _ = snapshot.lexical_search(f"w{job_no}_{doc_no}_0", 1)
+        if not len(hits) or hits[0] not in rows:
+            violations.append(f"{doc['id']} does not find itself by keyword")
+    expected_chunks = sum(len(store.metadata_store.rows_for_docs([d["id"]])) for d in expected_docs)
+    if snapshot.total_chunks != expected_chunks:
+        violations.append(f"total_chunks {snapshot.total_chunks} != {expected_chunks} live chunks of expected docs")
+
+    store.rebuild(wait=True)
+    reloaded = open_store(root).snapshot()
+    if reloaded.total_chunks != store.snapshot().total_chunks:
+        violations.append(f"reload sees {reloaded.total_chunks} chunks, memory {store.snapshot().total_chunks}")
+
+    lat = np.array(query_latencies) * 1000 if query_latencies else np.zeros(1)
+    result = {
+        "jobs": args.jobs, "job_workers": args.job_workers, "docs": len(expected_docs), "chunks_added": added,
+        "live_chunks": snapshot.total_chunks, "versions": snapshot.version, "seconds": round(seconds, 3),
+        "queries": len(query_latencies), "query_p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "query_p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "failed_jobs": failed, "missing_docs": missing[:20], "errors": errors[:20], "violations": violations[:20],
+    }
+    ok = not (failed or missing or errors or violations)
+    result["passed"] = ok
+    print(json.dumps(result, indent=2))
+    print("PASS" if ok else "FAIL")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(result, fh, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# app/bench/pdf_extract_bench.py
+"""
+PDF extraction throughput: serial pdfplumber (the previous extractor) vs the
+fast backend, serially and as page ranges across a process pool.
+
+    python bench/pdf_extract_bench.py                          # synthetic 300-page PDF
+    python bench/pdf_extract_bench.py --pages 800 --workers 8
+    python bench/pdf_extract_bench.py --pdf manual.pdf --out pdf_extract_bench.json
+
+The synthetic PDF is written locally (no extra dependency). Reports pages/s per
+run and how closely its words match the source text (synthetic) or the
+pdfplumber output (--pdf).
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pdf_extract  # noqa: E402
+
+WORDS = ("retrieval index embedding vector query latency throughput tokenizer document "
+         "section paragraph budget shard replica cache policy invoice contract Q3 2024 "
+         "revenue e-mail manual printer firmware INC-20431 v2.3.1").split()
+LINES_PER_PAGE = 50
+
+
+def synthetic_pages(pages: int, seed: int = 0):
+    """Lines of text per page, with a heading on every page."""
+    rng = np.random.default_rng(seed)
+    return [[f"{p + 1}. Section heading {p + 1}"] +
+            [" ".join(rng.choice(WORDS, rng.integers(6, 12))) for _ in range(LINES_PER_PAGE - 1)]
+            for p in range(pages)]
+
+
+def write_pdf(pages) -> bytes:
+    """Minimal PDF 1.4: one Helvetica text stream per page, with an xref table."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 770 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), len(kids))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def word_overlap(text: str, reference: str) -> float:
+    """Share of the reference's words (with multiplicity) found in text."""
+    got, want = Counter(text.split()), Counter(reference.split())
+    return sum((got & want).values()) / max(1, sum(want.values()))
+
+
+def run(name, fn, n_pages, reference):
+    started = time.perf_counter()
+    text = fn()
+    seconds = time.perf_counter() - started
+    result = {"impl": name, "seconds": round(seconds, 3), "pages_per_s": round(n_pages / seconds, 1),
+              "chars": len(text), "word_overlap_pct": round(100.0 * word_overlap(text, reference), 2)}
+    print(f"{name:>22}: {result['seconds']:>8.3f}s  {result['pages_per_s']:>8.1f} pages/s  "
+          f"{result['word_overlap_pct']:>6.2f}% words")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300, help="pages in the synthetic PDF")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pages-per-task", type=int, default=pdf_extract.PDF_PAGES_PER_TASK)
+    parser.add_argument("--pdf", help="benchmark on this PDF instead")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as fh:
+            data = fh.read()
+        reference = None
+    else:
+        pages = synthetic_pages(args.pages)
+        data = write_pdf(pages)
+        reference = "\n".join(line for lines in pages for line in lines)
+    n_pages = pdf_extract.page_count(data)
+    fast = pdf_extract.resolve_backend("auto")
+    print(f"{n_pages} pages, {len(data) / 1e6:.1f} MB; fast backend: {fast}, {args.workers} workers")
+
+    def extract(backend, pool=None):
+        pages = pdf_extract.iter_pdf_pages(data, pool=pool, backend=backend, pages_per_task=args.pages_per_task)
+        return "\n".join(text for text in pages if text)
+
+    baseline = run("pdfplumber", lambda: extract("pdfplumber"), n_pages, reference or "")
+    if reference is None:
+        reference = extract("pdfplumber")
+        baseline["word_overlap_pct"] = 100.0
+    results = [baseline]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # start the workers (and their imports) outside the timings
+        list(pool.map(pdf_extract.resolve_backend, [fast] * args.workers))
+        if fast != "pdfplumber":
+            results.append(run(fast, lambda: extract(fast), n_pages, reference))
+            results.append(run(f"{fast}+pool", lambda: extract(fast, pool), n_pages, reference))
+        results.append(run("pdfplumber+pool", lambda: extract("pdfplumber", pool), n_pages, reference))
+    for r in results[1:]:
+        r["speedup"] = round(baseline["seconds"] / r["seconds"], 1)
+        print(f"{r['impl']:>22}: {r['speedup']}x vs pdfplumber")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"pages": n_pages, "bytes": len(data), "workers": args.workers,
+                       "pages_per_task": args.pages_per_task, "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
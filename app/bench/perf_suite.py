@@ -0,0 +1,342 @@
+# app/bench/perf_suite.py
+"""
+Reproducible end-to-end benchmark on synthetic corpora (384-d), with the stub
+LLM in place of Gemini (LLM_BACKEND=stub, no token delay).
+
+    python bench/perf_suite.py                                   # 10k and 100k chunks
+    python bench/perf_suite.py --sizes 10000 100000 1000000 --out perf.json
+    python bench/perf_suite.py --compare perf_old.json perf.json # flag regressions
+
+For each corpus size, in fresh processes over a scratch DATABASE_DIR:
+
+  ingest      chunking and embedding throughput (on a sample), IndexStore.add
+              throughput (metadata + BM25 + WAL commit per batch), and the
+              persist step (full index rebuild + base write)
+  cold start  import + load_resources() wall time and its startup timings
+  queries     POST /queries/ p50/p95/p99 and QPS at each --concurrency level
+  memory      RSS after ingest and after a cold load, store.memory_bytes(), disk
+
+Vectors are synthetic clustered unit vectors, so corpus size is not bounded
+by embedding speed; the embedding model is still timed on a sample and used
+to encode every query. Same seed, same corpus. --compare exits non-zero when
+a metric regressed by more than --threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+DIM = 384
+DOCS_CHUNKS = 20  # chunks per synthetic document
+COMMON = ("the of and to in a is for on with that by this be are from or as at it an our your "
+          "invoice refund shipping account policy report revenue cloud customer support printer error").split()
+
+
+# ---------- Synthetic corpus ----------
+def vocabulary(size: int = 20000):
+    return np.array(COMMON + [f"term{i}" for i in range(size)])
+
+
+def synthetic_texts(rng, vocab, n: int, words: int):
+    """Zipf-distributed words, so BM25 postings look like natural text (few huge, many tiny)."""
+    ids = np.minimum(rng.zipf(1.2, (n, words)) - 1, len(vocab) - 1)
+    return [" ".join(row) for row in vocab[ids]]
+
+
+def synthetic_rows(first: int, n: int, texts):
+    rows = []
+    for i, text in zip(range(first, first + n), texts):
+        doc = f"doc{i // DOCS_CHUNKS}"
+        rows.append({"doc_id": doc, "chunk_id": f"{doc}__{i % DOCS_CHUNKS}", "source_name": f"{doc}.pdf",
+                     "mimeType": "application/pdf" if i % 3 else "text/plain",
+                     # 400-token windows overlapping by 64, as the chunker cuts them
+                     "start_token": (i % DOCS_CHUNKS) * 336, "end_token": (i % DOCS_CHUNKS) * 336 + 400,
+                     "text": text})
+    return rows
+
+
+def synthetic_vectors(rng, centers, n: int):
+    x = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, DIM)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+# ---------- Measurement helpers ----------
+def rss_mb():
+    """(current RSS, peak RSS) of this process in MB."""
+    try:
+        with open("/proc/self/status") as fh:
+            status = dict(line.split(":", 1) for line in fh if ":" in line)
+        return (int(status["VmRSS"].split()[0]) / 1024, int(status["VmHWM"].split()[0]) / 1024)
+    except (OSError, KeyError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return peak, peak
+
+
+def disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return round(total / 2 ** 20, 2)
+
+
+def latency_stats(seconds) -> dict:
+    ms = np.array(seconds) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3), "mean_ms": round(float(ms.mean()), 3)}
+
+
+# ---------- Child: ingest ----------
+def run_ingest(args, size: int) -> dict:
+    import chunker
+    import embedder
+    import global_resources
+    from global_resources import get_index_store, get_model
+
+    rng = np.random.default_rng(args.seed)
+    vocab = vocabulary()
+    out = {}
+
+    # chunking: whole documents (about 20 windows each) through the offset-mapping chunker
+    docs = synthetic_texts(rng, vocab, args.chunk_docs, 400 * DOCS_CHUNKS)
+    started = time.perf_counter()
+    chunks = chunker.chunk_texts(docs)
+    seconds = time.perf_counter() - started
+    n_chunks = sum(len(c) for c in chunks)
+    out["chunking"] = {"documents": len(docs), "chunks": n_chunks, "seconds": round(seconds, 3),
+                       "chunks_per_s": round(n_chunks / seconds, 1),
+                       "mb_per_s": round(sum(len(d) for d in docs) / 1e6 / seconds, 2)}
+
+    # embedding: the configured EMBED_BACKEND on a sample of chunk texts
+    model = get_model()
+    sample = [text for doc in chunks for text, _, _ in doc][:args.embed_sample]
+    model.encode(sample[:8], convert_to_numpy=True, show_progress_bar=False)  # warm-up
+    started = time.perf_counter()
+    model.encode(sample, batch_size=64, convert_to_numpy=True, show_progress_bar=False)
+    seconds = time.perf_counter() - started
+    out["embedding"] = {"backend": embedder.EMBED_BACKEND, "chunks": len(sample),
+                        "seconds": round(seconds, 3), "chunks_per_s": round(len(sample) / seconds, 1)}
+
+    # add: one IndexStore.add per batch, as the ingest pipeline publishes
+    store = get_index_store()
+    centers = rng.standard_normal((max(16, size // 500), DIM)).astype("float32")
+    add_seconds, gen_seconds = 0.0, 0.0
+    for first in range(0, size, args.add_batch):
+        n = min(args.add_batch, size - first)
+        t0 = time.perf_counter()
+        rows = synthetic_rows(first, n, synthetic_texts(rng, vocab, n, args.words))
+        vectors = synthetic_vectors(rng, centers, n)
+        t1 = time.perf_counter()
+        store.add(vectors, rows)
+        add_seconds += time.perf_counter() - t1
+        gen_seconds += t1 - t0
+    store.rebuild(wait=True)  # a background rebuild started by add() must not overlap the timed one
+    out["add"] = {"chunks": size, "batch": args.add_batch, "seconds": round(add_seconds, 3),
+                  "chunks_per_s": round(size / add_seconds, 1), "generate_seconds": round(gen_seconds, 3)}
+
+    # persist: full compaction into a new base index file
+    started = time.perf_counter()
+    store.rebuild(wait=True)
+    out["persist"] = {"seconds": round(time.perf_counter() - started, 3), "last_rebuild": store.last_rebuild}
+
+    # a pipeline runs the stages concurrently, so the slowest one bounds it; serially they add up
+    rates = [out["chunking"]["chunks_per_s"], out["embedding"]["chunks_per_s"], out["add"]["chunks_per_s"]]
+    out["ingest_chunks_per_s"] = {"pipelined_bound": round(min(rates), 1),
+                                  "serial": round(1.0 / sum(1.0 / r for r in rates), 1)}
+    rss, peak = rss_mb()
+    out["memory"] = {"rss_mb": round(rss, 1), "peak_rss_mb": round(peak, 1),
+                     "store_mb": round(store.memory_bytes() / 2 ** 20, 2),
+                     "disk_mb": disk_mb(global_resources.DATABASE_DIR)}
+    return out
+
+
+# ---------- Child: cold start + queries ----------
+def run_serve(args, size: int) -> dict:
+    started = time.perf_counter()
+    import index
+    import global_resources
+    imported = time.perf_counter() - started
+    global_resources.load_resources()
+    out = {"cold_start": {"import_seconds": round(imported, 3),
+                          "load_resources_seconds": round(time.perf_counter() - started - imported, 3),
+                          "total_seconds": round(time.perf_counter() - started, 3),
+                          "startup_timings": dict(global_resources.startup_timings)}}
+    rss, peak = rss_mb()
+    out["memory_loaded"] = {"rss_mb": round(rss, 1), "peak_rss_mb": round(peak, 1)}
+    out["queries"] = asyncio.run(query_load(index.app, args))
+    return out
+
+
+async def query_load(app, args) -> list:
+    import httpx
+    rng = np.random.default_rng(args.seed + 1)
+    vocab = vocabulary()
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # warm-up: first-call costs (thread pools, caches of the tokenizer) are not what we measure
+        for q in synthetic_texts(rng, vocab, 8, 6):
+            await client.post("/queries/", json={"q": q})
+        for concurrency in args.concurrency:
+            # distinct questions, so the embedding and answer caches do not hide the work
+            questions = synthetic_texts(rng, vocab, args.queries, 6)
+            latencies, errors = [], 0
+            cursor = iter(questions)
+
+            async def worker():
+                nonlocal errors
+                for q in cursor:
+                    t0 = time.perf_counter()
+                    response = await client.post("/queries/", json={"q": q})
+                    latencies.append(time.perf_counter() - t0)
+                    errors += response.status_code != 200
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            seconds = time.perf_counter() - started
+            results.append({"concurrency": concurrency, "queries": len(questions), "errors": errors,
+                            "qps": round(len(questions) / seconds, 1), **latency_stats(latencies)})
+            print(f"    concurrency {concurrency:>3}: {results[-1]['qps']:>8.1f} qps  "
+                  f"p50 {results[-1]['p50_ms']:.1f} ms  p95 {results[-1]['p95_ms']:.1f} ms  "
+                  f"p99 {results[-1]['p99_ms']:.1f} ms")
+    return results
+
+
+# ---------- Orchestration ----------
+def child(mode: str, size: int, data_dir: str, args) -> dict:
+    """Run one phase in a fresh interpreter, so cold start and memory are measured honestly."""
+    fd, result_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    env = dict(os.environ, DATABASE_DIR=data_dir, LLM_BACKEND="stub", STUB_LLM_TOKEN_DELAY="0",
+               RESOURCE_WARMUP="lazy")
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, "--child-size", str(size),
+           "--child-out", result_path] + forwarded(args)
+    try:
+        subprocess.run(cmd, env=env, check=True)
+        with open(result_path) as fh:
+            return json.load(fh)
+    finally:
+        os.remove(result_path)
+
+
+def forwarded(args) -> list:
+    return ["--seed", str(args.seed), "--words", str(args.words), "--add-batch", str(args.add_batch),
+            "--chunk-docs", str(args.chunk_docs), "--embed-sample", str(args.embed_sample),
+            "--queries", str(args.queries), "--concurrency", *map(str, args.concurrency)]
+
+
+def environment() -> dict:
+    import ann_index
+    import embedder
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "index_backend": ann_index.INDEX_BACKEND,
+            "embed_backend": embedder.EMBED_BACKEND}
+
+
+# ---------- Regression check ----------
+# metric name -> True if higher is better; matched on the last path component
+HIGHER_IS_BETTER = ("chunks_per_s", "mb_per_s", "qps", "pipelined_bound", "serial")
+LOWER_IS_BETTER = ("seconds", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "rss_mb", "peak_rss_mb", "store_mb",
+                   "disk_mb", "total_seconds", "load_resources_seconds")
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, v in value.items():
+            yield from flatten(v, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for item in value:
+            key = f"c{item['concurrency']}" if isinstance(item, dict) and "concurrency" in item else None
+            if key:
+                yield from flatten(item, f"{prefix}.{key}")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    with open(old_path) as fh:
+        old = dict(flatten(json.load(fh)["sizes"]))
+    with open(new_path) as fh:
+        new = dict(flatten(json.load(fh)["sizes"]))
+    regressions = 0
+    print(f"{'metric':<58}{'old':>12}{'new':>12}{'change':>9}")
+    for key in sorted(set(old) & set(new)):
+        name = key.rsplit(".", 1)[-1]
+        if name in HIGHER_IS_BETTER:
+            worse = old[key] > 0 and new[key] < old[key] * (1 - threshold)
+        elif name in LOWER_IS_BETTER:
+            worse = old[key] > 0 and new[key] > old[key] * (1 + threshold)
+        else:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        regressions += worse
+        print(f"{key:<58}{old[key]:>12.2f}{new[key]:>12.2f}{change:>8.1f}%{'  REGRESSION' if worse else ''}")
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="corpus sizes in chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--words", type=int, default=48, help="words per synthetic chunk")
+    parser.add_argument("--add-batch", type=int, default=10_000, help="chunks per IndexStore.add (publish)")
+    parser.add_argument("--chunk-docs", type=int, default=50, help="documents in the chunking sample")
+    parser.add_argument("--embed-sample", type=int, default=1024, help="chunks in the embedding sample")
+    parser.add_argument("--queries", type=int, default=500, help="queries per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--keep", action="store_true", help="keep the scratch stores")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--child", choices=["ingest", "serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--child-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+    if args.child:
+        result = (run_ingest if args.child == "ingest" else run_serve)(args, args.child_size)
+        with open(args.child_out, "w") as fh:
+            json.dump(result, fh)
+        return
+
+    report = {"environment": environment(), "args": {k: v for k, v in vars(args).items()
+                                                     if not k.startswith("child") and k != "compare"},
+              "sizes": {}}
+    for size in args.sizes:
+        data_dir = tempfile.mkdtemp(prefix=f"perf-{size}-")
+        print(f"🔹 {size} chunks in {data_dir}")
+        result = child("ingest", size, data_dir, args)
+        print(f"    add {result['add']['chunks_per_s']} chunks/s, persist {result['persist']['seconds']}s, "
+              f"embed {result['embedding']['chunks_per_s']} chunks/s, chunk {result['chunking']['chunks_per_s']} chunks/s")
+        result.update(child("serve", size, data_dir, args))
+        print(f"    cold start {result['cold_start']['total_seconds']}s, RSS {result['memory_loaded']['rss_mb']} MB")
+        report["sizes"][str(size)] = result
+        if not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# app/bench/rerank_bench.py
+"""
+Hit rate and latency of first-stage retrieval alone vs reranked by the
+cross-encoder, on a throwaway store.
+
+    python bench/rerank_bench.py                                   # 40 docs, 200 queries, top-2 of 50
+    RERANK_CANDIDATES=20 python bench/rerank_bench.py --mode vector --out rerank_bench.json
+    python bench/rerank_bench.py --budget-ms 50                    # how often the latency cap falls back
+
+Questions are sentences taken from the documents; a query hits when one of
+its top_k chunks contains the sentence. Each variant runs every question
+twice: the first pass scores every pair, the second is served from the
+pair score cache. Reports hit rate, p50/p95 search latency per pass and
+the share of queries that fell back to first-stage order.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import global_resources  # noqa: E402
+import reranker  # noqa: E402
+from bench.context_bench import synthetic_documents  # noqa: E402
+from index_store import IndexStore  # noqa: E402
+from ingest_pipeline import ingest_documents  # noqa: E402
+from routers.main import search_query  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--sentences", type=int, default=200, help="sentences per document")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--budget-ms", type=float, default=reranker.RERANK_BUDGET_MS)
+    parser.add_argument("--mode", default="hybrid", choices=("hybrid", "vector", "lexical"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="rerank-bench-")
+    store = IndexStore(os.path.join(tmp, "faiss_index.bin"), os.path.join(tmp, "metadata"), global_resources.EMBED_DIM)
+    store.load()
+    docs = synthetic_documents(args.docs, args.sentences, args.seed)
+    report = ingest_documents(docs, store=store, use_process_pool=False)
+    snapshot = store.snapshot()
+    print(f"🔹 {report.chunks} chunks from {len(docs)} documents in {tmp}")
+
+    rng = np.random.default_rng(args.seed + 1)
+    questions = []
+    for _ in range(args.queries):
+        doc = docs[rng.integers(len(docs))]["text"].split(". ")
+        questions.append(doc[rng.integers(len(doc))].rstrip("."))
+
+    shared = reranker.reranker
+    shared.budget = args.budget_ms / 1000
+    started = time.perf_counter()
+    reranker.get_reranker()
+    model_load = time.perf_counter() - started
+
+    results = {}
+    for name, rerank in (("first_stage", False), ("reranked", True)):
+        r = {}
+        for run in ("cold", "cached"):
+            seconds, hits = [], 0
+            fallbacks = shared.fallbacks
+            for q in questions:
+                started = time.perf_counter()
+                rows = search_query(q, top_k=args.top_k, snapshot=snapshot, mode=args.mode, rerank=rerank)
+                seconds.append(time.perf_counter() - started)
+                hits += any(q in (row.get("text") or "") for row in rows)
+            ms = np.array(seconds) * 1000
+            r[run] = {"hit_rate": round(hits / len(questions), 4),
+                      "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                      "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                      "fallback_rate": round((shared.fallbacks - fallbacks) / len(questions), 4)}
+        results[name] = r
+        print(f"{name:>11}: hit@{args.top_k} {r['cold']['hit_rate']:.3f}  "
+              f"p50 {r['cold']['p50_ms']:.2f} / {r['cached']['p50_ms']:.2f} ms (cold / cached)  "
+              f"p95 {r['cold']['p95_ms']:.2f} / {r['cached']['p95_ms']:.2f} ms  "
+              f"fallbacks {r['cold']['fallback_rate']:.1%}")
+    print(f"model load {model_load:.2f} s, {shared.stats()['pair_ms']} ms per pair")
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"args": vars(args), "candidates": reranker.RERANK_CANDIDATES, "model": reranker.RERANK_MODEL,
+                       "chunks": report.chunks, "model_load_s": round(model_load, 3), "reranker": shared.stats(),
+                       "results": results}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
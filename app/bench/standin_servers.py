@@ -0,0 +1,238 @@
+# app/bench/standin_servers.py
+"""
+Local stand-ins for the Google Drive, Notion and Supabase Storage APIs (the
+subset the connectors use), for offline tests and benchmarks. Faults can be
+injected: added latency (per request and per new connection), 503s, and
+429s with Retry-After.
+
+    with StandinServers(corpus, error_rate=0.05, throttle_rate=0.05) as servers:
+        DriveConnector({"token": "t"}, base_url=servers.drive_url)
+        NotionConnector("key", "db", base_url=servers.notion_url)
+        SupabaseStorageConnector(url=servers.supabase_url, key="key")
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, unquote, urlparse
+import threading
+import random
+import json
+import time
+
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
+
+
+class StandinCorpus:
+    """Documents the stand-ins serve: Drive files, Notion pages (paragraph texts), bucket objects."""
+
+    def __init__(self, drive_files: List[Dict] = (), notion_pages: Dict[str, List[str]] = None,
+                 bucket: str = "Pdfs", objects: Dict[str, bytes] = None):
+        self.drive_files = list(drive_files)  # {"id","name","mimeType","modifiedTime","content": bytes}
+        self.notion_pages = dict(notion_pages or {})
+        self.bucket = bucket
+        self.objects = dict(objects or {})
+
+
+class StandinServers:
+    """One threaded HTTP/1.1 (keep-alive) server answering all three APIs under /drive/v3, /notion/v1, /supabase."""
+
+    def __init__(self, corpus: StandinCorpus, latency: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 0.2, connect_latency: float = 0.0, seed: int = 0):
+        self.corpus = corpus
+        self.latency = latency
+        self.connect_latency = connect_latency  # stands in for the TCP + TLS handshake of a new connection
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.errors = 0
+        self.throttled = 0
+        self.tokens_issued = 0
+        self.server = None
+        self.thread = None
+
+    # ---------- Lifecycle ----------
+    def start(self) -> "StandinServers":
+        standin = self
+
+        class Handler(_Handler):
+            servers = standin
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="standin-http", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def drive_url(self) -> str:
+        return self.url + "/drive/v3"
+
+    @property
+    def token_url(self) -> str:
+        return self.url + "/token"
+
+    @property
+    def notion_url(self) -> str:
+        return self.url + "/notion/v1"
+
+    @property
+    def supabase_url(self) -> str:
+        return self.url + "/supabase"
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"requests": self.requests, "connections": self.connections, "errors": self.errors,
+                    "throttled": self.throttled, "tokens_issued": self.tokens_issued}
+
+    # ---------- Faults ----------
+    def _fault(self):
+        """None, or the (status, headers) of an injected failure for this request."""
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            if roll < self.throttle_rate:
+                self.throttled += 1
+                return 429, {"Retry-After": str(self.retry_after)}
+            if roll < self.throttle_rate + self.error_rate:
+                self.errors += 1
+                return 503, {}
+        return None
+
+    # ---------- APIs ----------
+    def drive(self, method: str, parts: List[str], query: Dict, body: bytes):
+        files = self.corpus.drive_files
+        if parts == ["files"]:
+            start = int(query.get("pageToken", 0))
+            size = int(query.get("pageSize", 100))
+            page = files[start:start + size]
+            out = {"files": [{k: f[k] for k in ("id", "name", "mimeType", "modifiedTime") if k in f} for f in page]}
+            if start + size < len(files):
+                out["nextPageToken"] = str(start + size)
+            return 200, out
+        by_id = {f["id"]: f for f in files}
+        if len(parts) >= 2 and parts[0] == "files" and parts[1] in by_id:
+            f = by_id[parts[1]]
+            if parts[2:] == ["export"] and f["mimeType"] == GOOGLE_DOC_MIME:
+                return 200, f["content"]
+            if query.get("alt") == "media" and f["mimeType"] != GOOGLE_DOC_MIME:
+                return 200, f["content"]
+        return 404, {"error": "not found"}
+
+    def notion(self, method: str, parts: List[str], query: Dict, body: bytes):
+        pages = self.corpus.notion_pages
+        if len(parts) == 3 and parts[0] == "databases" and parts[2] == "query":
+            req = json.loads(body or b"{}")
+            ids = sorted(pages)
+            start, size = int(req.get("start_cursor") or 0), int(req.get("page_size", 100))
+            results = [{"id": i, "last_edited_time": "2024-01-01T00:00:00.000Z"} for i in ids[start:start + size]]
+            more = start + size < len(ids)
+            return 200, {"results": results, "has_more": more, "next_cursor": str(start + size) if more else None}
+        if len(parts) == 3 and parts[0] == "blocks" and parts[2] == "children" and parts[1] in pages:
+            texts = pages[parts[1]]
+            start, size = int(query.get("start_cursor") or 0), int(query.get("page_size", 100))
+            blocks = [{"type": "paragraph", "paragraph": {"rich_text": [{"plain_text": t}]}}
+                      for t in texts[start:start + size]]
+            more = start + size < len(texts)
+            return 200, {"results": blocks, "has_more": more, "next_cursor": str(start + size) if more else None}
+        return 404, {"object": "error", "status": 404}
+
+    def supabase(self, method: str, parts: List[str], query: Dict, body: bytes):
+        corpus = self.corpus
+        if parts[:2] != ["storage", "v1"]:
+            return 404, {"error": "not found"}
+        parts = parts[2:]
+        if parts[:2] == ["object", "list"] and parts[2:] == [corpus.bucket]:
+            req = json.loads(body or b"{}")
+            prefix = req.get("prefix", "").strip("/")
+            names = sorted(n[len(prefix):].lstrip("/") for n in corpus.objects if n.startswith(prefix))
+            offset, limit = int(req.get("offset", 0)), int(req.get("limit", 100))
+            return 200, [{"id": n, "name": n, "updated_at": "2024-01-01T00:00:00Z"}
+                         for n in names[offset:offset + limit]]
+        if parts[:1] == ["object"] and parts[1:2] == [corpus.bucket]:
+            name = "/".join(parts[2:])
+            if name in corpus.objects:
+                return 200, corpus.objects[name]
+            return 400, {"statusCode": "404", "error": "not_found", "message": "Object not found"}
+        return 404, {"error": "not found"}
+
+    def token(self, body: bytes):
+        form = parse_qs(body.decode())
+        if form.get("grant_type") != ["refresh_token"] or not form.get("refresh_token"):
+            return 400, {"error": "invalid_grant"}
+        with self._lock:
+            self.tokens_issued += 1
+            n = self.tokens_issued
+        return 200, {"access_token": f"standin-{n}", "expires_in": 3600, "token_type": "Bearer"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible in stats()
+    servers: StandinServers = None
+
+    def setup(self):
+        super().setup()
+        with self.servers._lock:
+            self.servers.connections += 1
+        if self.servers.connect_latency:
+            time.sleep(self.servers.connect_latency)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        servers = self.servers
+        if servers.latency:
+            time.sleep(servers.latency)
+        fault = servers._fault()
+        if fault:
+            status, headers = fault
+            return self._send(status, {"error": "injected"}, headers)
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        if parts == ["token"]:
+            return self._send(*servers.token(body))
+        if parts[:2] == ["drive", "v3"]:
+            return self._send(*servers.drive(method, parts[2:], query, body))
+        if parts[:2] == ["notion", "v1"]:
+            return self._send(*servers.notion(method, parts[2:], query, body))
+        if parts[:1] == ["supabase"]:
+            return self._send(*servers.supabase(method, parts[1:], query, body))
+        self._send(404, {"error": "not found"})
+
+    def _send(self, status: int, payload, headers: Dict = None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        content_type = "application/octet-stream" if isinstance(payload, bytes) else "application/json"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
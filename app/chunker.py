@@ -0,0 +1,160 @@
+# app/chunker.py
+
+from typing import Iterable, Iterator, List, Tuple
+from global_resources import CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+import global_resources
+import re
+import os
+import numpy as np
+
+# ---------- Configuration ----------
+# "token": fixed token windows; "sentence": end windows on a sentence / paragraph / heading break when one is close
+CHUNK_BOUNDARIES = os.getenv("CHUNK_BOUNDARIES", "token")
+# how far back (fraction of chunk_size) a window may end early to land on a boundary
+CHUNK_BOUNDARY_SLACK = float(os.getenv("CHUNK_BOUNDARY_SLACK", "0.25"))
+# documents tokenized per fast-tokenizer call in chunk_texts()
+CHUNK_TOKENIZE_BATCH = int(os.getenv("CHUNK_TOKENIZE_BATCH", "32"))
+# chunk_stream() tokenizes its buffered text once it holds about this many characters per chunk_size token
+CHUNK_STREAM_CHARS_PER_TOKEN = int(os.getenv("CHUNK_STREAM_CHARS_PER_TOKEN", "16"))
+
+Chunk = Tuple[str, int, int]
+
+# paragraph / heading starts (blank line, markdown heading, numbered section) rank above sentence ends
+_PARAGRAPH_RE = re.compile(r"\n\s*\n\s*|\n(?=#{1,6}\s|\d+(?:\.\d+)*\.?\s+[A-Z])")
+_SENTENCE_RE = re.compile(r"(?<=[.!?:;])\s+|\n\s*")
+
+
+# ---------- Token-level chunking ----------
+def chunk_text_token_level(text: str, chunk_size: int = CHUNK_SIZE_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS,
+                           boundaries: str = None, tokenizer=None) -> List[Chunk]:
+    """
+    Returns list of tuples: (chunk_text, start_token_idx, end_token_idx)
+    Chunk text is sliced from the original string via the tokenizer's offset mapping.
+    """
+    return chunk_texts([text], chunk_size, overlap, boundaries, tokenizer)[0]
+
+
+def chunk_texts(texts: List[str], chunk_size: int = CHUNK_SIZE_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS,
+                boundaries: str = None, tokenizer=None) -> List[List[Chunk]]:
+    """Chunk several documents, tokenizing them in batched fast-tokenizer calls."""
+    tokenizer = tokenizer or global_resources.get_tokenizer()
+    boundaries = boundaries or CHUNK_BOUNDARIES
+    if not getattr(tokenizer, "is_fast", False):
+        # slow (pure Python) tokenizers have no offset mapping
+        return [chunk_text_by_decode(t, chunk_size, overlap, tokenizer) for t in texts]
+    out = []
+    for i in range(0, len(texts), CHUNK_TOKENIZE_BATCH):
+        batch = [t or "" for t in texts[i:i + CHUNK_TOKENIZE_BATCH]]
+        for text, offsets in zip(batch, token_offsets(batch, tokenizer)):
+            out.append(_chunk_offsets(text, offsets, chunk_size, overlap, boundaries))
+    return out
+
+
+def chunk_stream(pages: Iterable[str], chunk_size: int = CHUNK_SIZE_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS,
+                 boundaries: str = None, tokenizer=None) -> Iterator[Chunk]:
+    """
+    Chunk a document arriving page by page (non-empty pages joined by newlines).
+    Only the text after the last emitted window is buffered; token indices
+    count from the start of the document.
+    """
+    tokenizer = tokenizer or global_resources.get_tokenizer()
+    boundaries = boundaries or CHUNK_BOUNDARIES
+    if not getattr(tokenizer, "is_fast", False):
+        yield from chunk_text_by_decode("\n".join(p for p in pages if p), chunk_size, overlap, tokenizer)
+        return
+    carry, base = "", 0
+    for page in pages:
+        if not page:
+            continue
+        carry = f"{carry}\n{page}" if carry else page
+        if len(carry) < chunk_size * CHUNK_STREAM_CHARS_PER_TOKEN:
+            continue
+        offsets = token_offsets([carry], tokenizer)[0]
+        chunks = _chunk_offsets(carry, offsets, chunk_size, overlap, boundaries)
+        if len(chunks) < 2:
+            continue
+        # the last window may still grow with the next page: keep it (and its overlap) buffered
+        for text, start, end in chunks[:-1]:
+            yield text, base + start, base + end
+        keep_from = chunks[-1][1]
+        carry = carry[offsets[keep_from, 0]:]
+        base += keep_from
+    if carry:
+        for text, start, end in _chunk_offsets(carry, token_offsets([carry], tokenizer)[0], chunk_size, overlap, boundaries):
+            yield text, base + start, base + end
+
+
+def token_offsets(texts: List[str], tokenizer=None) -> List[np.ndarray]:
+    """(n_tokens, 2) character offsets per text, from one tokenizer pass over the batch."""
+    tokenizer = tokenizer or global_resources.get_tokenizer()
+    enc = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                    return_attention_mask=False, return_token_type_ids=False, verbose=False)
+    return [np.asarray(o, dtype=np.int64).reshape(-1, 2) for o in enc["offset_mapping"]]
+
+
+def _chunk_offsets(text: str, offsets: np.ndarray, chunk_size: int, overlap: int, boundaries: str) -> List[Chunk]:
+    n = len(offsets)
+    chunks = []
+    if n == 0:
+        return chunks
+    step = chunk_size - overlap
+    breaks = _boundary_tokens(text, offsets) if boundaries == "sentence" and n > chunk_size else None
+    slack = max(1, int(chunk_size * CHUNK_BOUNDARY_SLACK))
+    start = 0
+    while True:
+        end = min(start + chunk_size, n)
+        if breaks is not None and end < n:
+            end = _snap_end(breaks, start, end, slack)
+        chunks.append((text[offsets[start, 0]:offsets[end - 1, 1]], start, end))
+        if end >= n:
+            break
+        start = _snap_start(breaks, start, end, overlap) if breaks is not None else start + step
+    return chunks
+
+
+def _boundary_tokens(text: str, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Token indices that start a paragraph / heading, and that start a sentence."""
+    starts = offsets[:, 0]
+    paragraphs = np.searchsorted(starts, [m.end() for m in _PARAGRAPH_RE.finditer(text)])
+    sentences = np.searchsorted(starts, [m.end() for m in _SENTENCE_RE.finditer(text)])
+    return np.unique(paragraphs), np.unique(sentences)
+
+
+def _snap_end(breaks: Tuple[np.ndarray, np.ndarray], start: int, end: int, slack: int) -> int:
+    """Move a window end back to the nearest paragraph break, else sentence break, within `slack` tokens."""
+    lo = max(start + 1, end - slack)
+    for candidates in breaks:
+        i = np.searchsorted(candidates, end, side="right") - 1
+        if i >= 0 and candidates[i] >= lo:
+            return int(candidates[i])
+    return end
+
+
+def _snap_start(breaks: Tuple[np.ndarray, np.ndarray], start: int, end: int, overlap: int) -> int:
+    """Start the overlap of the next window on the first sentence break inside it, if there is one."""
+    lo = max(start + 1, end - overlap)
+    sentences = breaks[1]
+    i = np.searchsorted(sentences, lo)
+    return int(sentences[i]) if i < len(sentences) and sentences[i] < end else lo
+
+
+def chunk_text_by_decode(text: str, chunk_size: int = CHUNK_SIZE_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS,
+                         tokenizer=None) -> List[Chunk]:
+    """
+    Previous implementation: decodes every window back to text.
+    Fallback for tokenizers without offset mapping, and the baseline in bench/chunker_bench.py.
+    """
+    tokenizer = tokenizer or global_resources.get_tokenizer()
+    token_ids = tokenizer.encode(text or "", add_special_tokens=False)
+    chunks = []
+    if len(token_ids) == 0:
+        return chunks
+    step = chunk_size - overlap
+    for start in range(0, max(1, len(token_ids)), step):
+        end = start + chunk_size
+        chunk_tokens = token_ids[start:end]
+        chunk_text = tokenizer.decode(chunk_tokens, clean_up_tokenization_spaces=True)
+        chunks.append((chunk_text, start, min(end, len(token_ids))))
+        if end >= len(token_ids):
+            break
+    return chunks
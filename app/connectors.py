@@ -0,0 +1,343 @@
+# app/connectors.py
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union
+from urllib.parse import quote
+from http_pool import PooledClient, connector_metrics
+import metrics
+import threading
+import hashlib
+import time
+import os
+
+# ---------- Configuration ----------
+# API roots; point them at local stand-in servers (see bench/standin_servers.py) to run offline
+DRIVE_API_URL = os.getenv("DRIVE_API_URL", "https://www.googleapis.com/drive/v3")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
+NOTION_VERSION = os.getenv("NOTION_VERSION", "2022-06-28")
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "Pdfs")
+# Concurrent downloads of Connector.fetch_many()
+CONNECTOR_DOWNLOAD_WORKERS = int(os.getenv("CONNECTOR_DOWNLOAD_WORKERS", "8"))
+
+DRIVE_TEXT_QUERY = "mimeType='application/pdf' or mimeType='application/vnd.google-apps.document' or mimeType contains 'text/'"
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
+
+
+@dataclass
+class DocumentRef:
+    """A document as listed by a source, before its content is downloaded."""
+    id: str
+    name: str
+    mimeType: str
+    source: str
+    modified_time: Optional[str] = None
+    extra: Dict = field(default_factory=dict)
+
+
+@dataclass
+class RawDocument:
+    """Downloaded document: either already text, or raw bytes (PDF) still to be extracted."""
+    ref: DocumentRef
+    text: Optional[str] = None
+    content: Optional[bytes] = None
+
+    def as_dict(self) -> Dict:
+        return {"id": self.ref.id, "name": self.ref.name, "mimeType": self.ref.mimeType,
+                "text": self.text, "content": self.content}
+
+
+class Connector:
+    """
+    A document source. Listing is paginated: list_pages(cursor) yields
+    (refs, next_cursor) and can be resumed from any next_cursor it produced.
+    fetch() is called concurrently from several threads; subclasses implement
+    _fetch() and fetch() records per-connector throughput.
+    """
+    name = "connector"
+
+    @property
+    def metrics(self):
+        return connector_metrics(self.name)
+
+    @property
+    def scope(self) -> str:
+        """Identifies this listing for sync bookkeeping (cursors, delete detection)."""
+        return self.name
+
+    def list_pages(self, cursor: Optional[str] = None) -> Iterator[Tuple[List[DocumentRef], Optional[str]]]:
+        raise NotImplementedError
+
+    def list_documents(self) -> Iterator[DocumentRef]:
+        for refs, _ in self.list_pages():
+            yield from refs
+
+    def fetch(self, ref: DocumentRef) -> RawDocument:
+        started = time.time()
+        try:
+            with metrics.stage("fetch", source=self.name):
+                doc = self._fetch(ref)
+        except Exception:
+            self.metrics.record_document(started, 0, ok=False)
+            raise
+        self.metrics.record_document(started, len(doc.content or b"") + len((doc.text or "").encode("utf-8")))
+        return doc
+
+    def _fetch(self, ref: DocumentRef) -> RawDocument:
+        raise NotImplementedError
+
+    def fetch_many(self, refs: Iterable[DocumentRef], workers: int = CONNECTOR_DOWNLOAD_WORKERS
+                   ) -> Iterator[Tuple[DocumentRef, Union[RawDocument, Exception]]]:
+        """
+        Bulk download: (ref, document or the exception it failed with), in completion order.
+        At most `workers` downloads run, and at most 2 * workers results are held, at a time.
+        """
+        refs = iter(refs)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"{self.name}-fetch") as pool:
+            pending = {}
+            while True:
+                for ref in refs:
+                    pending[pool.submit(self.fetch, ref)] = ref
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    return
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ref = pending.pop(future)
+                    error = future.exception()
+                    yield ref, error if error is not None else future.result()
+
+
+class InMemoryConnector(Connector):
+    """Serves pre-built {"id","name","mimeType","text"|"content"} dicts; local stand-in for tests."""
+    name = "memory"
+
+    def __init__(self, docs: List[Dict], name: str = "memory", page_size: int = 100):
+        self.docs = {d["id"]: d for d in docs}
+        self.name = name
+        self.page_size = page_size
+
+    def list_pages(self, cursor: Optional[str] = None):
+        ids = list(self.docs)
+        start = int(cursor or 0)
+        while start < len(ids):
+            end = start + self.page_size
+            refs = [self._ref(self.docs[i]) for i in ids[start:end]]
+            yield refs, (str(end) if end < len(ids) else None)
+            start = end
+
+    def _ref(self, d: Dict) -> DocumentRef:
+        return DocumentRef(d["id"], d.get("name", d["id"]), d.get("mimeType", "text/plain"), self.name,
+                           d.get("modified_time"))
+
+    def _fetch(self, ref: DocumentRef) -> RawDocument:
+        d = self.docs[ref.id]
+        return RawDocument(ref, text=d.get("text"), content=d.get("content"))
+
+
+# ---------- Google Drive ----------
+class GoogleToken:
+    """
+    OAuth access token from an authorized-user dict (refresh_token, client_id,
+    client_secret), refreshed shortly before it expires. A dict with only a
+    "token" is used as is.
+    """
+
+    def __init__(self, credentials_dict: dict):
+        self.info = credentials_dict
+        # no auth hook: the refresh must not wait on this token's own lock
+        self.client = PooledClient("google-oauth", credentials_dict.get("token_uri") or GOOGLE_TOKEN_URL)
+        self.token = credentials_dict.get("token") or credentials_dict.get("access_token")
+        self.expires_at = float("inf") if self.token and not credentials_dict.get("refresh_token") else 0.0
+        self._lock = threading.Lock()
+
+    def headers(self) -> Dict[str, str]:
+        with self._lock:
+            if time.time() > self.expires_at - 60:
+                response = self.client.post(self.client.base_url, data={
+                    "grant_type": "refresh_token", "refresh_token": self.info["refresh_token"],
+                    "client_id": self.info.get("client_id"), "client_secret": self.info.get("client_secret")}).json()
+                self.token = response["access_token"]
+                self.expires_at = time.time() + float(response.get("expires_in", 3600))
+            return {"Authorization": f"Bearer {self.token}"}
+
+
+# access tokens outlive a request: one per Drive account, reused by every sync of that account
+_google_tokens: Dict[str, GoogleToken] = {}
+_google_tokens_lock = threading.Lock()
+
+
+def _google_account(credentials_dict: dict) -> str:
+    """
+    Which account credentials belong to: a refreshable account is its client and refresh
+    token, not its current access token, which a refreshed dict no longer matches.
+    """
+    refresh_token = credentials_dict.get("refresh_token")
+    if refresh_token:
+        return f"{credentials_dict.get('client_id', '')}|{refresh_token}"
+    return credentials_dict.get("token") or credentials_dict.get("access_token") or ""
+
+
+def _google_token(credentials_dict: dict) -> GoogleToken:
+    """The account's shared token."""
+    key = hashlib.sha1(_google_account(credentials_dict).encode()).hexdigest()
+    with _google_tokens_lock:
+        token = _google_tokens.get(key)
+        if token is None:
+            token = _google_tokens[key] = GoogleToken(credentials_dict)
+        return token
+
+
+class DriveConnector(Connector):
+    name = "drive"
+
+    def __init__(self, credentials_dict: dict, query: str = DRIVE_TEXT_QUERY, page_size: int = 100,
+                 max_files: Optional[int] = None, base_url: str = None):
+        self.query = query or "trashed=false"
+        self.page_size = page_size
+        self.max_files = max_files
+        account = _google_account(credentials_dict)
+        self._scope = "drive:" + hashlib.sha1(f"{account}|{self.query}".encode()).hexdigest()[:16]
+        self.client = PooledClient(self.name, base_url or DRIVE_API_URL, auth=self._auth_headers)
+        self.token = _google_token(credentials_dict)
+
+    @property
+    def scope(self) -> str:
+        return self._scope
+
+    def _auth_headers(self) -> Dict[str, str]:
+        return self.token.headers()
+
+    def list_pages(self, cursor: Optional[str] = None):
+        listed = 0
+        while True:
+            params = {"q": self.query, "pageSize": self.page_size,
+                      "fields": "nextPageToken, files(id,name,mimeType,modifiedTime)"}
+            if cursor:
+                params["pageToken"] = cursor
+            results = self.client.get("files", params=params).json()
+            refs = [DocumentRef(f["id"], f["name"], f.get("mimeType", ""), self.name, f.get("modifiedTime"))
+                    for f in results.get("files", [])]
+            cursor = results.get("nextPageToken")
+            listed += len(refs)
+            yield refs, cursor
+            # max_files is applied per page so the cursor stays resumable on the next sync
+            if not cursor or (self.max_files is not None and listed >= self.max_files):
+                return
+
+    def _fetch(self, ref: DocumentRef) -> RawDocument:
+        file_id = quote(ref.id, safe="")
+        if ref.mimeType == "application/pdf":
+            return RawDocument(ref, content=self.client.get(f"files/{file_id}", params={"alt": "media"}).content)
+        if ref.mimeType == GOOGLE_DOC_MIME:
+            data = self.client.get(f"files/{file_id}/export", params={"mimeType": "text/plain"}).content
+            return RawDocument(ref, text=data.decode("utf-8", errors="ignore"))
+        if ref.mimeType.startswith("text/"):
+            data = self.client.get(f"files/{file_id}", params={"alt": "media"}).content
+            return RawDocument(ref, text=data.decode("utf-8", errors="ignore"))
+        return RawDocument(ref, text="")
+
+
+# ---------- Notion ----------
+class NotionConnector(Connector):
+    name = "notion"
+
+    def __init__(self, api_key: str, database_id: str, page_size: int = 100, base_url: str = None):
+        self.client = PooledClient(self.name, base_url or NOTION_API_URL,
+                                   headers={"Authorization": f"Bearer {api_key}", "Notion-Version": NOTION_VERSION})
+        self.database_id = database_id
+        self.page_size = page_size
+
+    @property
+    def scope(self) -> str:
+        return f"notion:{self.database_id}"
+
+    def list_pages(self, cursor: Optional[str] = None):
+        while True:
+            body = {"page_size": self.page_size, **({"start_cursor": cursor} if cursor else {})}
+            response = self.client.post(f"databases/{quote(self.database_id, safe='')}/query", json=body).json()
+            refs = [DocumentRef(page["id"], page["id"], "notion-page", self.name, page.get("last_edited_time"))
+                    for page in response.get("results", [])]
+            cursor = response.get("next_cursor") if response.get("has_more") else None
+            yield refs, cursor
+            if not cursor:
+                return
+
+    def _fetch(self, ref: DocumentRef) -> RawDocument:
+        blocks = []
+        cursor = None
+        while True:
+            params = {"page_size": 100, **({"start_cursor": cursor} if cursor else {})}
+            response = self.client.get(f"blocks/{quote(ref.id, safe='')}/children", params=params).json()
+            blocks.extend(response.get("results", []))
+            cursor = response.get("next_cursor") if response.get("has_more") else None
+            if not cursor:
+                break
+        return RawDocument(ref, text=notion_blocks_to_text(blocks))
+
+
+# ---------- Supabase Storage ----------
+class SupabaseStorageConnector(Connector):
+    """PDFs in a Supabase Storage bucket: the named objects, or every object under `prefix`."""
+    name = "supabase"
+
+    def __init__(self, names: Optional[List[str]] = None, bucket: str = None, prefix: str = "",
+                 page_size: int = 100, url: str = None, key: str = None):
+        url, key = url or SUPABASE_URL, key or SUPABASE_KEY
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+        self.client = PooledClient(self.name, f"{url.rstrip('/')}/storage/v1",
+                                   headers={"apikey": key, "Authorization": f"Bearer {key}"})
+        self.names = names
+        self.bucket = bucket or SUPABASE_BUCKET
+        self.prefix = prefix
+        self.page_size = page_size
+
+    @property
+    def scope(self) -> str:
+        return f"supabase:{self.bucket}/{self.prefix}"
+
+    def ref(self, name: str, modified_time: Optional[str] = None) -> DocumentRef:
+        return DocumentRef(name, name, "application/pdf", self.name, modified_time)
+
+    def list_pages(self, cursor: Optional[str] = None):
+        if self.names is not None:
+            yield [self.ref(n) for n in self.names], None
+            return
+        offset = int(cursor or 0)
+        while True:
+            body = {"prefix": self.prefix, "limit": self.page_size, "offset": offset,
+                    "sortBy": {"column": "name", "order": "asc"}}
+            objects = self.client.post(f"object/list/{quote(self.bucket, safe='')}", json=body).json()
+            # folders are listed with id null
+            refs = [self.ref(f"{self.prefix.rstrip('/')}/{o['name']}".lstrip("/"), o.get("updated_at"))
+                    for o in objects if o.get("id") and o["name"].lower().endswith(".pdf")]
+            offset += len(objects)
+            cursor = str(offset) if len(objects) == self.page_size else None
+            yield refs, cursor
+            if not cursor:
+                return
+
+    def _fetch(self, ref: DocumentRef) -> RawDocument:
+        path = f"object/{quote(self.bucket, safe='')}/{quote(ref.id)}"
+        return RawDocument(ref, content=self.client.get(path).content)
+
+
+def notion_blocks_to_text(blocks: List[Dict]) -> str:
+    text_parts = []
+    for block in blocks:
+        t = None
+        if block.get("type") == "paragraph":
+            rt = block["paragraph"].get("rich_text", [])
+            if rt:
+                t = "".join([r.get("plain_text", "") for r in rt])
+        elif block.get("type") == "heading_1":
+            rt = block["heading_1"].get("rich_text", [])
+            t = "".join([r.get("plain_text", "") for r in rt])
+        if t:
+            text_parts.append(t)
+    return "\n".join(text_parts)
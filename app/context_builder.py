@@ -0,0 +1,202 @@
+# app/context_builder.py
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import os
+import metrics
+
+# ---------- Configuration ----------
+# Tokens of retrieved text one prompt may carry, counted from the chunks' token offsets (no re-tokenizing).
+# The default is what two whole chunks took before, so merging frees room for neighbours instead of growing prompts.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+# Neighbouring chunks (each side of a hit) added while the budget has room; 0 keeps only the hits
+CONTEXT_EXPAND_NEIGHBORS = int(os.getenv("CONTEXT_EXPAND_NEIGHBORS", "1"))
+
+CONTEXT_TOKENS = metrics.histogram("context_tokens", "Tokens of retrieved text put into a prompt", (),
+                                   buckets=(64, 128, 256, 512, 800, 1024, 1536, 2048, 4096, 8192))
+
+# characters of the next chunk used to find where it starts inside the previous one
+_ALIGN_PROBE = 24
+
+
+@dataclass
+class _Piece:
+    chunk_no: int
+    start: int  # token offsets within the document
+    end: int
+    text: str
+    rank: int  # rank of the hit this piece is (or was expanded from)
+    hit: bool
+
+
+@dataclass
+class Passage:
+    """Contiguous text of one document, merged from overlapping / adjacent chunks."""
+    doc_id: str
+    source_name: str
+    pieces: List[_Piece] = field(default_factory=list)
+
+    @property
+    def rank(self) -> int:
+        return min(p.rank for p in self.pieces)
+
+    @property
+    def start(self) -> int:
+        return self.pieces[0].start
+
+    @property
+    def end(self) -> int:
+        return max(p.end for p in self.pieces)
+
+    @property
+    def tokens(self) -> int:
+        return self.end - self.start
+
+    def text(self) -> str:
+        text, end = self.pieces[0].text, self.pieces[0].end
+        for piece in self.pieces[1:]:
+            if piece.end <= end:
+                continue  # contained in what we already have
+            text = _append(text, piece.text, end - piece.start)
+            end = piece.end
+        return text
+
+    @property
+    def citation(self) -> str:
+        return self.source_name or self.doc_id
+
+
+@dataclass
+class Context:
+    passages: List[Passage]
+    hits_used: int = 0
+    hits_dropped: int = 0  # did not fit the budget
+    neighbors_added: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return sum(p.tokens for p in self.passages)
+
+    def text(self) -> str:
+        """Passages, best hit first, each under a compact [n] citation."""
+        return "\n\n".join(f"[{i}] {p.citation}\n{p.text()}" for i, p in enumerate(self.passages, 1))
+
+    def stats(self) -> Dict:
+        return {"passages": len(self.passages), "tokens": self.tokens, "hits_used": self.hits_used,
+                "hits_dropped": self.hits_dropped, "neighbors_added": self.neighbors_added}
+
+
+def _chunk_no(chunk_id: str) -> Optional[int]:
+    _, _, no = str(chunk_id).rpartition("__")
+    return int(no) if no.isdigit() else None
+
+
+def _covered(pieces) -> int:
+    """Tokens covered by the union of the pieces' [start, end) ranges."""
+    total, reach = 0, None
+    for p in sorted(pieces, key=lambda p: p.start):
+        if reach is None or p.start >= reach:
+            total += p.end - p.start
+            reach = p.end
+        elif p.end > reach:
+            total += p.end - reach
+            reach = p.end
+    return total
+
+
+def _append(text: str, nxt: str, overlap_tokens: int) -> str:
+    """
+    text + nxt without the part they share. Chunk texts are slices of the same
+    document, so the overlap is a suffix of `text` that is also a prefix of `nxt`.
+    """
+    if overlap_tokens <= 0:
+        return f"{text} {nxt}"
+    probe = nxt[:_ALIGN_PROBE]
+    pos = text.find(probe, max(0, len(text) - len(nxt)))
+    while pos != -1:
+        if nxt.startswith(text[pos:]):
+            return text + nxt[len(text) - pos:]
+        pos = text.find(probe, pos + 1)
+    # texts decoded from token ids (slow tokenizers) may not line up exactly: keep both
+    return f"{text} {nxt}"
+
+
+def _piece(row: Dict, rank: int, hit: bool) -> Optional[_Piece]:
+    chunk_no = _chunk_no(row.get("chunk_id"))
+    if chunk_no is None:
+        return None
+    start = int(row.get("start_token") or 0)
+    return _Piece(chunk_no, start, max(start, int(row.get("end_token") or start)), row.get("text") or "", rank, hit)
+
+
+def build_context(hits: List[Dict], snapshot=None, budget: int = None, neighbors: int = None) -> Context:
+    """
+    Prompt context from ranked hits (metadata rows). Hits are taken in rank
+    order while their new tokens fit `budget` (the best hit always does);
+    chunks of one document that overlap or touch are merged into one passage,
+    so the 64-token chunk overlap is sent once. With a snapshot, chunks next
+    to the hits are then added, nearest first, while there is room.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    neighbors = CONTEXT_EXPAND_NEIGHBORS if neighbors is None else neighbors
+    with metrics.stage("context_build"):
+        context = _build(hits, snapshot, budget, neighbors)
+    CONTEXT_TOKENS.observe(context.tokens)
+    return context
+
+
+def _build(hits: List[Dict], snapshot, budget: int, neighbors: int) -> Context:
+    docs: Dict[str, Dict[int, _Piece]] = {}
+    names: Dict[str, str] = {}
+    context = Context([])
+    used = 0
+
+    def try_add(doc_id: str, piece: _Piece) -> bool:
+        nonlocal used
+        pieces = docs.setdefault(doc_id, {})
+        if piece.chunk_no in pieces:
+            return False
+        before = _covered(pieces.values())
+        cost = _covered(list(pieces.values()) + [piece]) - before
+        if used and used + cost > budget:
+            return False
+        pieces[piece.chunk_no] = piece
+        used += cost
+        return True
+
+    taken = []
+    for rank, row in enumerate(hits):
+        piece = _piece(row, rank, True)
+        doc_id = row.get("doc_id", "")
+        names.setdefault(doc_id, row.get("source_name") or "")
+        if piece is None or piece.chunk_no in docs.get(doc_id, {}):
+            continue
+        if try_add(doc_id, piece):
+            context.hits_used += 1
+            taken.append((doc_id, piece))
+        else:
+            context.hits_dropped += 1
+
+    if snapshot is not None and neighbors > 0:
+        metadata = snapshot.metadata
+        for distance in range(1, neighbors + 1):
+            for doc_id, hit in taken:
+                for chunk_no in (hit.chunk_no - distance, hit.chunk_no + distance):
+                    if chunk_no < 0 or chunk_no in docs[doc_id]:
+                        continue
+                    row_id = metadata.row_for_chunk(f"{doc_id}__{chunk_no}")
+                    if row_id is None:
+                        continue
+                    piece = _piece(metadata.row(row_id), hit.rank, False)
+                    if piece is not None and try_add(doc_id, piece):
+                        context.neighbors_added += 1
+
+    for doc_id, pieces in docs.items():
+        passage = None
+        for piece in sorted(pieces.values(), key=lambda p: (p.start, p.chunk_no)):
+            if passage is None or piece.start > passage.end:
+                passage = Passage(doc_id, names.get(doc_id, ""))
+                context.passages.append(passage)
+            passage.pieces.append(piece)
+    context.passages.sort(key=lambda p: p.rank)
+    return context
@@ -0,0 +1,259 @@
+# app/dedup.py
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+import threading
+import hashlib
+import zlib
+import os
+import re
+import numpy as np
+import metrics
+
+# ---------- Configuration ----------
+# Check new chunks against indexed ones before embedding; a duplicate reuses the existing vector
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+# Estimated Jaccard similarity of two chunks' word 5-grams from which they count as near-duplicates;
+# 1 matches normalized text exactly only
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", "0.85"))
+# MinHash signature length, cut into LSH_BANDS bands: chunks sharing a whole band are compared.
+# Changing either only affects chunks fingerprinted afterwards.
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "64"))
+LSH_BANDS = int(os.getenv("LSH_BANDS", "8"))
+
+DEDUP_LOG = "dedup.i64"
+SHINGLE_WORDS = 5
+# stored rows verified per lookup (newest first)
+MAX_CANDIDATES = 8
+# log entries buffered in a dict before they are merged into the sorted arrays
+MERGE_ENTRIES = 65536
+
+DUPLICATES = metrics.counter("ingest_duplicate_chunks",
+                             "Chunks that reused an indexed chunk's vector instead of being embedded", ("match",))
+
+_rng = np.random.default_rng(20240611)  # fixed: fingerprints are persisted
+_MUL = _rng.integers(0, np.iinfo(np.uint64).max, MINHASH_PERMUTATIONS, dtype=np.uint64, endpoint=True) | np.uint64(1)
+_ADD = _rng.integers(0, np.iinfo(np.uint64).max, MINHASH_PERMUTATIONS, dtype=np.uint64, endpoint=True)
+_SHINGLE_PRIME = np.uint64(1099511628211)
+_WORD = re.compile(r"\w+")
+
+
+# ---------- Fingerprints ----------
+@dataclass
+class Fingerprint:
+    normalized: str
+    exact: int  # hash of the normalized text
+    signature: Optional[np.ndarray]  # MinHash, None when only exact matches are looked for
+    bands: List[int]  # one LSH key per band of the signature
+
+    @property
+    def keys(self) -> List[int]:
+        return [self.exact] + self.bands
+
+
+def _key(prefix: bytes, data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(prefix + data, digest_size=8).digest(), "little", signed=True)
+
+
+def normalize(text: str) -> List[str]:
+    """Case-folded words: whitespace, punctuation and case differences are not differences."""
+    return _WORD.findall((text or "").casefold())
+
+
+def signature(words: List[str]) -> np.ndarray:
+    """MinHash of the word 5-grams: each word hashed once, n-grams combined polynomially, multiply-shift permutations."""
+    hashes = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint64, count=len(words))
+    width = min(SHINGLE_WORDS, len(words))
+    n = len(words) - width + 1
+    shingles = hashes[:n].copy()
+    for j in range(1, width):
+        shingles = shingles * _SHINGLE_PRIME + hashes[j:j + n]
+    return ((_MUL[:, None] * shingles[None, :] + _ADD[:, None]) >> np.uint64(32)).min(axis=1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def fingerprint(text: str) -> Optional[Fingerprint]:
+    words = normalize(text)
+    if not words:
+        return None
+    normalized = " ".join(words)
+    exact = _key(b"=", normalized.encode())
+    if DEDUP_NEAR_THRESHOLD >= 1:
+        return Fingerprint(normalized, exact, None, [])
+    sig = signature(words)
+    width = len(sig) // LSH_BANDS
+    bands = [_key(bytes([b]), sig[b * width:(b + 1) * width].tobytes()) for b in range(LSH_BANDS)]
+    return Fingerprint(normalized, exact, sig, bands)
+
+
+# ---------- Persistent index ----------
+class DedupIndex:
+    """
+    Fingerprint keys -> row ids of one IndexStore, kept in an append-only log
+    of (key, row) pairs beside it and loaded on first use. Entries are only
+    hints: rows a crashed ingest never committed (or whose ids were reused)
+    can be named, so callers verify every candidate against its stored text.
+    """
+
+    def __init__(self, data_dir: str):
+        self.path = os.path.join(data_dir, DEDUP_LOG)
+        self._keys = np.empty(0, dtype=np.int64)  # sorted
+        self._rows = np.empty(0, dtype=np.int64)
+        self._recent: Dict[int, List[int]] = {}
+        self._n_recent = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            return len(self._keys) + self._n_recent
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + self._rows.nbytes + 16 * self._n_recent
+
+    def _load(self):
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size % 16:
+            # torn pair from a crashed append: later appends must stay aligned
+            os.truncate(self.path, size - size % 16)
+        pairs = np.fromfile(self.path, dtype=np.int64).reshape(-1, 2)
+        self._merge(pairs[:, 0], pairs[:, 1])
+
+    def _merge(self, keys: np.ndarray, rows: np.ndarray):
+        keys = np.concatenate((self._keys, keys))
+        rows = np.concatenate((self._rows, rows))
+        order = np.argsort(keys, kind="stable")  # stable: rows of one key stay oldest first
+        self._keys, self._rows = keys[order], rows[order]
+
+    def lookup(self, key: int) -> List[int]:
+        """Rows fingerprinted with `key`, newest first."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            lo, hi = np.searchsorted(self._keys, key, "left"), np.searchsorted(self._keys, key, "right")
+            rows = self._rows[lo:hi].tolist() + self._recent.get(key, [])
+        return rows[::-1]
+
+    def add(self, entries: List[Tuple[int, Fingerprint]]):
+        """Record (row id, fingerprint) pairs of rows just committed to the store."""
+        pairs = [(key, row) for row, fp in entries for key in fp.keys]
+        if not pairs:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            with open(self.path, "ab") as fh:
+                # no fsync: a lost tail only means fewer duplicates found
+                fh.write(np.array(pairs, dtype=np.int64).tobytes())
+            for key, row in pairs:
+                self._recent.setdefault(key, []).append(row)
+            self._n_recent += len(pairs)
+            if self._n_recent >= MERGE_ENTRIES:
+                keys = np.fromiter((k for k, rows in self._recent.items() for _ in rows), dtype=np.int64)
+                rows = np.fromiter((r for rows in self._recent.values() for r in rows), dtype=np.int64)
+                self._merge(keys, rows)
+                self._recent, self._n_recent = {}, 0
+
+
+# ---------- Ingest ----------
+class Deduplicator:
+    """
+    Marks the chunks of one ingest run that duplicate an indexed chunk, or an
+    earlier chunk of the same run, before they are embedded. A duplicate row
+    gets "duplicate_of": the row id of a stored chunk, or the chunk_id of a
+    run chunk not published yet; IndexStore.add reuses that chunk's vector.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.index: DedupIndex = store.dedup
+        self._pending: Dict[int, str] = {}  # fingerprint key -> chunk_id, for run chunks not yet published
+        self._fingerprints: Dict[str, Fingerprint] = {}  # chunk_id -> fingerprint, until published
+        self._referenced = set()  # pending chunk_ids that duplicates point at
+        self._published: Dict[str, int] = {}  # ... and their row ids once published
+        self.exact = 0
+        self.near = 0
+
+    def check(self, rows: List[Dict]):
+        with metrics.stage("dedup", chunks=len(rows)):
+            for row in rows:
+                fp = fingerprint(row.get("text"))
+                if fp is None:
+                    continue
+                match = self._find(fp)
+                if match is not None:
+                    target, kind = match
+                    row["duplicate_of"] = target
+                    if isinstance(target, str):
+                        self._referenced.add(target)
+                    if kind == "exact":
+                        self.exact += 1
+                    else:
+                        self.near += 1
+                    DUPLICATES.inc(match=kind)
+                # duplicates too: a later exact copy should match exactly, whatever this one matched
+                for key in fp.keys:
+                    self._pending.setdefault(key, row["chunk_id"])
+                self._fingerprints[row["chunk_id"]] = fp
+
+    def _find(self, fp: Fingerprint) -> Optional[Tuple[Union[int, str], str]]:
+        # exact: same normalized text (the pending map trusts the 64-bit hash)
+        if fp.exact in self._pending:
+            return self._pending[fp.exact], "exact"
+        for row in self._candidates([fp.exact]):
+            if " ".join(normalize(self.store.metadata_store.text(row))) == fp.normalized:
+                return row, "exact"
+        if fp.signature is None:
+            return None
+        for chunk_id in dict.fromkeys(self._pending[k] for k in fp.bands if k in self._pending):
+            if similarity(fp.signature, self._fingerprints[chunk_id].signature) >= DEDUP_NEAR_THRESHOLD:
+                return chunk_id, "near"
+        for row in self._candidates(fp.bands):
+            words = normalize(self.store.metadata_store.text(row))
+            if words and similarity(fp.signature, signature(words)) >= DEDUP_NEAR_THRESHOLD:
+                return row, "near"
+        return None
+
+    def _candidates(self, keys: List[int]) -> List[int]:
+        """Published, live, vector-backed rows the index names for any of keys (at most MAX_CANDIDATES)."""
+        metadata = self.store.metadata_store
+        n_rows = min(len(self.store.snapshot().metadata), metadata.n_vectors)
+        rows = dict.fromkeys(r for key in keys for r in self.index.lookup(key))
+        return [r for r in rows if r < n_rows and not metadata.is_deleted(r)][:MAX_CANDIDATES]
+
+    def resolve(self, rows: List[Dict]):
+        """Point duplicates of run chunks published since they were checked at those chunks' row ids."""
+        for row in rows:
+            target = row.get("duplicate_of")
+            if isinstance(target, str) and target in self._published:
+                row["duplicate_of"] = self._published[target]
+
+    def published(self, rows: List[Dict], first_row: int):
+        """Rows just added to the store from row id first_row: fingerprint them there."""
+        entries = []
+        for i, row in enumerate(rows):
+            chunk_id = row["chunk_id"]
+            fp = self._fingerprints.pop(chunk_id, None)
+            if fp is None:
+                continue
+            entries.append((first_row + i, fp))
+            for key in fp.keys:
+                if self._pending.get(key) == chunk_id:
+                    del self._pending[key]
+            if chunk_id in self._referenced:
+                self._published[chunk_id] = first_row + i
+        self.index.add(entries)
+
+    @property
+    def duplicates(self) -> int:
+        return self.exact + self.near
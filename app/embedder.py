@@ -0,0 +1,169 @@
+# app/embedder.py
+
+from typing import List, Optional
+import threading
+import os
+import numpy as np
+
+# ---------- Configuration ----------
+# torch | onnx | onnx_int8
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+# Intra-op threads per encode call; 0 keeps the runtime's default (all cores)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_SEQ_LENGTH = int(os.getenv("EMBED_MAX_SEQ_LENGTH", "256"))
+# Sort texts by length before batching so each batch pads to similar lengths
+EMBED_LENGTH_BUCKETING = os.getenv("EMBED_LENGTH_BUCKETING", "1") == "1"
+# Where exported / quantized ONNX graphs are cached
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+BACKENDS = ("torch", "onnx", "onnx_int8")
+
+
+class Embedder:
+    """
+    Sentence embedding backend. encode() keeps SentenceTransformer's call
+    signature so callers don't care which backend is loaded.
+    """
+    backend = "base"
+
+    def __init__(self, model_name: str, batch_size: int = EMBED_BATCH_SIZE,
+                 max_seq_length: int = EMBED_MAX_SEQ_LENGTH, bucketing: bool = EMBED_LENGTH_BUCKETING):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seq_length = max_seq_length
+        self.bucketing = bucketing
+        self.tokenizer = None
+
+    def encode(self, texts, batch_size: Optional[int] = None, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        batch_size = batch_size or self.batch_size
+        if not texts:
+            return np.empty((0, self.dim), dtype="float32")
+        # longest first: batches hold similar lengths, so little padding, and a
+        # too-long batch fails on the first call rather than the last
+        order = np.argsort([-len(t) for t in texts], kind="stable") if self.bucketing else np.arange(len(texts))
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        for i in range(0, len(texts), batch_size):
+            idx = order[i:i + batch_size]
+            out[idx] = self._encode_batch([texts[j] for j in idx])
+        return out[0] if single else out
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    @property
+    def dim(self) -> int:
+        raise NotImplementedError
+
+
+class TorchEmbedder(Embedder):
+    """fp32 PyTorch SentenceTransformer (the baseline)."""
+    backend = "torch"
+
+    def __init__(self, model_name: str, threads: int = EMBED_THREADS, **kwargs):
+        super().__init__(model_name, **kwargs)
+        from sentence_transformers import SentenceTransformer
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model.max_seq_length = min(self.max_seq_length, self.model.max_seq_length or self.max_seq_length)
+        self.tokenizer = self.model.tokenizer
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+class OnnxEmbedder(Embedder):
+    """
+    ONNX Runtime encoder with mean pooling + L2 normalization (the
+    all-MiniLM-L6-v2 recipe). With quantize=True the graph's weights are
+    dynamically quantized to int8. Graphs are exported once into ONNX_CACHE_DIR.
+    """
+    backend = "onnx"
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = EMBED_THREADS,
+                 cache_dir: str = ONNX_CACHE_DIR, **kwargs):
+        super().__init__(model_name, **kwargs)
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        self.backend = "onnx_int8" if quantize else "onnx"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        path = export_onnx(model_name, model_dir, self.tokenizer)
+        if quantize:
+            path = quantize_onnx(path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self._dim = self.session.get_outputs()[0].shape[-1]
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+        feeds = {k: v.astype("int64") for k, v in enc.items() if k in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = enc["attention_mask"][..., None].astype("float32")
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return (pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)).astype("float32")
+
+
+# ---------- ONNX export / quantization ----------
+_export_lock = threading.Lock()
+
+
+def export_onnx(model_name: str, model_dir: str, tokenizer) -> str:
+    """Export the transformer (without pooling) to model_dir/model.onnx unless it is already there."""
+    path = os.path.join(model_dir, "model.onnx")
+    with _export_lock:
+        if os.path.exists(path):
+            return path
+        import torch
+        from transformers import AutoModel
+        print(f"🔹 Exporting {model_name} to ONNX...")
+        os.makedirs(model_dir, exist_ok=True)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        axes = {n: {0: "batch", 1: "sequence"} for n in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(sample[n] for n in names), path + ".tmp", input_names=names,
+                              output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=14)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def quantize_onnx(path: str) -> str:
+    """Dynamic (weight-only int8, activations quantized at run time) copy of an ONNX graph."""
+    out = path.replace(".onnx", ".int8.onnx")
+    with _export_lock:
+        if not os.path.exists(out):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            print("🔹 Quantizing ONNX model to int8...")
+            quantize_dynamic(path, out + ".tmp", weight_type=QuantType.QInt8)
+            os.replace(out + ".tmp", out)
+    return out
+
+
+def create_embedder(model_name: str, backend: str = None, **kwargs) -> Embedder:
+    backend = backend or EMBED_BACKEND
+    if backend == "torch":
+        return TorchEmbedder(model_name, **kwargs)
+    if backend in ("onnx", "onnx_int8"):
+        return OnnxEmbedder(model_name, quantize=backend == "onnx_int8", **kwargs)
+    raise ValueError(f"unknown embedding backend {backend!r}; expected one of {BACKENDS}")
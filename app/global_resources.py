@@ -1,53 +1,142 @@
 # app/global_resources.py
 
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer
-import faiss
-import pandas as pd
+from typing import Dict
+from index_store import IndexStore
+from tenant_manager import TenantManager, TenantShard
+import embedder
+import reranker
+import threading
+import time
 import os
 
-INDEX_PATH = "/database/faiss_index.bin"
-META_PATH = "/database/metadata.parquet"
+_IMPORT_STARTED = time.perf_counter()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE_DIR = os.getenv("DATABASE_DIR", os.path.join(BASE_DIR, "database"))
+INDEX_PATH = os.path.join(DATABASE_DIR, "faiss_index.bin")
+META_DIR = os.path.join(DATABASE_DIR, "metadata")
+LEGACY_META_PATH = os.path.join(DATABASE_DIR, "metadata.parquet")
+TENANTS_DIR = os.path.join(DATABASE_DIR, "tenants")
 
 # ---------- Configuration ----------
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 CHUNK_SIZE_TOKENS = 400
 CHUNK_OVERLAP_TOKENS = 64
 EMBED_DIM = 384
+# eager: load in the startup hook before serving | background: serve /health/live at once, warm up on a thread | lazy: on first use
+RESOURCE_WARMUP = os.getenv("RESOURCE_WARMUP", "background")
 
+# Loaded once per process (or once in the gunicorn master with preload_app, then shared by fork)
 model = None
 tokenizer = None
-faiss_index = None
-metadata_df = None
 
+# Single index + metadata store shared by every router
+index_store = IndexStore(INDEX_PATH, META_DIR, EMBED_DIM, legacy_meta_path=LEGACY_META_PATH)
 
-def load_resources():
-    global model, tokenizer, faiss_index, metadata_df
+# seconds spent in each startup step, for logs and /health/ready
+startup_timings: Dict[str, float] = {}
+_load_lock = threading.RLock()
+_index_loaded = False
+_warmup_thread = None
+_warmup_error = None
+
+
+def _timed(step: str, fn):
+    started = time.perf_counter()
+    result = fn()
+    startup_timings[step] = round(time.perf_counter() - started, 3)
+    return result
 
-    print("Initializing global resources...")
 
+def get_model():
+    """The shared embedding model, loaded on first use."""
+    global model, tokenizer
     if model is None:
-        print("🔹 Loading SentenceTransformer model...")
-        model = SentenceTransformer(MODEL_NAME)
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-        print("Model and tokenizer loaded successfully.")
+        with _load_lock:
+            if model is None:
+                print(f"🔹 Loading {embedder.EMBED_BACKEND} embedding model...")
+                # torch / onnx / onnx_int8 backends share SentenceTransformer's encode() signature
+                loaded = _timed("model_load", lambda: embedder.create_embedder(MODEL_NAME))
+                tokenizer = loaded.tokenizer
+                model = loaded
+    return model
+
+
+def get_tokenizer():
+    """The model's tokenizer. Processes that only chunk (extract workers) load it without the model."""
+    global tokenizer
+    if tokenizer is None:
+        with _load_lock:
+            if tokenizer is None:
+                from transformers import AutoTokenizer
+                tokenizer = _timed("tokenizer_load", lambda: AutoTokenizer.from_pretrained(MODEL_NAME))
+    return tokenizer
+
+
+def get_index_store() -> IndexStore:
+    """The shared index store, loaded from disk on first use."""
+    global _index_loaded
+    if not _index_loaded:
+        with _load_lock:
+            if not _index_loaded:
+                _timed("index_load", index_store.load)
+                _index_loaded = True
+    return index_store
+
+
+# Every other tenant gets its own store under DATABASE_DIR/tenants/<tenant>/, loaded on demand
+tenant_manager = TenantManager(TENANTS_DIR, EMBED_DIM, default_loader=get_index_store)
+
+
+def get_tenant(tenant: str = None) -> TenantShard:
+    """A tenant's shard (store + answer cache + stats); the default tenant's store is index_store."""
+    return tenant_manager.get(tenant)
+
+
+def load_resources():
+    """Load the model and the index (idempotent)."""
+    if is_ready():
+        return
+    print("Initializing global resources...")
+    started = time.perf_counter()
+    get_model()
+    print("Model and tokenizer loaded successfully.")
+    get_index_store()
+    if reranker.RERANK_ENABLED:
+        # queries rerank by default: load the cross-encoder before the first one
+        _timed("reranker_load", reranker.get_reranker)
+    startup_timings["load_total"] = round(time.perf_counter() - started, 3)
+    startup_timings["since_import"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+    print(f"Global resources loaded and ready for use. Startup timings (s): {startup_timings}")
+
+
+def start_warmup(mode: str = None):
+    """Called from the app's startup hook according to RESOURCE_WARMUP."""
+    global _warmup_thread
+    mode = mode or RESOURCE_WARMUP
+    if is_ready() or mode == "lazy":
+        return
+    if mode == "eager":
+        load_resources()
+        return
+    if _warmup_thread is None or not _warmup_thread.is_alive():
+        _warmup_thread = threading.Thread(target=_warmup, name="resource-warmup", daemon=True)
+        _warmup_thread.start()
 
-    if os.path.exists(INDEX_PATH):
-        print("🔹 Loading FAISS index...")
-        faiss_index = faiss.read_index(INDEX_PATH)
-    else:
-        print("⚠️ No FAISS index found; initializing empty index")
-        faiss_index = faiss.IndexFlatL2(384)
 
-    if os.path.exists(META_PATH):
-        print("🔹 Loading metadata file...")
-        metadata_df = pd.read_parquet(META_PATH)
-    else:
-        print("Creating new empty metadata store...")
-        metadata_df = pd.DataFrame(columns=["doc_id", "chunk_id", "source_name", "mimeType", "start_token", "end_token", "text"])
+def _warmup():
+    global _warmup_error
+    try:
+        load_resources()
+    except Exception as e:
+        _warmup_error = str(e)
+        print(f"Resource warmup failed: {e}")
 
-    print("Global resources loaded and ready for use.")
 
+def is_ready() -> bool:
+    return model is not None and _index_loaded
 
 
-load_resources()
\ No newline at end of file
+def readiness() -> Dict:
+    return {"ready": is_ready(), "model_loaded": model is not None, "index_loaded": _index_loaded,
+            "error": _warmup_error, "startup_timings": dict(startup_timings)}
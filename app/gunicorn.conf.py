@@ -0,0 +1,36 @@
+# app/gunicorn.conf.py
+#
+#   gunicorn -c gunicorn.conf.py index:app
+#
+# The app, model and index are loaded once in the master and forked into the
+# workers, which share the read-only weights / index pages copy-on-write
+# instead of each loading its own copy.
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def on_starting(server):
+    # before any fork: no threads may be running yet, so load synchronously
+    import global_resources
+    global_resources.load_resources()
+    if global_resources.index_store.rebuilding:
+        # a thread would not survive the fork; finish the rebuild here
+        global_resources.index_store.rebuild(wait=True)
+    server.log.info(f"Startup timings (s): {global_resources.startup_timings}")
+
+
+def post_fork(server, worker):
+    # forked workers inherit the loaded model; limit intra-op threads so workers don't oversubscribe cores
+    threads = int(os.getenv("EMBED_THREADS", "0"))
+    if threads > 0:
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
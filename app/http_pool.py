@@ -0,0 +1,202 @@
+# app/http_pool.py
+
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+import threading
+import random
+import time
+import os
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------- Configuration ----------
+# Keep-alive connections kept per host in the shared session (and the most used at once)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+# Seconds to connect / between bytes of a response
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+# Retries of a request after a transient failure (connection error, timeout, 408/425/429/5xx)
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "5"))
+# Backoff before retry n is a random delay in [0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2**n)]
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+@lru_cache(maxsize=None)
+def shared_session() -> requests.Session:
+    """One pooled session per process: TCP + TLS connections are reused across requests and connectors."""
+    session = requests.Session()
+    # retries are done by PooledClient, which knows about Retry-After and records them
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds (it is either a number of seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a server's Retry-After wins when it asks for longer."""
+    delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+# ---------- Metrics ----------
+class ConnectorMetrics:
+    """Request and download counters of one connector (all its instances), thread-safe."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0  # 429 responses
+        self.failures = 0  # requests given up on
+        self.request_seconds = 0.0
+        self.documents = 0
+        self.document_failures = 0
+        self.bytes = 0
+        self._first = None
+        self._last = None
+
+    def record_request(self, seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.request_seconds += seconds
+
+    def record_retry(self, throttled: bool = False):
+        with self._lock:
+            self.retries += 1
+            self.throttled += int(throttled)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def record_document(self, started: float, n_bytes: int, ok: bool = True):
+        now = time.time()
+        with self._lock:
+            if ok:
+                self.documents += 1
+                self.bytes += n_bytes
+            else:
+                self.document_failures += 1
+            self._first = started if self._first is None else min(self._first, started)
+            self._last = now if self._last is None else max(self._last, now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            # throughput over the time documents were being fetched (first start to last finish)
+            active = (self._last - self._first) if self._first is not None else 0.0
+            return {
+                "connector": self.name,
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failures": self.failures,
+                "avg_request_ms": round(1000 * self.request_seconds / self.requests, 2) if self.requests else 0.0,
+                "documents": self.documents,
+                "document_failures": self.document_failures,
+                "bytes": self.bytes,
+                "docs_per_s": round(self.documents / active, 2) if active > 0 else 0.0,
+                "mb_per_s": round(self.bytes / 2 ** 20 / active, 3) if active > 0 else 0.0,
+            }
+
+
+_metrics: Dict[str, ConnectorMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def connector_metrics(name: str) -> ConnectorMetrics:
+    with _metrics_lock:
+        if name not in _metrics:
+            _metrics[name] = ConnectorMetrics(name)
+        return _metrics[name]
+
+
+def all_connector_stats() -> Dict[str, Dict]:
+    with _metrics_lock:
+        metrics = list(_metrics.values())
+    return {m.name: m.stats() for m in metrics}
+
+
+# ---------- Client ----------
+class PooledClient:
+    """
+    HTTP client of one source API on the shared session. Transient failures
+    are retried with exponential backoff; a 429's Retry-After pauses every
+    thread using this client, not just the one that was throttled.
+    """
+
+    def __init__(self, name: str, base_url: str, headers: Optional[Dict[str, str]] = None,
+                 auth: Optional[Callable[[], Dict[str, str]]] = None, max_retries: int = HTTP_MAX_RETRIES,
+                 timeout: float = HTTP_TIMEOUT):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.headers = dict(headers or {})
+        self.auth = auth  # called per attempt, so refreshed tokens are picked up
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.metrics = connector_metrics(name)
+        self._paused_until = 0.0
+
+    def session(self) -> requests.Session:
+        return shared_session()
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        url = path if path.startswith(("http://", "https://")) else f"{self.base_url}/{path.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        extra_headers = kwargs.pop("headers", None) or {}
+        attempt = 0
+        while True:
+            wait = self._paused_until - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            headers = {**self.headers, **(self.auth() if self.auth else {}), **extra_headers}
+            throttled = False
+            started = time.perf_counter()
+            try:
+                response = self.session().request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.record_request(time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    self.metrics.record_failure()
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"⚠️ {self.name}: {type(e).__name__} on {method} {url}; retrying in {delay:.1f}s")
+            else:
+                self.metrics.record_request(time.perf_counter() - started)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    if not response.ok:
+                        self.metrics.record_failure()
+                    response.raise_for_status()
+                    return response
+                retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                delay = backoff_delay(attempt, retry_after)
+                throttled = response.status_code == 429
+                if throttled:
+                    self._paused_until = max(self._paused_until, time.time() + delay)
+                response.close()
+            self.metrics.record_retry(throttled)
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
@@ -1,8 +1,9 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from routers import data_fetch_and_store, uploaded_pdf, main
-from global_resources import load_resources
+from routers import data_fetch_and_store, uploaded_pdf, main, job_status, tenant_stats, metrics as metrics_router
+import global_resources
+import metrics
 from typing import Dict
 import uvicorn
 import time
@@ -33,12 +34,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware for request timing and logging
+# Middleware for request timing, metrics and (sampled) tracing
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     start_time = time.time()
+    trace = metrics.start_trace(f"{request.method} {request.url.path}", force=request.headers.get("X-Trace") == "1")
     response = await call_next(request)
     process_time = time.time() - start_time
+    # the route template, not the raw path, so /tenants/{tenant} stays one series
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.HTTP_SECONDS.observe(process_time, method=request.method, route=route, status=response.status_code)
+    if trace is not None:
+        metrics.finish_trace(trace, status=response.status_code)
+        response.headers["X-Trace-Id"] = trace.id
     response.headers["X-Process-Time"] = str(process_time)
     logger.info(f"Request to {request.url.path} took {process_time:.2f} seconds")
     return response
@@ -54,8 +62,14 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         }
     )
 
-# Health check endpoint
+# Model + index load: in the background by default so the process answers /health/live immediately
+@app.on_event("startup")
+async def warm_up_resources():
+    global_resources.start_warmup()
+
+# Liveness: the process is up and serving (never waits on model/index loading)
 @app.get("/health")
+@app.get("/health/live")
 async def health_check() -> Dict[str, str]:
     return {
         "status": "healthy",
@@ -63,6 +77,12 @@ async def health_check() -> Dict[str, str]:
         "timestamp": str(time.time())
     }
 
+# Readiness: model and index are loaded; 503 until then
+@app.get("/health/ready")
+async def readiness_check():
+    state = global_resources.readiness()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
 # API version prefix
 api_v1_prefix = "/api/v1"
 
@@ -78,6 +98,18 @@ app.include_router(
     main.router,
     tags=["Main Operations"]
 )
+app.include_router(
+    job_status.router,
+    tags=["Jobs"]
+)
+app.include_router(
+    tenant_stats.router,
+    tags=["Tenants"]
+)
+app.include_router(
+    metrics_router.router,
+    tags=["Metrics"]
+)
 
 # Root endpoint
 @app.get("/")
@@ -91,5 +123,5 @@ async def root() -> Dict[str, str]:
 
 
 if __name__ == "__main__":
-    load_resources()
+    # resources load in the server process's startup hook, not here (reload would load them twice)
     uvicorn.run("index:app", reload=True)
\ No newline at end of file
@@ -0,0 +1,615 @@
+# app/index_store.py
+
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from typing import List, Dict, Iterable, Optional, Tuple
+from metadata_store import MetadataStore, MetadataView
+from sync_state import SyncState
+from lexical_index import LexicalSegment, LexicalView, LEXICAL_MAX_SEGMENTS
+from dedup import DedupIndex
+import ann_index
+import metrics
+import threading
+import shutil
+import glob
+import json
+import time
+import os
+import faiss
+import numpy as np
+
+MANIFEST = "manifest.json"
+BASE_GLOB = "index-*.faiss"
+LEXICAL_DIR = "lexical"
+# rows tokenized per segment when backfilling the BM25 index of an older corpus
+LEXICAL_BACKFILL_ROWS = 50000
+
+# ---------- Configuration ----------
+# Memory-map the base index file instead of reading it into RAM (shared page cache across workers)
+INDEX_MMAP = os.getenv("INDEX_MMAP", "1") == "1"
+# Rows appended since the last compaction are searched in a small exact delta index;
+# past this many the store compacts them into a new base index
+INDEX_DELTA_MAX_ROWS = int(os.getenv("INDEX_DELTA_MAX_ROWS", "20000"))
+# ...or once this fraction of the base index has been deleted (filtered at search time until then)
+INDEX_COMPACT_DELETED_FRACTION = float(os.getenv("INDEX_COMPACT_DELETED_FRACTION", "0.2"))
+# Metadata segment files before they are merged into one
+METADATA_MAX_SEGMENTS = int(os.getenv("METADATA_MAX_SEGMENTS", "64"))
+# Filtered searches matching at most this many rows scan their stored vectors exactly
+# instead of searching the ANN index with an ID selector
+FILTER_EXACT_MAX_ROWS = int(os.getenv("FILTER_EXACT_MAX_ROWS", "5000"))
+# Filters (row sets + bitmaps) kept per snapshot
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "64"))
+
+
+class Exclusion:
+    """Search-time filter for deleted rows that are still in the base index."""
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = np.ascontiguousarray(ids, dtype="int64")
+        # both selectors must outlive every search that uses them
+        self._batch = faiss.IDSelectorBatch(self.ids)
+        self.selector = faiss.IDSelectorNot(self._batch)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class RowFilter:
+    """Live rows of one snapshot matching a metadata filter, with a FAISS bitmap selector over them."""
+
+    def __init__(self, rows: np.ndarray, n_rows: int):
+        self.rows = rows  # ascending
+        self.n_rows = n_rows
+        self._bitmap = None
+        self._selector = None
+        self._unindexed = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def unindexed(self, metadata: MetadataView) -> "RowFilter":
+        """The matching duplicates the vector index holds no entry for (their group's is indexed instead)."""
+        if self._unindexed is None:
+            rows = self.rows[~metadata.indexed_mask(self.rows)] if len(self.rows) else self.rows
+            self._unindexed = RowFilter(rows, self.n_rows)
+        return self._unindexed
+
+    @property
+    def selector(self):
+        """IDSelectorBitmap over the matching rows, built on first use (only large filters need it)."""
+        if self._selector is None:
+            mask = np.zeros(self.n_rows, dtype=np.bool_)
+            mask[self.rows] = True
+            bitmap = np.packbits(mask, bitorder="little")
+            # the bitmap must outlive every search that uses the selector
+            self._bitmap = bitmap
+            self._selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        return self._selector
+
+    def keep(self, rows: np.ndarray) -> np.ndarray:
+        """Mask of `rows` that match."""
+        i = np.minimum(np.searchsorted(self.rows, rows), max(len(self.rows) - 1, 0))
+        return self.rows[i] == rows if len(self.rows) else np.zeros(len(rows), dtype=np.bool_)
+
+    def exact_search(self, metadata: MetadataView, queries: np.ndarray, k: int):
+        """Brute-force top-k over the matching rows' stored vectors. Returns (distances, ids) like faiss."""
+        rows = self.rows[self.rows < metadata.store.n_vectors]
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        distances = np.full((len(queries), k), np.inf, dtype="float32")
+        ids = np.full((len(queries), k), -1, dtype="int64")
+        if len(rows):
+            found_d, found_i = faiss.knn(queries, np.ascontiguousarray(metadata.vectors(rows)), min(k, len(rows)))
+            distances[:, :found_d.shape[1]] = found_d
+            ids[:, :found_i.shape[1]] = np.where(found_i >= 0, rows[np.maximum(found_i, 0)], -1)
+        return distances, ids
+
+
+def filter_key(filters: Optional[Dict[str, List[str]]]) -> Tuple:
+    """Hashable, order-independent form of a metadata filter; () for no filter."""
+    return tuple(sorted((col, tuple(sorted(set(values)))) for col, values in (filters or {}).items() if values))
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Immutable view of the index and its metadata at one version."""
+    version: int
+    index: faiss.Index  # base index: never modified once published (possibly memory-mapped)
+    metadata: MetadataView
+    exclusion: Optional[Exclusion] = None
+    delta: Optional[faiss.Index] = None  # exact index over rows added since the base was built
+    lexical: LexicalView = field(default_factory=LexicalView)  # BM25 postings over the same row ids
+    _filters: OrderedDict = field(default_factory=OrderedDict, compare=False, repr=False)
+
+    @property
+    def total_chunks(self) -> int:
+        """Live (searchable) chunks."""
+        delta = self.delta.ntotal if self.delta is not None else 0
+        return self.index.ntotal + delta - (len(self.exclusion) if self.exclusion else 0)
+
+    @property
+    def selector(self):
+        return self.exclusion.selector if self.exclusion else None
+
+    def filter(self, filters: Optional[Dict[str, List[str]]]) -> Optional[RowFilter]:
+        """
+        RowFilter for {column: [values]} (values OR-ed, columns AND-ed) on doc_id, source_name
+        or mimeType; None without filters. Cached per snapshot, so repeated filters are free.
+        """
+        key = filter_key(filters)
+        if not key:
+            return None
+        row_filter = self._filters.get(key)
+        if row_filter is None:
+            row_filter = RowFilter(self.metadata.rows_matching(dict(key)), len(self.metadata))
+            self._filters[key] = row_filter
+            while len(self._filters) > FILTER_CACHE_SIZE:
+                self._filters.popitem(last=False)
+        return row_filter
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               row_filter: Optional[RowFilter] = None):
+        """Top-k over base + delta, deleted rows excluded. Returns (distances, ids) like faiss."""
+        sel = self.selector
+        if row_filter is not None:
+            if len(row_filter) <= FILTER_EXACT_MAX_ROWS:
+                return row_filter.exact_search(self.metadata, queries, k)
+            # matching rows are live, so the filter's bitmap replaces the deletion selector
+            sel = row_filter.selector
+        distances, ids = ann_index.search(self.index, queries, k, nprobe=nprobe, ef_search=ef_search, sel=sel)
+        if self.delta is not None and self.delta.ntotal:
+            delta_sel = row_filter.selector if row_filter is not None else None
+            delta_distances, delta_ids = ann_index.search(self.delta, queries, k, sel=delta_sel)
+            distances, ids = merge_hits(distances, ids, delta_distances, delta_ids, k)
+        if row_filter is not None and len(row_filter.unindexed(self.metadata)):
+            # a filter can match a duplicate without matching the row indexed for its group
+            dup_distances, dup_ids = row_filter.unindexed(self.metadata).exact_search(self.metadata, queries, k)
+            distances, ids = merge_hits(distances, ids, dup_distances, dup_ids, k)
+        return distances, ids
+
+    def lexical_search(self, query: str, k: int, row_filter: Optional[RowFilter] = None):
+        """
+        BM25 top-k over this version's live (and matching) rows. Returns (rows, scores), best first.
+        Duplicates are searched too: a near-duplicate shares a vector, not its words.
+        """
+        keep = row_filter.keep if row_filter is not None else self.metadata.live_mask
+        return self.lexical.search(query, k, len(self.metadata), keep=keep)
+
+
+def merge_hits(d1: np.ndarray, i1: np.ndarray, d2: np.ndarray, i2: np.ndarray, k: int):
+    """Merge two (distances, ids) result sets (smaller distance first) into the top k."""
+    distances = np.hstack((d1, d2))
+    ids = np.hstack((i1, i2))
+    distances = np.where(ids < 0, np.inf, distances)
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class IndexStore:
+    """
+    Shared FAISS index + metadata with versioned copy-on-write updates.
+
+    Readers call snapshot() and search whatever version they got; it is never
+    mutated afterwards. Writers are serialized, build the next version on a
+    copy and publish it with a single reference swap, so queries never wait
+    on an ingest.
+
+    FAISS ids are metadata row ids. On disk the store is a base index file
+    plus the metadata store's append-only segments and vector/text blobs,
+    which act as a write-ahead log for everything added since the base was
+    written. manifest.json, swapped atomically, is the commit point: it names
+    the base file and how far the log is committed. An add appends to the log
+    and rewrites only the small manifest; in memory new rows go to a small
+    exact delta index. Compaction (on a background thread, when the delta or
+    the deleted share of the base grows, or the configured ann_index backend
+    calls for a retrain) builds a new base from the stored vectors and swaps
+    it in. On load the base is memory-mapped and only the delta is replayed.
+
+    Every add also appends a BM25 segment over the new rows' text (see
+    lexical_index); segments are committed by the same manifest and published
+    in the same snapshot, so keyword and vector search always agree on rows.
+
+    Rows marked "duplicate_of" another row (see dedup) are stored with a copy
+    of its vector but not indexed while an earlier live row of their group is;
+    when that row is deleted the next live duplicate is indexed in its place.
+    """
+
+    def __init__(self, index_path: str, meta_dir: str, dim: int, legacy_meta_path: str = None, backend: str = None):
+        self.index_path = index_path  # single-file index of older versions, imported once
+        self.data_dir = os.path.dirname(index_path)
+        self.manifest_path = os.path.join(self.data_dir, MANIFEST)
+        self.lexical_dir = os.path.join(self.data_dir, LEXICAL_DIR)
+        self.meta_dir = meta_dir
+        self.legacy_meta_path = legacy_meta_path
+        self.dim = dim
+        self.backend = backend or ann_index.INDEX_BACKEND
+        self.metadata_store = MetadataStore(meta_dir, dim)
+        self.dedup = DedupIndex(self.data_dir)
+        # per-document hashes / cursors of connector syncs that wrote into this store
+        self.sync_state = SyncState(os.path.join(self.data_dir, "sync_state.json"))
+        self.manifest: Dict = {}
+        self._write_lock = threading.Lock()
+        self._rebuild_thread = None
+        self.last_rebuild = None
+        self._snapshot = IndexSnapshot(0, ann_index.new_index(dim), self.metadata_store.view(0), None,
+                                       ann_index.new_index(dim))
+
+    def load(self):
+        """(Re)load index and metadata from disk and publish them as a new version."""
+        with self._write_lock:
+            manifest = self._read_manifest()
+            if manifest is None:
+                base, base_rows = self._import_legacy()
+            else:
+                print("🔹 Loading metadata store...")
+                self.metadata_store.load(committed=manifest)
+                print("🔹 Loading FAISS index...")
+                self.manifest = manifest
+                base, base_rows = self._read_base(manifest["base"]), manifest["base_rows"]
+            self._remove_stale_bases()
+            n_rows = len(self.metadata_store)
+            indexed = self.metadata_store.indexed_rows(n_rows)
+            in_base = self.metadata_store.indexed_rows(base_rows, tombstones=self.manifest["base_tombstones"])
+            # rows deleted after the base was built are still in it
+            excluded = np.setdiff1d(in_base, indexed, assume_unique=True)
+            # replay the log: rows committed after the base was written (and duplicates indexed since)
+            tail = np.setdiff1d(indexed, in_base, assume_unique=True)
+            tail = tail[tail < self.metadata_store.n_vectors]
+            delta = ann_index.new_index(self.dim)
+            if len(tail):
+                print(f"🔹 Replaying {len(tail)} rows into the delta index...")
+                delta.add_with_ids(np.ascontiguousarray(self.metadata_store.vectors(tail)), tail)
+            lexical = self._load_lexical(n_rows)
+            self._publish(base, delta, self.metadata_store.view(n_rows), excluded, lexical)
+        self._maybe_rebuild()
+
+    def _import_legacy(self):
+        """First load of a store written before the manifest: adopt its index file as the base."""
+        print("🔹 Loading metadata store...")
+        self.metadata_store.load(legacy_parquet=self.legacy_meta_path)
+        if os.path.exists(self.index_path):
+            print("🔹 Loading FAISS index...")
+            index = faiss.read_index(self.index_path)
+        else:
+            print("⚠️ No FAISS index found; initializing empty index")
+            index = ann_index.new_index(self.dim)
+        base_rows = min(len(self.metadata_store), index.ntotal + self.metadata_store.n_deleted)
+        self._backfill_vectors(index, base_rows)
+        if ann_index.backend_of(index) == "legacy":
+            # un-mapped IndexFlatL2 from older versions: re-add under explicit row ids
+            print("🔹 Migrating legacy flat index to an id-mapped index...")
+            base_rows = min(len(self.metadata_store), index.ntotal)
+            live = self.metadata_store.live_rows(base_rows)
+            index = ann_index.build_index(self.dim, self.metadata_store.vectors(live), live, backend="flat")
+        # a crash between tombstoning and persisting can leave deleted ids in the old index file
+        deleted = self.metadata_store.tombstones_since(0, below=base_rows)
+        unremoved = self._drop(index, deleted)
+        name = self._write_base(index)
+        self._commit(name, base_rows, 0 if len(unremoved) else self.metadata_store.commit_state()["tombstones"])
+        return self._read_base(name), base_rows
+
+    def _backfill_vectors(self, index, n_rows: int):
+        """Corpora written before vectors were stored alongside metadata: recover them from the index."""
+        have = self.metadata_store.n_vectors
+        if have >= n_rows:
+            return
+        if ann_index.backend_of(index) != "legacy":
+            print(f"⚠️ {n_rows - have} rows have no stored vector; they will be dropped by the next rebuild")
+            return
+        print(f"🔹 Backfilling {n_rows - have} stored vectors from the index...")
+        self.metadata_store.append_vectors(index.reconstruct_n(have, n_rows - have))
+
+    def snapshot(self) -> IndexSnapshot:
+        """Current published version. Lock-free: a single attribute read."""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def add(self, embeddings: np.ndarray, meta_rows: List[Dict], replace_doc_ids: Iterable[str] = ()) -> IndexSnapshot:
+        """
+        Append vectors and their metadata rows, commit, and publish the new version.
+        Rows of `replace_doc_ids` that existed before this call are deleted in the same version,
+        so readers see either the old or the new chunks of a document, never both.
+        A row's "duplicate_of" (a stored row id, or the chunk_id of an earlier row of this call)
+        makes it share that row's vector; its entry in `embeddings` is ignored.
+        """
+        if len(meta_rows) != len(embeddings):
+            raise ValueError(f"got {len(embeddings)} embeddings for {len(meta_rows)} metadata rows")
+        with metrics.stage("index_add", rows=len(meta_rows)):
+            snapshot = self._add(embeddings, meta_rows, list(replace_doc_ids))
+        self._maybe_rebuild()
+        return snapshot
+
+    def _add(self, embeddings: np.ndarray, meta_rows: List[Dict], replace_doc_ids: List[str]) -> IndexSnapshot:
+        # tokenizing is the expensive part of the BM25 update; row ids are assigned under the lock
+        with metrics.stage("bm25_build"):
+            segment = LexicalSegment.build(0, [r.get("text") or "" for r in meta_rows]) if len(meta_rows) else None
+        with self._write_lock:
+            if not self.manifest:
+                raise RuntimeError("IndexStore.load() must run before the store is written to")
+            current = self._snapshot
+            if len(meta_rows) == 0 and not replace_doc_ids:
+                return current
+            old_rows = self.metadata_store.rows_for_docs(replace_doc_ids) if replace_doc_ids else np.empty(0, dtype=np.int64)
+            # only the (small) delta is copied; the base index is shared by every version
+            delta = faiss.clone_index(current.delta)
+            n_rows = len(current.metadata)
+            lexical = current.lexical
+            if len(meta_rows):
+                embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+                embeddings, dup_of = self._duplicate_rows(meta_rows, embeddings)
+                # metadata segments are append-only; rows past the published view stay invisible until the swap
+                first_row = self.metadata_store.append(meta_rows, embeddings, dup_of)
+                new_rows = np.arange(first_row, first_row + len(embeddings), dtype="int64")
+                indexed = self.metadata_store.indexed_mask(new_rows)
+                delta.add_with_ids(embeddings[indexed], new_rows[indexed])
+                n_rows = first_row + len(embeddings)
+                segment.first_row = first_row
+                lexical = self._save_lexical(lexical.append(segment))
+            excluded = current.exclusion.ids if current.exclusion else np.empty(0, dtype=np.int64)
+            if len(old_rows):
+                indexed = old_rows[self.metadata_store.indexed_mask(old_rows)]
+                _, promoted = self.metadata_store.delete_rows(old_rows)
+                # duplicates indexed in place of a deleted row are in the delta, whatever their id
+                in_delta = np.isin(indexed, faiss.vector_to_array(delta.id_map))
+                excluded = np.union1d(excluded, indexed[~in_delta])
+                excluded = np.union1d(excluded, self._drop(delta, indexed[in_delta]))
+                if len(promoted):
+                    delta.add_with_ids(np.ascontiguousarray(self.metadata_store.vectors(promoted)), promoted)
+            # the new rows and tombstones are durable once the manifest names them
+            with metrics.stage("index_commit"):
+                self._commit(lexical=lexical)
+            self._remove_stale_lexical()
+            self._compact_segments()
+            snapshot = self._publish(current.index, delta, self.metadata_store.view(n_rows), excluded, lexical)
+        metrics.VECTORS.inc(len(meta_rows))
+        return snapshot
+
+    def _duplicate_rows(self, meta_rows: List[Dict], embeddings: np.ndarray):
+        """
+        (embeddings, dup_of): each duplicate's embedding replaced by the vector of the row its
+        "duplicate_of" names, and those row ids (-1 for the rest); dup_of is None without duplicates.
+        Row ids of this batch are assigned under the write lock, which the caller holds.
+        """
+        if all(r.get("duplicate_of") is None for r in meta_rows):
+            return embeddings, None
+        first_row = len(self.metadata_store)
+        batch: Dict[str, int] = {}
+        embeddings = embeddings.copy()
+        dup_of = np.full(len(meta_rows), -1, dtype=np.int64)
+        for i, row in enumerate(meta_rows):
+            batch.setdefault(row.get("chunk_id"), i)
+            target = row.get("duplicate_of")
+            if target is None:
+                continue
+            if isinstance(target, str):
+                j = batch.get(target)
+                if j is None or j >= i:
+                    raise ValueError(f"{row.get('chunk_id')} duplicates {target!r}, which is not an earlier row of this add")
+                embeddings[i] = embeddings[j]
+                dup_of[i] = first_row + j
+            else:
+                if not 0 <= int(target) < self.metadata_store.n_vectors:
+                    raise ValueError(f"{row.get('chunk_id')} duplicates row {target}, which has no stored vector")
+                embeddings[i] = self.metadata_store.vectors(int(target))
+                dup_of[i] = int(target)
+        return embeddings, dup_of
+
+    def memory_bytes(self) -> int:
+        """
+        Rough resident size of the current version: base index file (counted in full even when
+        memory-mapped), delta vectors, in-RAM metadata columns and BM25 postings.
+        """
+        snapshot = self._snapshot
+        try:
+            size = os.path.getsize(os.path.join(self.data_dir, self.manifest["base"]))
+        except (KeyError, OSError):
+            size = 0
+        size += snapshot.delta.ntotal * (4 * self.dim + 8)
+        size += self.metadata_store.memory_bytes() + self.dedup.nbytes
+        return size + sum(s.nbytes for s in snapshot.lexical.segments)
+
+    def dedup_stats(self) -> Dict:
+        """Duplicate chunks stored without an index entry of their own, and the index memory that saves."""
+        duplicates = self.metadata_store.n_duplicates
+        return {"duplicate_chunks": duplicates, "indexed_chunks": self._snapshot.total_chunks,
+                "index_bytes_saved": duplicates * (4 * self.dim + 8), "fingerprints": len(self.dedup)}
+
+    def delete_docs(self, doc_ids: Iterable[str]) -> IndexSnapshot:
+        """Tombstone every chunk of the given documents and publish the new version."""
+        return self.add(np.empty((0, self.dim), dtype="float32"), [], replace_doc_ids=doc_ids)
+
+    # ---------- compaction ----------
+    @property
+    def rebuilding(self) -> bool:
+        return self._rebuild_thread is not None and self._rebuild_thread.is_alive()
+
+    def _maybe_rebuild(self):
+        snapshot = self._snapshot
+        if self.rebuilding:
+            return
+        excluded = len(snapshot.exclusion) if snapshot.exclusion else 0
+        if (ann_index.needs_rebuild(snapshot.index, snapshot.total_chunks, self.backend)
+                or snapshot.delta.ntotal > INDEX_DELTA_MAX_ROWS
+                or excluded > INDEX_COMPACT_DELETED_FRACTION * max(1, snapshot.index.ntotal)):
+            self.rebuild()
+
+    def rebuild(self, backend: str = None, wait: bool = False):
+        """Compact delta + deletions into a new (re)trained base index off the request path and swap it in."""
+        if backend:
+            self.backend = backend
+        if self.rebuilding:
+            if wait:
+                self._rebuild_thread.join()
+            return
+        self._rebuild_thread = threading.Thread(target=self._rebuild, name="index-rebuild", daemon=True)
+        self._rebuild_thread.start()
+        if wait:
+            self._rebuild_thread.join()
+
+    def _rebuild(self):
+        started = time.time()
+        n = len(self._snapshot.metadata)
+        live, tombstones = self.metadata_store.indexed_rows_at(n)
+        target = ann_index.target_backend(len(live), self.backend)
+        print(f"🔹 Rebuilding index as {target} over {len(live)} vectors...")
+        try:
+            index = ann_index.build_index(self.dim, self.metadata_store.vectors(live), live, backend=target)
+            name = self._write_base(index)
+            base = self._read_base(name)
+            merged = self._merge_lexical(self._snapshot.lexical)
+            with self._write_lock:
+                current = self._snapshot
+                # catch up with anything ingested or deleted while we were training
+                indexed = self.metadata_store.indexed_rows(len(current.metadata))
+                delta = ann_index.new_index(self.dim)
+                # new rows, and duplicates indexed since in place of a deleted row
+                added = np.setdiff1d(indexed, live, assume_unique=True)
+                if len(added):
+                    delta.add_with_ids(np.ascontiguousarray(self.metadata_store.vectors(added)), added)
+                deleted_since = np.setdiff1d(live, indexed, assume_unique=True)
+                lexical = current.lexical
+                if merged is not None:
+                    # keep segments appended since the merge started, if they line up with it
+                    rest = [s for s in lexical.segments if s.first_row >= merged.end_row]
+                    if not rest or rest[0].first_row == merged.end_row:
+                        lexical = self._save_lexical(LexicalView([merged] + rest))
+                self._commit(name, n, tombstones, lexical=lexical)
+                self._publish(base, delta, current.metadata, deleted_since, lexical)
+            self._remove_stale_bases()
+            self._remove_stale_lexical()
+            self.last_rebuild = {"backend": target, "vectors": index.ntotal, "seconds": round(time.time() - started, 3)}
+            metrics.record_stage("index_rebuild", time.time() - started)
+            print(f"Index rebuilt as {target} in {self.last_rebuild['seconds']}s")
+        except Exception as e:
+            print(f"Index rebuild failed: {e}")
+
+    def _compact_segments(self):
+        """Merge metadata segment files once there are too many (caller holds the write lock)."""
+        if len(self.metadata_store.segments) <= METADATA_MAX_SEGMENTS:
+            return
+        replaced = self.metadata_store.compact_segments()
+        self._commit()
+        self.metadata_store.remove_segments(replaced)
+
+    # ---------- persistence ----------
+    def _read_manifest(self) -> Optional[Dict]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path) as fh:
+            return json.load(fh)
+
+    def _commit(self, base: str = None, base_rows: int = None, base_tombstones: int = None,
+                lexical: LexicalView = None):
+        """
+        Atomically replace the manifest with the current metadata log position. With `base`, also
+        switch to a new base index holding the indexed rows < base_rows as of `base_tombstones` deletes;
+        with `lexical`, to that view's (already written) BM25 segments.
+        """
+        manifest = dict(self.manifest)
+        manifest.update(self.metadata_store.commit_state())
+        if base is not None:
+            manifest.update({"base": base, "base_rows": int(base_rows), "base_tombstones": int(base_tombstones)})
+        if lexical is not None:
+            manifest["lexical"] = [s.name for s in lexical.segments]
+        manifest["committed_at"] = time.time()
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(manifest, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.manifest_path)
+        _fsync_dir(self.data_dir)
+        self.manifest = manifest
+
+    def _write_base(self, index) -> str:
+        """Write a base index under a fresh generation name (never overwrites a live file)."""
+        os.makedirs(self.data_dir, exist_ok=True)
+        existing = [int(os.path.basename(p)[6:12]) for p in glob.glob(os.path.join(self.data_dir, BASE_GLOB))]
+        name = f"index-{max(existing, default=0) + 1:06d}.faiss"
+        path = os.path.join(self.data_dir, name)
+        faiss.write_index(index, path + ".tmp")
+        with open(path + ".tmp", "rb") as fh:
+            os.fsync(fh.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_dir(self.data_dir)
+        return name
+
+    def _read_base(self, name: str) -> faiss.Index:
+        path = os.path.join(self.data_dir, name)
+        if INDEX_MMAP:
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        return faiss.read_index(path)
+
+    def _remove_stale_bases(self):
+        """Base files other than the committed one (replaced by compaction, or from a crashed one)."""
+        keep = self.manifest.get("base")
+        for path in glob.glob(os.path.join(self.data_dir, "index-*.faiss*")):
+            if os.path.basename(path) != keep:
+                # mmapped by older snapshots is fine: unlinking keeps their pages valid
+                os.remove(path)
+
+    def _load_lexical(self, n_rows: int) -> LexicalView:
+        """Committed BM25 segments, plus a one-time backfill for rows indexed before they existed."""
+        lexical = LexicalView([LexicalSegment.load(os.path.join(self.lexical_dir, name), mmap=INDEX_MMAP)
+                               for name in self.manifest.get("lexical", [])])
+        if lexical.n_rows < n_rows:
+            print(f"🔹 Building the BM25 index for {n_rows - lexical.n_rows} rows...")
+            for first in range(lexical.n_rows, n_rows, LEXICAL_BACKFILL_ROWS):
+                rows = range(first, min(first + LEXICAL_BACKFILL_ROWS, n_rows))
+                lexical = lexical.append(LexicalSegment.build(first, [self.metadata_store.text(r) for r in rows]))
+            lexical = self._save_lexical(lexical)
+            self._commit(lexical=lexical)
+        self._remove_stale_lexical()
+        return lexical
+
+    def _save_lexical(self, lexical: LexicalView) -> LexicalView:
+        """Write the view's new (unnamed) segments; the caller commits them."""
+        os.makedirs(self.lexical_dir, exist_ok=True)
+        for segment in lexical.segments:
+            if segment.name is None:
+                segment.save(os.path.join(self.lexical_dir, f"lex-{segment.first_row:012d}-{segment.end_row:012d}"))
+        _fsync_dir(self.lexical_dir)
+        return lexical
+
+    def _merge_lexical(self, lexical: LexicalView) -> Optional[LexicalSegment]:
+        """Merge every BM25 segment into one during compaction, once there are too many."""
+        if len(lexical.segments) <= LEXICAL_MAX_SEGMENTS:
+            return None
+        return LexicalSegment.merge(lexical.segments)
+
+    def _remove_stale_lexical(self):
+        keep = set(self.manifest.get("lexical", []))
+        for path in glob.glob(os.path.join(self.lexical_dir, "lex-*")):
+            if os.path.basename(path) not in keep:
+                # memory-mapped by older snapshots is fine here too
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _drop(self, index, rows: np.ndarray) -> np.ndarray:
+        """Remove ids from a private (unpublished) index. Returns the ids it could not remove."""
+        rows = np.ascontiguousarray(rows, dtype="int64")
+        if len(rows) == 0:
+            return rows
+        try:
+            index.remove_ids(faiss.IDSelectorBatch(rows))
+            return np.empty(0, dtype=np.int64)
+        except RuntimeError:
+            return rows
+
+    def _publish(self, base, delta, metadata: MetadataView, excluded: np.ndarray = None,
+                 lexical: LexicalView = None) -> IndexSnapshot:
+        exclusion = Exclusion(excluded) if excluded is not None and len(excluded) else None
+        lexical = lexical if lexical is not None else self._snapshot.lexical
+        snapshot = IndexSnapshot(self._snapshot.version + 1, base, metadata, exclusion, delta, lexical)
+        self._snapshot = snapshot
+        return snapshot
+
+
+def _fsync_dir(path: str):
+    """Make a rename in `path` durable."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,503 @@
+# app/ingest_pipeline.py
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Callable, Optional, Iterable, Iterator, Tuple
+from connectors import Connector, InMemoryConnector, DocumentRef
+from chunker import Chunk, chunk_stream, chunk_text_token_level
+from pdf_extract import PDF_EXTRACT_TIMEOUT, PDF_PAGES_PER_TASK, iter_pdf_pages, page_count
+from sync_state import SyncState
+from dedup import DEDUP_ENABLED, Deduplicator
+import global_resources
+import contextvars
+import threading
+import metrics
+import hashlib
+import queue
+import time
+import os
+import numpy as np
+
+# ---------- Configuration ----------
+INGEST_FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+# Processes for PDF extraction + tokenization; 0 runs them inline on the fetch threads
+INGEST_EXTRACT_WORKERS = int(os.getenv("INGEST_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+# Prepared documents waiting for the embedder; bounds peak memory
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "32"))
+# Embedded chunks per publish to the index store (how soon new chunks become searchable)
+INGEST_FLUSH_CHUNKS = int(os.getenv("INGEST_FLUSH_CHUNKS", "512"))
+
+_STOP = object()
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def extract_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool shared by all ingests (created on first use)."""
+    global _extract_pool
+    if INGEST_EXTRACT_WORKERS <= 0:
+        return None
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(max_workers=INGEST_EXTRACT_WORKERS)
+        return _extract_pool
+
+
+def build_chunk_rows(doc_id: str, name: str, mime: str, text: str) -> List[Dict]:
+    """Chunk one document's text into metadata rows (text included)."""
+    if not text or len(text.strip()) == 0:
+        return []
+    with metrics.stage("chunk"):
+        return _chunk_rows(doc_id, name, mime, chunk_text_token_level(text))
+
+
+def _chunk_rows(doc_id: str, name: str, mime: str, chunks: Iterable[Chunk]) -> List[Dict]:
+    rows = []
+    for i, (c_text, start_t, end_t) in enumerate(chunks):
+        rows.append({
+            "doc_id": doc_id,
+            "chunk_id": f"{doc_id}__{i}",
+            "source_name": name,
+            "mimeType": mime,
+            "start_token": int(start_t),
+            "end_token": int(end_t),
+            "text": c_text
+        })
+    return rows
+
+
+def prepare_document(doc: Dict) -> List[Dict]:
+    """Extract (PDF bytes) and chunk one document. Top-level so it can run in a worker process."""
+    text = doc.get("text")
+    if text is None and doc.get("content"):
+        return prepare_pdf(doc)
+    return build_chunk_rows(doc["id"], doc.get("name"), doc.get("mimeType"), text)
+
+
+def prepare_pdf(doc: Dict, pool: Optional[ProcessPoolExecutor] = None) -> List[Dict]:
+    """Pages stream from the extractor (page ranges across `pool`, if given) straight into the chunker."""
+    started = time.perf_counter()
+    extract_seconds = [0.0]
+    pages = _timed_pages(iter_pdf_pages(doc["content"], pool=pool), extract_seconds)
+    rows = _chunk_rows(doc["id"], doc.get("name"), doc.get("mimeType"), chunk_stream(pages))
+    # extraction and chunking interleave page by page; the time not spent waiting on pages is the chunker's
+    metrics.record_stage("pdf_extract", extract_seconds[0], started)
+    metrics.record_stage("chunk", time.perf_counter() - started - extract_seconds[0], started)
+    return rows
+
+
+def _timed_pages(pages: Iterable[str], seconds: List[float]) -> Iterator[str]:
+    """Passes pages through, adding the time spent waiting for each to seconds[0]."""
+    pages = iter(pages)
+    while True:
+        started = time.perf_counter()
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        finally:
+            seconds[0] += time.perf_counter() - started
+        yield page
+
+
+def prepare_in_worker(doc: Dict) -> Tuple[List[Dict], List[Dict]]:
+    """prepare_document() in an extract process: (rows, the stage spans it recorded for the parent)."""
+    recorder = metrics.Trace("extract")
+    with metrics.use_trace(recorder):
+        rows = prepare_document(doc)
+    return rows, recorder.spans
+
+
+def prepare(doc: Dict, pool: Optional[ProcessPoolExecutor] = None) -> List[Dict]:
+    """
+    prepare_document() for one fetched document, using the extract pool:
+    long PDFs are split into page ranges across it, everything else is one task.
+    """
+    if pool is None:
+        return prepare_document(doc)
+    if doc.get("text") is None and doc.get("content") and page_count(doc["content"]) > PDF_PAGES_PER_TASK:
+        return prepare_pdf(doc, pool=pool)
+    future = pool.submit(prepare_in_worker, doc)
+    try:
+        rows, spans = future.result(timeout=PDF_EXTRACT_TIMEOUT)
+    except FutureTimeout:
+        future.cancel()
+        raise TimeoutError(f"extraction exceeded {PDF_EXTRACT_TIMEOUT}s")
+    metrics.record_spans(spans)
+    return rows
+
+
+def raw_content_hash(doc: Dict) -> str:
+    """Hash of the downloaded bytes/text, taken before the (expensive) extraction step."""
+    payload = doc.get("content")
+    if payload is None:
+        payload = (doc.get("text") or "").encode("utf-8", errors="ignore")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def default_embed(texts: List[str]) -> np.ndarray:
+    return global_resources.get_model().encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+
+@dataclass
+class IngestReport:
+    documents_listed: int = 0
+    documents_fetched: int = 0
+    documents_unchanged: int = 0
+    documents_changed: int = 0
+    documents_deleted: int = 0
+    documents_empty: int = 0
+    documents_failed: int = 0
+    chunks: int = 0
+    vectors_added: int = 0
+    duplicate_chunks: int = 0  # not embedded: they reuse the vector of an indexed (or earlier) chunk
+    near_duplicate_chunks: int = 0  # ... of which matched by MinHash rather than exact text
+    index_bytes_saved: int = 0
+    publishes: int = 0
+    total_chunks: int = 0
+    complete_passes: List[str] = field(default_factory=list)
+    first_searchable_seconds: Optional[float] = None
+    seconds: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def status(self) -> str:
+        """succeeded; partial when documents (or a listing) failed; failed when nothing else got done."""
+        if not (self.documents_failed or self.errors):
+            return "succeeded"
+        if self.documents_fetched or self.documents_unchanged or self.documents_deleted:
+            return "partial"
+        return "failed"
+
+    def as_dict(self) -> Dict:
+        return {**asdict(self), "status": self.status}
+
+
+@dataclass
+class _Prepared:
+    ref: DocumentRef
+    page: "_PageTracker"
+    digest: Optional[str]
+    rows: List[Dict]
+
+
+class _PageTracker:
+    """
+    Per-scope listing progress for resumable syncs. Pages complete in order;
+    the cursor is checkpointed only past pages whose documents are all done.
+    """
+
+    def __init__(self, state: SyncState, scope: str, start_cursor: Optional[str]):
+        self.state = state
+        self.scope = scope
+        self.seen = state.seen(scope) if start_cursor else set()
+        self._pages = []  # [outstanding docs, cursor after the page, ids on the page]
+        self._lock = threading.Lock()
+        self.listing_done = False
+        self.complete = False  # listing reached the end of the source
+
+    def open_page(self, refs: List[DocumentRef], next_cursor: Optional[str]):
+        page = [len(refs), next_cursor, [r.id for r in refs]]
+        with self._lock:
+            self._pages.append(page)
+            self._advance()
+        return page
+
+    def doc_done(self, page):
+        with self._lock:
+            page[0] -= 1
+            self._advance()
+
+    def _advance(self):
+        while self._pages and self._pages[0][0] == 0:
+            _, cursor, ids = self._pages.pop(0)
+            self.seen.update(ids)
+            if cursor:
+                self.state.checkpoint(self.scope, cursor, self.seen)
+
+    @property
+    def all_done(self) -> bool:
+        return self.listing_done and not self._pages
+
+
+class IngestPipeline:
+    """
+    Staged, bounded producer/consumer ingest:
+
+        lister -> [refs queue] -> N fetch threads -> process pool (extract + chunk;
+                                                  long PDFs as parallel page ranges)
+               -> [prepared queue] -> dedup -> batching embedder -> IndexStore.add every flush_chunks
+
+    Every queue is bounded, so peak memory depends on the settings above and
+    not on corpus size, and the first chunks are published (searchable) while
+    later documents are still downloading.
+
+    With a SyncState (the default for connector syncs) ingestion is
+    incremental: documents whose modified time or content hash did not change
+    are skipped, changed documents have their old chunks replaced atomically,
+    and documents missing from a complete listing are deleted. Listing resumes
+    from the last checkpointed cursor of an interrupted sync.
+
+    With dedup on, chunks whose text duplicates (exactly or nearly) an indexed
+    chunk or an earlier one of the run are not embedded; they are stored with
+    a reference to that chunk's vector (see dedup).
+    """
+
+    def __init__(self, store=None, embed_fn: Callable[[List[str]], np.ndarray] = default_embed,
+                 fetch_workers: int = INGEST_FETCH_WORKERS, embed_batch: int = INGEST_EMBED_BATCH,
+                 queue_size: int = INGEST_QUEUE_SIZE, flush_chunks: int = INGEST_FLUSH_CHUNKS,
+                 use_process_pool: bool = True, on_progress: Callable[[IngestReport], None] = None,
+                 sync_state: Optional[SyncState] = None, dedup: bool = DEDUP_ENABLED):
+        self.store = store or global_resources.get_index_store()
+        self.embed_fn = embed_fn
+        self.fetch_workers = max(1, fetch_workers)
+        self.embed_batch = max(1, embed_batch)
+        self.queue_size = max(1, queue_size)
+        self.flush_chunks = max(self.embed_batch, flush_chunks)
+        self.use_process_pool = use_process_pool
+        self.on_progress = on_progress
+        self.state = sync_state
+        self.dedup = dedup
+
+    def run(self, connectors: Iterable[Connector]) -> IngestReport:
+        report = IngestReport()
+        started = time.time()
+        abort = threading.Event()
+        refs_q = queue.Queue(maxsize=self.queue_size)
+        prepared_q = queue.Queue(maxsize=self.queue_size)
+        lock = threading.Lock()
+        pool = extract_pool() if self.use_process_pool else None
+        state = self.state
+        trackers: List[_PageTracker] = []
+
+        def put(q, item):
+            # bounded put that gives up once the run is aborted
+            while not abort.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q):
+            while not abort.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _STOP
+
+        def lister():
+            try:
+                for connector in connectors:
+                    start_cursor = state.cursor(connector.scope) if state else None
+                    tracker = _PageTracker(state, connector.scope, start_cursor) if state else None
+                    if tracker:
+                        trackers.append(tracker)
+                    cursor = start_cursor
+                    try:
+                        for refs, cursor in connector.list_pages(start_cursor):
+                            page = tracker.open_page(refs, cursor) if tracker else None
+                            with lock:
+                                report.documents_listed += len(refs)
+                            for ref in refs:
+                                if not put(refs_q, (connector, ref, tracker, page)):
+                                    return
+                    finally:
+                        if tracker:
+                            tracker.complete = cursor is None
+                            tracker.listing_done = True
+            except Exception as e:
+                with lock:
+                    report.errors.append(f"listing failed: {e}")
+            finally:
+                for _ in range(self.fetch_workers):
+                    put(refs_q, _STOP)
+
+        def done(tracker, page):
+            if tracker:
+                tracker.doc_done(page)
+
+        def fetcher():
+            try:
+                while not abort.is_set():
+                    item = get(refs_q)
+                    if item is _STOP:
+                        return
+                    connector, ref, tracker, page = item
+                    if state and state.is_unchanged_at_source(ref.id, ref.modified_time):
+                        # a doc recorded under an older scope of this listing moves to the current one
+                        state.touch(ref.id, ref.modified_time, tracker.scope if tracker else None)
+                        with lock:
+                            report.documents_unchanged += 1
+                        done(tracker, page)
+                        continue
+                    step = "fetch"
+                    try:
+                        raw = connector.fetch(ref).as_dict()
+                        digest = raw_content_hash(raw)
+                        prev = state.get(ref.id) if state else None
+                        if prev and prev.get("content_hash") == digest:
+                            state.touch(ref.id, ref.modified_time, tracker.scope if tracker else None)
+                            with lock:
+                                report.documents_unchanged += 1
+                            done(tracker, page)
+                            continue
+                        step = "extract"
+                        rows = prepare(raw, pool)
+                    except Exception as e:
+                        print(f"⚠️ Failed to {step} {ref.name}: {e}")
+                        with lock:
+                            report.documents_failed += 1
+                            report.errors.append(f"{ref.source}:{ref.id}: {step} failed: {e}")
+                        done(tracker, page)
+                        continue
+                    with lock:
+                        report.documents_fetched += 1
+                        if prev:
+                            report.documents_changed += 1
+                        if not rows:
+                            report.documents_empty += 1
+                    if not put(prepared_q, _Prepared(ref, (tracker, page), digest, rows)):
+                        return
+            finally:
+                put(prepared_q, _STOP)
+
+        # each thread runs in a copy of the caller's context, so a traced request's ingest is traced too
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(lister,), name="ingest-list", daemon=True)]
+        threads += [threading.Thread(target=contextvars.copy_context().run, args=(fetcher,), name=f"ingest-fetch-{i}",
+                                     daemon=True) for i in range(self.fetch_workers)]
+        for t in threads:
+            t.start()
+
+        try:
+            self._embed_and_publish(prepared_q, report, started)
+            self._finish_passes(trackers, report)
+            report.total_chunks = self.store.snapshot().total_chunks
+        except Exception:
+            abort.set()
+            raise
+        finally:
+            for t in threads:
+                t.join(timeout=1)
+            if state:
+                state.save()
+            report.seconds = round(time.time() - started, 3)
+            self._record_metrics(report)
+        return report
+
+    @staticmethod
+    def _record_metrics(report: IngestReport):
+        for result, n in (("fetched", report.documents_fetched), ("unchanged", report.documents_unchanged),
+                          ("deleted", report.documents_deleted), ("empty", report.documents_empty),
+                          ("failed", report.documents_failed)):
+            if n:
+                metrics.DOCUMENTS.inc(n, result=result)
+
+    def _embed_and_publish(self, prepared_q: queue.Queue, report: IngestReport, started: float):
+        live_fetchers = self.fetch_workers
+        to_embed: List[Dict] = []
+        pending_rows: List[Dict] = []
+        pending_embs: List[np.ndarray] = []
+        docs: Dict[str, list] = {}  # doc_id -> [prepared doc, rows not yet published]
+        replaced = set()
+        dedup = Deduplicator(self.store) if self.dedup else None
+
+        def embed(rows):
+            # duplicates keep their place (a document's rows stay in order) with a placeholder vector
+            new = [i for i, r in enumerate(rows) if r.get("duplicate_of") is None]
+            embs = np.zeros((len(rows), self.store.dim), dtype="float32")
+            if new:
+                with metrics.stage("embed", chunks=len(new)):
+                    vectors = np.asarray(self.embed_fn([rows[i]["text"] for i in new]), dtype="float32")
+                if len(new) == len(rows):
+                    embs = vectors
+                else:
+                    embs[new] = vectors
+            pending_embs.append(embs)
+            pending_rows.extend(rows)
+
+        def publish():
+            empty_docs = [d for d, (_, left) in docs.items() if left == 0 and d not in replaced]
+            doc_ids = {r["doc_id"] for r in pending_rows}.union(empty_docs)
+            # old chunks of a document go away in the same version its first new chunks appear
+            # (synced or uploaded again alike: a document id names one document)
+            replace = [d for d in doc_ids if d not in replaced]
+            if not pending_rows and not replace:
+                self._record_finished(docs)
+                return
+            embs = np.vstack(pending_embs) if pending_embs else np.empty((0, self.store.dim), dtype="float32")
+            if dedup:
+                dedup.resolve(pending_rows)
+            snapshot = self.store.add(embs, pending_rows, replace_doc_ids=replace)
+            replaced.update(replace)
+            if dedup and pending_rows:
+                dedup.published(pending_rows, len(snapshot.metadata) - len(pending_rows))
+                report.duplicate_chunks, report.near_duplicate_chunks = dedup.duplicates, dedup.near
+                report.index_bytes_saved = dedup.duplicates * (4 * self.store.dim + 8)
+            report.vectors_added += len(pending_rows)
+            report.publishes += 1
+            report.total_chunks = snapshot.total_chunks
+            if report.first_searchable_seconds is None and pending_rows:
+                report.first_searchable_seconds = round(time.time() - started, 3)
+            for r in pending_rows:
+                docs[r["doc_id"]][1] -= 1
+            pending_rows.clear()
+            pending_embs.clear()
+            self._record_finished(docs)
+            if self.on_progress:
+                self.on_progress(report)
+
+        while live_fetchers:
+            prepared = prepared_q.get()
+            if prepared is _STOP:
+                live_fetchers -= 1
+                continue
+            docs[prepared.ref.id] = [prepared, len(prepared.rows)]
+            report.chunks += len(prepared.rows)
+            metrics.CHUNKS.inc(len(prepared.rows))
+            if dedup:
+                dedup.check(prepared.rows)
+            to_embed.extend(prepared.rows)
+            while len(to_embed) >= self.embed_batch:
+                embed(to_embed[:self.embed_batch])
+                del to_embed[:self.embed_batch]
+            if len(pending_rows) >= self.flush_chunks:
+                publish()
+        if to_embed:
+            embed(to_embed)
+        publish()
+
+    def _record_finished(self, docs: Dict[str, list]):
+        """Docs whose chunks are all published: remember their hash and release their listing page."""
+        for doc_id in [d for d, (_, left) in docs.items() if left == 0]:
+            prepared, _ = docs.pop(doc_id)
+            tracker, page = prepared.page
+            if self.state:
+                self.state.record(doc_id, tracker.scope if tracker else prepared.ref.source, prepared.digest,
+                                  prepared.ref.modified_time, len(prepared.rows))
+            if tracker:
+                tracker.doc_done(page)
+        if self.state:
+            self.state.save()
+
+    def _finish_passes(self, trackers: List[_PageTracker], report: IngestReport):
+        """Delete docs a complete listing no longer returns, then reset that scope's cursor."""
+        for tracker in trackers:
+            if not tracker.all_done:
+                continue
+            if tracker.complete:
+                stale = [d for d in self.state.docs_in_scope(tracker.scope) if d not in tracker.seen]
+                if stale:
+                    self.store.delete_docs(stale)
+                    self.state.forget(stale)
+                    report.documents_deleted += len(stale)
+                self.state.finish_pass(tracker.scope)
+                report.complete_passes.append(tracker.scope)
+
+
+def ingest_documents(docs: List[Dict], store=None, **kwargs) -> IngestReport:
+    """Run already-fetched {"id","name","mimeType","text"} (or "content": PDF bytes) dicts through the pipeline."""
+    return IngestPipeline(store=store, **kwargs).run([InMemoryConnector(docs)])
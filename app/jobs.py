@@ -0,0 +1,139 @@
+# app/jobs.py
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import contextvars
+import threading
+import asyncio
+import metrics
+import uuid
+import time
+import os
+
+# ---------- Configuration ----------
+# Ingest jobs running at once. Publishing is serialized by IndexStore's writer lock either way;
+# more than one only overlaps the fetch / embed work of different jobs.
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+# Finished jobs kept for the status endpoint
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "500"))
+
+STATUSES = ("queued", "running", "succeeded", "partial", "failed")
+
+
+class JobFailed(Exception):
+    """Raised by a job that ran to the end without getting any of its work done; `result` is still kept."""
+
+    def __init__(self, message: str, result: Optional[Dict] = None):
+        super().__init__(message)
+        self.result = result
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict = field(default_factory=dict)
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    partial: bool = False  # set by the job: it finished, but part of its work failed (see its result)
+
+    def update(self, progress: Dict):
+        """Progress callback for the running job (e.g. an IngestReport as a dict)."""
+        self.progress = progress
+
+    def as_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Runs write jobs in submission order on a small dedicated pool and keeps
+    their status for polling. Jobs report progress through job.update() and
+    return a result dict.
+    """
+
+    def __init__(self, workers: int = INGEST_JOB_WORKERS, history: int = INGEST_JOB_HISTORY, name: str = "jobs"):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._history = max(1, history)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[[Job], Dict]) -> Job:
+        job = Job(id=uuid.uuid4().hex, kind=kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            # in the submitter's context: a traced request keeps collecting the job's spans
+            self._futures[job.id] = self._executor.submit(contextvars.copy_context().run, self._run, job, fn)
+            self._evict()
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict]):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job)
+            job.status = "partial" if job.partial else "succeeded"
+        except JobFailed as e:
+            print(f"Job {job.kind} {job.id} failed: {e}")
+            job.result = e.result
+            job.error = str(e)
+            job.status = "failed"
+        except Exception as e:
+            print(f"Job {job.kind} {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            metrics.record_stage(f"{job.kind}_job", job.finished_at - job.started_at, status=job.status)
+            with self._lock:
+                self._futures.pop(job.id, None)
+        return job
+
+    def _evict(self):
+        # oldest finished jobs go first; queued / running ones are always kept
+        finished = [j.id for j in self._jobs.values() if j.finished_at is not None]
+        for job_id in finished[:max(0, len(self._jobs) - self._history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())[-limit:][::-1]
+
+    async def wait(self, job: Job) -> Job:
+        """Await a job from the event loop without blocking it."""
+        future = self._futures.get(job.id)
+        if future is not None:
+            await asyncio.wrap_future(future)
+        return job
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = {s: 0 for s in STATUSES}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return {"workers": self.workers, "counts": counts}
+
+
+# Every index write (connector syncs, PDF uploads) goes through this queue
+ingest_jobs = JobQueue(name="ingest-job")
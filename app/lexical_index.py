@@ -0,0 +1,233 @@
+# app/lexical_index.py
+
+from functools import lru_cache
+from typing import List, Tuple, Optional, Sequence
+import hashlib
+import math
+import shutil
+import re
+import os
+import numpy as np
+
+# ---------- Configuration ----------
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# hybrid (BM25 + vectors, fused) | vector | lexical
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each retriever before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Threads answering BM25 lookups next to the vector search
+LEXICAL_SEARCH_WORKERS = int(os.getenv("LEXICAL_SEARCH_WORKERS", "4"))
+# Segments are merged inline (on the write path) only up to this many rows; bigger merges wait for compaction
+LEXICAL_INLINE_MERGE_ROWS = int(os.getenv("LEXICAL_INLINE_MERGE_ROWS", "200000"))
+# Past this many segments, index compaction merges them all into one
+LEXICAL_MAX_SEGMENTS = int(os.getenv("LEXICAL_MAX_SEGMENTS", "8"))
+
+MODES = ("hybrid", "vector", "lexical")
+if RETRIEVAL_MODE not in MODES:
+    print(f"⚠️ Unknown RETRIEVAL_MODE {RETRIEVAL_MODE!r}; using hybrid")
+    RETRIEVAL_MODE = "hybrid"
+
+# words and numbers; compounds such as INC-20431, ERR_CONN_RESET, v2.3.1 or a/b paths are also kept whole
+_WORD_RE = re.compile(r"[^\W_]+")
+_COMPOUND_RE = re.compile(r"[^\W_]+(?:[-_./:#][^\W_]+)+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens (order is not kept): every word, plus each compound as a whole."""
+    text = (text or "").lower()
+    return _WORD_RE.findall(text) + _COMPOUND_RE.findall(text)
+
+
+@lru_cache(maxsize=1 << 20)
+def term_id(token: str) -> int:
+    """Stable 64-bit term id; no vocabulary has to be stored or shared between processes."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class LexicalSegment:
+    """
+    Immutable inverted index over a contiguous range of rows, in CSR form:
+    sorted term ids, offsets into the posting arrays, row offsets (relative to
+    first_row) and term frequencies, plus each row's token count.
+    """
+
+    def __init__(self, first_row: int, doc_lens: np.ndarray, terms: np.ndarray, offsets: np.ndarray,
+                 rows: np.ndarray, tfs: np.ndarray, name: Optional[str] = None):
+        self.first_row = first_row
+        self.doc_lens = doc_lens
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.name = name
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lens)
+
+    @property
+    def end_row(self) -> int:
+        return self.first_row + self.n_docs
+
+    @property
+    def total_len(self) -> int:
+        return int(self.doc_lens.sum())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.doc_lens, self.terms, self.offsets, self.rows, self.tfs))
+
+    def postings(self, term: int):
+        """(absolute rows, tfs, doc lengths) for one term, or None if it does not occur."""
+        i = int(np.searchsorted(self.terms, term))
+        if i >= len(self.terms) or self.terms[i] != term:
+            return None
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        rel = self.rows[lo:hi]
+        return rel.astype(np.int64) + self.first_row, self.tfs[lo:hi], self.doc_lens[rel]
+
+    @classmethod
+    def build(cls, first_row: int, texts: Sequence[str]) -> "LexicalSegment":
+        token_lists = [tokenize(t) for t in texts]
+        doc_lens = np.array([len(t) for t in token_lists], dtype=np.int32)
+        tokens = np.array([t for tokens in token_lists for t in tokens], dtype=str)
+        rows = np.repeat(np.arange(len(texts), dtype=np.uint32), doc_lens)
+        if len(tokens):
+            # hash each distinct token once
+            vocab, inverse = np.unique(tokens, return_inverse=True)
+            terms = np.array([term_id(t) for t in vocab], dtype=np.int64)[inverse.ravel()]
+        else:
+            terms = np.empty(0, dtype=np.int64)
+        # one posting per (term, row): sort and count runs
+        order = np.lexsort((rows, terms))
+        terms, rows = terms[order], rows[order]
+        if len(terms):
+            starts = np.concatenate(([0], np.flatnonzero((np.diff(terms) != 0) | (np.diff(rows) != 0)) + 1))
+            tfs = np.diff(np.concatenate((starts, [len(terms)])))
+            terms, rows = terms[starts], rows[starts]
+        else:
+            tfs = np.empty(0, dtype=np.int64)
+        return cls._from_postings(first_row, doc_lens, terms, rows, tfs)
+
+    @classmethod
+    def _from_postings(cls, first_row, doc_lens, terms, rows, tfs) -> "LexicalSegment":
+        """Postings sorted by term (then row) -> CSR."""
+        if len(terms):
+            term_starts = np.concatenate(([0], np.flatnonzero(np.diff(terms) != 0) + 1))
+        else:
+            term_starts = np.empty(0, dtype=np.int64)
+        offsets = np.concatenate((term_starts, [len(terms)])).astype(np.int64)
+        return cls(first_row, doc_lens.astype(np.int32), terms[term_starts].astype(np.int64), offsets,
+                   rows.astype(np.uint32), np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16))
+
+    @classmethod
+    def merge(cls, segments: Sequence["LexicalSegment"]) -> "LexicalSegment":
+        """Merge adjacent segments (in row order) into one."""
+        first_row = segments[0].first_row
+        terms = np.concatenate([np.repeat(s.terms, np.diff(s.offsets)) for s in segments])
+        rows = np.concatenate([s.rows.astype(np.int64) + (s.first_row - first_row) for s in segments])
+        tfs = np.concatenate([s.tfs for s in segments])
+        # stable: rows of one term stay in segment (= row) order
+        order = np.argsort(terms, kind="stable")
+        doc_lens = np.concatenate([s.doc_lens for s in segments])
+        return cls._from_postings(first_row, doc_lens, terms[order], rows[order], tfs[order])
+
+    def save(self, path: str):
+        """Write as a directory of .npy arrays (so it can be memory-mapped), published by one rename."""
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        arrays = {"first_row": np.array([self.first_row], dtype=np.int64), "doc_lens": self.doc_lens,
+                  "terms": self.terms, "offsets": self.offsets, "rows": self.rows, "tfs": self.tfs}
+        for key, values in arrays.items():
+            with open(os.path.join(tmp, key + ".npy"), "wb") as fh:
+                np.save(fh, values)
+                fh.flush()
+                os.fsync(fh.fileno())
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+        self.name = os.path.basename(path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LexicalSegment":
+        def read(key):
+            return np.load(os.path.join(path, key + ".npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+        return cls(int(read("first_row")[0]), read("doc_lens"), read("terms"), read("offsets"), read("rows"),
+                   read("tfs"), name=os.path.basename(path))
+
+
+class LexicalView:
+    """Immutable BM25 index of one IndexSnapshot: a tuple of segments covering rows [0, n_rows)."""
+
+    def __init__(self, segments: Tuple[LexicalSegment, ...] = ()):
+        self.segments = tuple(segments)
+        self.n_docs = sum(s.n_docs for s in self.segments)
+        self.total_len = sum(s.total_len for s in self.segments)
+
+    @property
+    def n_rows(self) -> int:
+        return self.segments[-1].end_row if self.segments else 0
+
+    def append(self, segment: LexicalSegment) -> "LexicalView":
+        """New view with `segment` added and small tail segments merged (binary-counter policy)."""
+        segments = list(self.segments) + [segment]
+        while (len(segments) >= 2 and segments[-2].n_docs < 2 * segments[-1].n_docs
+               and segments[-2].n_docs + segments[-1].n_docs <= LEXICAL_INLINE_MERGE_ROWS):
+            segments[-2:] = [LexicalSegment.merge(segments[-2:])]
+        return LexicalView(segments)
+
+    def search(self, query: str, k: int, n_rows: int, keep=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 top-k rows below n_rows. `keep(rows) -> bool mask` drops rows (deleted, filtered).
+        Returns (rows, scores), best first.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        terms = {term_id(t) for t in tokenize(query)}
+        if not terms or not self.n_docs:
+            return empty
+        avgdl = max(self.total_len / self.n_docs, 1.0)
+        all_rows, all_scores = [], []
+        for term in terms:
+            hits = [p for p in (s.postings(term) for s in self.segments) if p is not None]
+            df = sum(len(p[0]) for p in hits)
+            if not df:
+                continue
+            idf = math.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            for rows, tfs, lens in hits:
+                tf = tfs.astype(np.float32)
+                all_rows.append(rows)
+                all_scores.append(idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lens / avgdl)))
+        if not all_rows:
+            return empty
+        all_rows, all_scores = np.concatenate(all_rows), np.concatenate(all_scores)
+        if len(all_rows) > self.n_docs // 4:
+            # common terms: accumulate into a dense per-row array (O(postings + rows), no sort)
+            scores = np.bincount(all_rows, weights=all_scores, minlength=self.n_rows).astype(np.float32)
+            rows = np.flatnonzero(scores)
+            scores = scores[rows]
+        else:
+            rows, inverse = np.unique(all_rows, return_inverse=True)
+            scores = np.bincount(inverse.ravel(), weights=all_scores).astype(np.float32)
+        mask = rows < n_rows
+        rows, scores = rows[mask], scores[mask]
+        if keep is not None:
+            mask = keep(rows)
+            rows, scores = rows[mask], scores[mask]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+
+# ---------- Fusion ----------
+def rrf_fuse(rankings: Sequence[Sequence[int]], k: int, rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion of several best-first row rankings -> [(row, score)] best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            if row >= 0:
+                scores[int(row)] = scores.get(int(row), 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])[:k]
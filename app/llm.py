@@ -0,0 +1,77 @@
+# app/llm.py
+
+from typing import AsyncIterator
+from dataclasses import dataclass
+import asyncio
+import inspect
+import time
+import os
+
+# ---------- Configuration ----------
+# "gemini" (default) or "stub" for a local, deterministic stand-in (tests / benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+STUB_TOKEN_DELAY = float(os.getenv("STUB_LLM_TOKEN_DELAY", "0.01"))
+
+
+@dataclass
+class StubResponse:
+    content: str
+
+
+class StubAssistant:
+    """
+    Offline replacement for the agno Agent with the same run/arun surface.
+    Answers with the first words of the question, streamed word by word.
+    """
+
+    def __init__(self, token_delay: float = STUB_TOKEN_DELAY, max_words: int = 48):
+        self.token_delay = token_delay
+        self.max_words = max_words
+
+    def _tokens(self, prompt: str):
+        question = prompt.rsplit("Question:", 1)[-1].split("Provide a complete", 1)[0].strip()
+        words = f"Stub answer to: {question}".split()[:self.max_words]
+        return [w + " " for w in words]
+
+    def run(self, prompt: str) -> StubResponse:
+        tokens = self._tokens(prompt)
+        time.sleep(self.token_delay * len(tokens))
+        return StubResponse("".join(tokens).strip())
+
+    async def arun(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._astream(prompt)
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.token_delay * len(tokens))
+        return StubResponse("".join(tokens).strip())
+
+    async def _astream(self, prompt: str):
+        for token in self._tokens(prompt):
+            await asyncio.sleep(self.token_delay)
+            yield StubResponse(token)
+
+
+def create_assistant():
+    if LLM_BACKEND == "stub":
+        return StubAssistant()
+    from agno.agent import Agent
+    from agno.models.google import Gemini
+    return Agent(model=Gemini())
+
+
+async def agenerate(assistant, prompt: str) -> str:
+    """Full answer, awaited without tying up a worker thread."""
+    response = await assistant.arun(prompt)
+    return response.content
+
+
+async def astream(assistant, prompt: str) -> AsyncIterator[str]:
+    """Answer text pieces as the model produces them."""
+    stream = assistant.arun(prompt, stream=True)
+    # agno versions differ on whether arun(stream=True) must be awaited first
+    if inspect.isawaitable(stream):
+        stream = await stream
+    async for event in stream:
+        content = getattr(event, "content", None)
+        if isinstance(content, str) and content:
+            yield content
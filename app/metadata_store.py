@@ -0,0 +1,667 @@
+# app/metadata_store.py
+
+from typing import List, Dict, Optional, Tuple
+import threading
+import mmap
+import glob
+import os
+import numpy as np
+
+# Dictionary-encoded string columns: each row stores a uint32 code into a shared value table
+STRING_COLUMNS = ("doc_id", "source_name", "mimeType")
+INT_COLUMNS = ("chunk_no", "start_token", "end_token", "text_length")
+TEXT_BLOB = "chunks.txt"
+VECTOR_BLOB = "vectors.f32"  # canonical float32 copy of every embedding; indexes are (re)built from it
+TOMBSTONES = "tombstones.i64"  # append-only log of deleted row ids
+NEVER = np.iinfo(np.int64).max  # tombstone log position of a row that was never deleted
+SEGMENT_GLOB = "seg-*.npz"
+
+
+class _GrowableArray:
+    """Typed append-only array with amortized O(1) appends (capacity doubling)."""
+
+    def __init__(self, dtype, capacity: int = 1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, values: np.ndarray):
+        n = len(values)
+        needed = self._size + n
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            # readers holding the old buffer keep seeing valid (immutable) rows
+            self._data = grown
+        self._data[self._size:needed] = values
+        self._size = needed
+
+    def __getitem__(self, i):
+        return self._data[i]
+
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+
+class _StringDictionary:
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value) -> int:
+        value = "" if value is None else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class MetadataStore:
+    """
+    Append-only columnar chunk metadata.
+
+    Rows are addressed by their position (the FAISS vector id). Small typed
+    columns live in memory; chunk text and vectors live in memory-mapped blob
+    files. Every append is written as a new segment file plus appends to the
+    blobs, so existing data is never rewritten: together they are the
+    write-ahead log the index is replayed from. What is committed is decided
+    by the caller's manifest (commit_state()); anything written past it by a
+    crashed append is discarded on load.
+    """
+
+    def __init__(self, root_dir: str, dim: int):
+        self.root_dir = root_dir
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._dicts = {c: _StringDictionary() for c in STRING_COLUMNS}
+        self._codes = {c: _GrowableArray(np.uint32) for c in STRING_COLUMNS}
+        self._ints = {c: _GrowableArray(np.int32) for c in INT_COLUMNS}
+        self._text_offset = _GrowableArray(np.int64)
+        self._deleted = _GrowableArray(np.bool_)
+        # tombstone log entry that deleted each row (NEVER if live), for views pinned before it
+        self._deleted_at = _GrowableArray(np.int64)
+        self._n_deleted = 0
+        # duplicate chunks (see dedup): the row whose vector they share, -1 for rows with their own
+        self._dup_of = _GrowableArray(np.int64)
+        # duplicates that are not indexed because an earlier live row of their group is
+        self._shadowed = _GrowableArray(np.bool_)
+        # last tombstone log entry of the delete that unshadowed a duplicate, -1 if it never was
+        self._promoted_at = _GrowableArray(np.int64)
+        self._aliases: Dict[int, List[int]] = {}  # group's first row -> its duplicates, ascending
+        self._tombstone_entries = 0
+        self._doc_rows: Dict[int, tuple] = {}  # doc code -> (first row, row count)
+        self._old_doc_rows: Dict[int, List[tuple]] = {}  # doc code -> ranges of its earlier versions, oldest first
+        # per string column: value code -> ascending row ids, for metadata filters
+        self._value_rows = {c: {} for c in STRING_COLUMNS}
+        self._text_map: Optional[mmap.mmap] = None
+        self._text_size = 0
+        self._vectors = np.empty((0, self.dim), dtype="float32")
+        self._next_segment = 1
+        self.segments: List[str] = []
+
+    def __len__(self):
+        return len(self._text_offset)
+
+    # ---------- loading ----------
+    def load(self, legacy_parquet: str = None, committed: Dict = None):
+        """
+        Replay segments from disk. With `committed` (a commit_state() from the manifest) only
+        those segments are read and uncommitted tails are cut off; without it every segment is.
+        Imports a legacy metadata.parquet once if no segments exist yet.
+        """
+        with self._lock:
+            self._reset()
+            os.makedirs(self.root_dir, exist_ok=True)
+            if committed is not None:
+                segments = list(committed["segments"])
+                self._discard_uncommitted(committed)
+            else:
+                segments = sorted(os.path.basename(p) for p in glob.glob(os.path.join(self.root_dir, SEGMENT_GLOB)))
+            for name in segments:
+                with np.load(os.path.join(self.root_dir, name), allow_pickle=False) as seg:
+                    self._apply_segment(seg)
+            self.segments = segments
+            if segments:
+                self._next_segment = max(int(name[4:10]) for name in segments) + 1
+            self._remap_text()
+            self._remap_vectors()
+            self._load_tombstones()
+
+        if not segments and legacy_parquet and os.path.exists(legacy_parquet):
+            import pandas as pd
+            print("🔹 Migrating legacy metadata.parquet to columnar store...")
+            self.append(pd.read_parquet(legacy_parquet).to_dict(orient="records"))
+
+    def _discard_uncommitted(self, committed: Dict):
+        """Drop whatever a crashed writer appended after the last commit."""
+        keep = set(committed["segments"])
+        for path in glob.glob(os.path.join(self.root_dir, "seg-*")):
+            if os.path.basename(path) not in keep:
+                os.remove(path)
+        limits = {TEXT_BLOB: committed["text_bytes"], VECTOR_BLOB: committed["rows"] * 4 * self.dim,
+                  TOMBSTONES: committed["tombstones"] * 8}
+        for name, size in limits.items():
+            path = os.path.join(self.root_dir, name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def commit_state(self) -> Dict:
+        """What a manifest must record to make the current contents durable."""
+        return {"segments": list(self.segments), "rows": len(self), "text_bytes": self._text_size,
+                "tombstones": self._tombstone_entries}
+
+    def _apply_segment(self, seg):
+        for col in STRING_COLUMNS:
+            for value in seg[f"{col}__new"].tolist():
+                self._dicts[col].encode(value)
+            self._codes[col].extend(seg[col])
+        for col in INT_COLUMNS:
+            self._ints[col].extend(seg[col])
+        first = len(self._text_offset)
+        n = len(seg["text_offset"])
+        self._deleted.extend(np.zeros(n, dtype=np.bool_))
+        self._deleted_at.extend(np.full(n, NEVER, dtype=np.int64))
+        self._promoted_at.extend(np.full(n, -1, dtype=np.int64))
+        # segments written before deduplication have no dup_of column
+        self._extend_duplicates(first, seg["dup_of"] if "dup_of" in seg.files else np.full(n, -1, dtype=np.int64))
+        self._text_offset.extend(seg["text_offset"])
+        self._index_docs(first, seg["doc_id"], seg["chunk_no"])
+        self._index_values(first, seg)
+
+    def _load_tombstones(self):
+        path = os.path.join(self.root_dir, TOMBSTONES)
+        if not os.path.exists(path):
+            return
+        logged = np.fromfile(path, dtype=np.int64)
+        self._tombstone_entries = len(logged)
+        entries = np.flatnonzero(logged < len(self))
+        rows = logged[entries]
+        flags = self._deleted.view()
+        flags[rows] = True
+        self._deleted_at.view()[rows] = entries
+        self._n_deleted = int(flags.sum())
+        if self._aliases:
+            self._shadowed.view()[:] = self._shadowed_under(flags)
+
+    def _index_docs(self, first: int, doc_codes: np.ndarray, chunk_nos: np.ndarray):
+        # rows of one doc are appended together, so a (first, count) range per doc is enough
+        # (the range of its latest version: a replacement starts again at chunk 0)
+        if len(doc_codes) == 0:
+            return
+        boundaries = np.flatnonzero(np.diff(doc_codes)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(doc_codes)]))
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            code = int(doc_codes[s])
+            prev_first, prev_count = self._doc_rows.get(code, (0, 0))
+            if s == 0 and prev_count and prev_first + prev_count == first and int(chunk_nos[0]) == prev_count:
+                # same doc continued from the previous segment (not a new version appended right after it)
+                self._doc_rows[code] = (prev_first, prev_count + e)
+            else:
+                if prev_count:
+                    self._old_doc_rows.setdefault(code, []).append((prev_first, prev_count))
+                self._doc_rows[code] = (first + s, e - s)
+
+    def _index_values(self, first: int, seg):
+        for col in STRING_COLUMNS:
+            codes = np.asarray(seg[col])
+            if len(codes) == 0:
+                continue
+            order = np.argsort(codes, kind="stable")
+            sorted_codes = codes[order]
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_codes)) + 1))
+            ends = np.concatenate((starts[1:], [len(codes)]))
+            postings = self._value_rows[col]
+            for s, e in zip(starts.tolist(), ends.tolist()):
+                code = int(sorted_codes[s])
+                if code not in postings:
+                    postings[code] = _GrowableArray(np.int64, capacity=max(16, e - s))
+                postings[code].extend(first + order[s:e])
+
+    def _remap_text(self):
+        path = os.path.join(self.root_dir, TEXT_BLOB)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            self._text_map = None
+            self._text_size = 0
+            return
+        with open(path, "rb") as fh:
+            # old maps are left to the GC so in-flight readers never see a closed map
+            self._text_map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._text_size = len(self._text_map)
+
+    def _remap_vectors(self):
+        path = os.path.join(self.root_dir, VECTOR_BLOB)
+        n = os.path.getsize(path) // (4 * self.dim) if os.path.exists(path) else 0
+        if n == 0:
+            self._vectors = np.empty((0, self.dim), dtype="float32")
+        else:
+            self._vectors = np.memmap(path, dtype="float32", mode="r", shape=(n, self.dim))
+
+    def memory_bytes(self) -> int:
+        """In-RAM columns and per-value row lists (text and vectors are memory-mapped, not counted)."""
+        arrays = [*self._codes.values(), *self._ints.values(), self._text_offset, self._deleted,
+                  self._deleted_at, self._dup_of, self._shadowed, self._promoted_at]
+        arrays += [rows for postings in self._value_rows.values() for rows in postings.values()]
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def n_vectors(self) -> int:
+        return len(self._vectors)
+
+    def vectors(self, rows=None) -> np.ndarray:
+        """Stored embeddings for the given row ids (or a slice); all of them by default."""
+        return self._vectors if rows is None else self._vectors[rows]
+
+    # ---------- writes ----------
+    def append_vectors(self, vectors: np.ndarray):
+        """Append embeddings for rows that already exist (used to backfill pre-existing corpora)."""
+        with self._lock:
+            self._write_vectors(vectors)
+
+    def _write_vectors(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype="float32").reshape(-1, self.dim)
+        path = os.path.join(self.root_dir, VECTOR_BLOB)
+        with open(path, "ab") as fh:
+            # truncate any torn tail first so rows stay aligned with their vectors
+            fh.truncate(self.n_vectors * 4 * self.dim)
+            fh.write(vectors.tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._remap_vectors()
+
+    def append(self, rows: List[Dict], vectors: np.ndarray = None, dup_of: np.ndarray = None) -> int:
+        """
+        Append metadata rows (and their embeddings) as one new segment.
+        `dup_of` marks duplicates: per row, the id of an earlier row (stored, or
+        earlier in this batch) whose vector it shares, or -1.
+        Returns the row id of the first appended row.
+        """
+        with self._lock:
+            first_row = len(self)
+            if not rows:
+                return first_row
+            dup_of = self._group_firsts(first_row, dup_of, len(rows))
+            if vectors is not None:
+                if len(vectors) != len(rows):
+                    raise ValueError(f"got {len(vectors)} vectors for {len(rows)} rows")
+                if self.n_vectors != first_row:
+                    raise ValueError(f"vector column is at row {self.n_vectors}, metadata at row {first_row}")
+                self._write_vectors(vectors)
+
+            blob_path = os.path.join(self.root_dir, TEXT_BLOB)
+            os.makedirs(self.root_dir, exist_ok=True)
+            encoded = [(r.get("text") or "").encode("utf-8") for r in rows]
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            with open(blob_path, "ab") as fh:
+                # committed offsets only ever point below the segment's recorded bytes,
+                # so a torn tail from a crashed append is simply ignored
+                base = fh.seek(0, os.SEEK_END)
+                fh.write(b"".join(encoded))
+                fh.flush()
+                os.fsync(fh.fileno())
+            offsets = base + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+            seg = {"text_offset": offsets.astype(np.int64)}
+            dict_sizes = {col: len(self._dicts[col].values) for col in STRING_COLUMNS}
+            for col in STRING_COLUMNS:
+                d = self._dicts[col]
+                seg[col] = np.fromiter((d.encode(r.get(col)) for r in rows), dtype=np.uint32, count=len(rows))
+                seg[f"{col}__new"] = np.array(d.values[dict_sizes[col]:], dtype=str)
+            seg["chunk_no"] = np.array([_chunk_no(r) for r in rows], dtype=np.int32)
+            seg["start_token"] = np.array([int(r.get("start_token", 0)) for r in rows], dtype=np.int32)
+            seg["end_token"] = np.array([int(r.get("end_token", 0)) for r in rows], dtype=np.int32)
+            seg["text_length"] = lengths.astype(np.int32)
+            seg["dup_of"] = dup_of
+
+            try:
+                self._write_segment(seg)
+            except Exception:
+                # forget dictionary values that never made it into a segment
+                for col, size in dict_sizes.items():
+                    d = self._dicts[col]
+                    for value in d.values[size:]:
+                        del d.codes[value]
+                    del d.values[size:]
+                raise
+
+            for col in STRING_COLUMNS:
+                self._codes[col].extend(seg[col])
+            for col in INT_COLUMNS:
+                self._ints[col].extend(seg[col])
+            self._remap_text()
+            self._deleted.extend(np.zeros(len(rows), dtype=np.bool_))
+            self._deleted_at.extend(np.full(len(rows), NEVER, dtype=np.int64))
+            self._promoted_at.extend(np.full(len(rows), -1, dtype=np.int64))
+            self._extend_duplicates(first_row, dup_of)
+            # publish the offsets last: len(self) only grows once every column is filled
+            self._text_offset.extend(seg["text_offset"])
+            self._index_docs(first_row, seg["doc_id"], seg["chunk_no"])
+            self._index_values(first_row, seg)
+            return first_row
+
+    def _write_segment(self, seg: Dict) -> str:
+        name = f"seg-{self._next_segment:06d}.npz"
+        path = os.path.join(self.root_dir, name)
+        with open(path + ".tmp", "wb") as fh:
+            np.savez(fh, **seg)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(path + ".tmp", path)
+        self._next_segment += 1
+        self.segments.append(name)
+        return name
+
+    def compact_segments(self) -> List[str]:
+        """
+        Rewrite all segments as one. Returns the replaced segment names; the caller
+        commits the new segment list and then calls remove_segments() on them.
+        """
+        with self._lock:
+            if len(self.segments) <= 1:
+                return []
+            seg = {"text_offset": self._text_offset.view().copy()}
+            for col in STRING_COLUMNS:
+                seg[col] = self._codes[col].view().copy()
+                seg[f"{col}__new"] = np.array(self._dicts[col].values, dtype=str)
+            for col in INT_COLUMNS:
+                seg[col] = self._ints[col].view().copy()
+            seg["dup_of"] = self._dup_of.view().copy()
+            old = self.segments
+            self.segments = []
+            try:
+                self._write_segment(seg)
+            except Exception:
+                self.segments = old
+                raise
+            return old
+
+    def remove_segments(self, names: List[str]):
+        for name in names:
+            path = os.path.join(self.root_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def delete_rows(self, rows) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tombstone rows (idempotent). Returns the rows that were live until now, and the
+        duplicates that now stand in for a deleted row of their group (they need indexing).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        with self._lock:
+            flags = self._deleted.view()
+            rows = np.unique(rows[(rows >= 0) & (rows < len(flags))])
+            rows = rows[~flags[rows]]
+            if len(rows) == 0:
+                return rows, rows
+            with open(os.path.join(self.root_dir, TOMBSTONES), "ab") as fh:
+                fh.write(rows.tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+            flags[rows] = True
+            entry = self._tombstone_entries
+            self._deleted_at.view()[rows] = np.arange(entry, entry + len(rows))
+            self._n_deleted += len(rows)
+            self._tombstone_entries += len(rows)
+            return rows, self._promote(rows)
+
+    # ---------- duplicates ----------
+    def _group_firsts(self, first_row: int, dup_of: Optional[np.ndarray], n: int) -> np.ndarray:
+        """dup_of for a new batch, pointed at each group's first row (duplicates of duplicates join the group)."""
+        resolved = np.full(n, -1, dtype=np.int64)
+        if dup_of is None:
+            return resolved
+        stored = self._dup_of.view()
+        for i, target in enumerate(np.asarray(dup_of, dtype=np.int64).tolist()):
+            if target < 0:
+                continue
+            if target >= first_row + i:
+                raise ValueError(f"row {first_row + i} can only duplicate an earlier row, not {target}")
+            group = stored[target] if target < first_row else resolved[target - first_row]
+            resolved[i] = group if group >= 0 else target
+        return resolved
+
+    def _extend_duplicates(self, first: int, dup_of: np.ndarray):
+        self._dup_of.extend(dup_of)
+        shadowed = np.zeros(len(dup_of), dtype=np.bool_)
+        flags = self._deleted.view()
+        for i in np.flatnonzero(dup_of >= 0).tolist():
+            group = int(dup_of[i])
+            members = self._aliases.setdefault(group, [])
+            # shadowed while any earlier member of the group is live (and indexed in its place)
+            shadowed[i] = not flags[group] or any(not flags[m] for m in members)
+            members.append(first + i)
+        self._shadowed.extend(shadowed)
+
+    def _promote(self, deleted: np.ndarray) -> np.ndarray:
+        """Unshadow the first live duplicate of each group that just lost its indexed row."""
+        if not self._aliases:
+            return np.empty(0, dtype=np.int64)
+        dup_of = self._dup_of.view()
+        groups = {int(r) for r in deleted.tolist() if r in self._aliases}
+        groups.update(int(dup_of[r]) for r in deleted.tolist() if dup_of[r] >= 0)
+        flags, shadowed = self._deleted.view(), self._shadowed.view()
+        promoted_at = self._promoted_at.view()
+        promoted = []
+        for group in groups:
+            if not flags[group]:
+                continue
+            for member in self._aliases[group]:
+                if not flags[member]:
+                    if shadowed[member]:
+                        shadowed[member] = False
+                        promoted_at[member] = self._tombstone_entries - 1
+                        promoted.append(member)
+                    break
+        return np.array(sorted(promoted), dtype=np.int64)
+
+    def _shadowed_under(self, flags: np.ndarray) -> np.ndarray:
+        """Shadowed flags for every row given these deleted flags."""
+        shadowed = np.zeros(len(flags), dtype=np.bool_)
+        for group, members in self._aliases.items():
+            seen_live = group < len(flags) and not flags[group]
+            for member in members:
+                if member >= len(flags):
+                    break
+                if flags[member]:
+                    continue
+                shadowed[member] = seen_live
+                seen_live = True
+        return shadowed
+
+    def duplicate_of(self, row: int) -> int:
+        """Row whose vector `row` shares (its group's first row), or -1."""
+        return int(self._dup_of[row])
+
+    @property
+    def n_duplicates(self) -> int:
+        """Live duplicate rows that are not indexed because another row of their group is."""
+        return int(np.count_nonzero(self._shadowed.view() & ~self._deleted.view()))
+
+    # ---------- reads ----------
+    @property
+    def n_deleted(self) -> int:
+        return self._n_deleted
+
+    def _deleted_flags(self, rows, tombstones: int = None) -> np.ndarray:
+        """Deleted flags of `rows` (an index or slice) now or, with `tombstones`, as of that many log entries."""
+        if tombstones is None:
+            return self._deleted.view()[rows]
+        return self._deleted_at.view()[rows] < tombstones
+
+    def is_deleted(self, row: int, tombstones: int = None) -> bool:
+        return bool(self._deleted_flags(row, tombstones))
+
+    def live_mask(self, rows: np.ndarray, tombstones: int = None) -> np.ndarray:
+        """Vectorized `not is_deleted` for an array of existing row ids."""
+        return ~self._deleted_flags(rows, tombstones)
+
+    def live_rows(self, below: int = None, tombstones: int = None) -> np.ndarray:
+        """Ids of rows that are not tombstoned (optionally only rows < below)."""
+        return np.flatnonzero(~self._deleted_flags(slice(None, below), tombstones))
+
+    def indexed_mask(self, rows: np.ndarray, tombstones: int = None) -> np.ndarray:
+        """Rows that belong in the vector index: live, and not a duplicate shadowed by its group."""
+        shadowed = self._shadowed.view()[rows]
+        if tombstones is not None:
+            # promoted in place of a row deleted after that point: still shadowed then
+            shadowed = shadowed | (self._promoted_at.view()[rows] >= tombstones)
+        return ~(self._deleted_flags(rows, tombstones) | shadowed)
+
+    def indexed_rows(self, below: int = None, tombstones: int = None) -> np.ndarray:
+        """
+        Ids of rows that belong in the vector index (optionally only rows < below),
+        now or, with `tombstones`, as of that many tombstone log entries.
+        """
+        if tombstones is None:
+            return np.flatnonzero(~(self._deleted.view()[:below] | self._shadowed.view()[:below]))
+        flags = np.zeros(len(self), dtype=np.bool_)
+        path = os.path.join(self.root_dir, TOMBSTONES)
+        if tombstones and os.path.exists(path):
+            logged = np.fromfile(path, dtype=np.int64, count=tombstones)
+            flags[logged[logged < len(flags)]] = True
+        hidden = flags | self._shadowed_under(flags) if self._aliases else flags
+        return np.flatnonzero(~hidden[:below])
+
+    def indexed_rows_at(self, below: int):
+        """indexed_rows(below) plus the tombstone log position it reflects, read atomically."""
+        with self._lock:
+            return self.indexed_rows(below), self._tombstone_entries
+
+    def tombstones_since(self, entry: int, below: int = None) -> np.ndarray:
+        """Rows tombstoned after the first `entry` log entries (optionally only rows < below)."""
+        path = os.path.join(self.root_dir, TOMBSTONES)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=np.int64)
+        rows = np.fromfile(path, dtype=np.int64, offset=8 * entry)[:max(0, self._tombstone_entries - entry)]
+        return np.unique(rows if below is None else rows[rows < below])
+
+    def rows_for_docs(self, doc_ids, below: int = None) -> np.ndarray:
+        """Live rows belonging to any of doc_ids (one vectorized pass, also finds older duplicate copies)."""
+        codes = [self._dicts["doc_id"].codes[d] for d in doc_ids if d in self._dicts["doc_id"].codes]
+        if not codes:
+            return np.empty(0, dtype=np.int64)
+        below = len(self) if below is None else below
+        doc_col = self._codes["doc_id"].view()[:below]
+        mask = np.isin(doc_col, np.array(codes, dtype=np.uint32)) & ~self._deleted.view()[:below]
+        return np.flatnonzero(mask)
+
+    def rows_matching(self, filters: Dict[str, List[str]], below: int = None, tombstones: int = None) -> np.ndarray:
+        """
+        Live rows (ascending) whose column values match: any of the listed values within a column,
+        every column. Cost is proportional to the matching rows, not the corpus.
+        """
+        below = len(self) if below is None else below
+        matched = None
+        for col, values in filters.items():
+            if col not in STRING_COLUMNS:
+                raise ValueError(f"cannot filter on {col!r}; expected one of {STRING_COLUMNS}")
+            codes = [self._dicts[col].codes[v] for v in values if v in self._dicts[col].codes]
+            # a value is encoded before its rows are indexed: an append in progress has no postings yet
+            postings = self._value_rows[col]
+            parts = [postings[c].view() for c in codes if c in postings]
+            rows = np.unique(np.concatenate(parts)) if len(parts) > 1 else (parts[0] if parts else np.empty(0, dtype=np.int64))
+            rows = rows[:np.searchsorted(rows, below)]
+            matched = rows if matched is None else np.intersect1d(matched, rows, assume_unique=True)
+        if matched is None:
+            return self.live_rows(below, tombstones)
+        return matched[self.live_mask(matched, tombstones)]
+
+    def text(self, row: int) -> str:
+        offset = int(self._text_offset[row])
+        length = int(self._ints["text_length"][row])
+        return self._text_map[offset:offset + length].decode("utf-8", errors="ignore") if length else ""
+
+    def row(self, row: int) -> Dict:
+        """O(1) fetch of one row in the legacy dict shape."""
+        doc_id = self._dicts["doc_id"].values[self._codes["doc_id"][row]]
+        chunk_no = int(self._ints["chunk_no"][row])
+        return {
+            "doc_id": doc_id,
+            "chunk_id": f"{doc_id}__{chunk_no}",
+            "source_name": self._dicts["source_name"].values[self._codes["source_name"][row]],
+            "mimeType": self._dicts["mimeType"].values[self._codes["mimeType"][row]],
+            "start_token": int(self._ints["start_token"][row]),
+            "end_token": int(self._ints["end_token"][row]),
+            "text": self.text(row),
+        }
+
+    def row_for_chunk(self, chunk_id: str, below: int = None, tombstones: int = None) -> Optional[int]:
+        """chunk_id -> row id, via the row range of the doc's latest version starting below `below`."""
+        doc_id, _, chunk_no = chunk_id.rpartition("__")
+        code = self._dicts["doc_id"].codes.get(doc_id)
+        if code is None or not chunk_no.isdigit():
+            return None
+        no = int(chunk_no)
+        below = len(self) if below is None else below
+        for first, count in [self._doc_rows.get(code, (0, 0)), *self._old_doc_rows.get(code, [])[::-1]]:
+            if first >= below:
+                continue
+            row = first + no
+            if no >= count or row >= below or self.is_deleted(row, tombstones) or self._ints["chunk_no"][row] != no:
+                return None
+            return row
+        return None
+
+    def doc_rows(self, doc_id: str) -> range:
+        code = self._dicts["doc_id"].codes.get(doc_id)
+        first, count = self._doc_rows.get(code, (0, 0))
+        return range(first, first + count)
+
+    def view(self, n_rows: int = None) -> "MetadataView":
+        with self._lock:
+            return MetadataView(self, len(self) if n_rows is None else n_rows, self._tombstone_entries)
+
+
+class MetadataView:
+    """
+    Fixed-length window over a MetadataStore; rows appended later are invisible to it,
+    and rows deleted (or duplicates unshadowed) after the first `tombstones` log entries
+    still look as they did then.
+    """
+
+    def __init__(self, store: MetadataStore, n_rows: int, tombstones: int):
+        self.store = store
+        self.n_rows = n_rows
+        self.tombstones = tombstones
+
+    def __len__(self):
+        return self.n_rows
+
+    def row(self, row: int) -> Dict:
+        if not 0 <= row < self.n_rows:
+            raise IndexError(row)
+        return self.store.row(row)
+
+    def row_for_chunk(self, chunk_id: str) -> Optional[int]:
+        return self.store.row_for_chunk(chunk_id, below=self.n_rows, tombstones=self.tombstones)
+
+    def is_deleted(self, row: int) -> bool:
+        return self.store.is_deleted(row, self.tombstones)
+
+    def live_mask(self, rows: np.ndarray) -> np.ndarray:
+        return self.store.live_mask(rows, self.tombstones)
+
+    def indexed_mask(self, rows: np.ndarray) -> np.ndarray:
+        return self.store.indexed_mask(rows, self.tombstones)
+
+    def rows_matching(self, filters: Dict[str, List[str]]) -> np.ndarray:
+        return self.store.rows_matching(filters, below=self.n_rows, tombstones=self.tombstones)
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        return self.store.vectors(rows)
+
+
+def _chunk_no(row: Dict) -> int:
+    _, _, no = str(row.get("chunk_id", "")).rpartition("__")
+    return int(no) if no.isdigit() else 0
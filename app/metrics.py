@@ -0,0 +1,312 @@
+# app/metrics.py
+
+from contextvars import ContextVar
+from collections import deque
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import threading
+import random
+import uuid
+import time
+import os
+
+# ---------- Configuration ----------
+# 0 turns stage timing off entirely (counters and /metrics keep working)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Share of requests that record a trace (one span per stage they pass through); 0 disables tracing.
+# A request with the header "X-Trace: 1" is always traced.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Finished traces kept for GET /metrics/traces
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+# Spans kept per trace (an ingest can pass through thousands of stages)
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+
+# seconds: a cache hit (well under a millisecond) up to an LLM answer or a large index rebuild
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = "intellidesk_"
+
+
+# ---------- Metric types ----------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label set, thread-safe."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[label]) for label in self.labels), 0)
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name + "_total", dict(zip(self.labels, key)), value
+
+
+class Histogram:
+    """Bucketed observations (cumulative on output) plus their sum and count per label set, thread-safe."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # key -> [counts per bucket + overflow, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def summary(self, **labels) -> Dict:
+        """count, sum and mean of one label set (for JSON endpoints and benchmarks)."""
+        with self._lock:
+            series = self._series.get(tuple(str(labels[label]) for label in self.labels))
+            count, total = (series[2], series[1]) if series else (0, 0.0)
+        return {"count": count, "sum": total, "mean": total / count if count else 0.0}
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        for key, counts, total, count in items:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                yield self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class Collected:
+    """
+    A metric read from existing state when /metrics is scraped (index sizes,
+    job counts, connector counters): `collect()` returns (labels, value) pairs.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        self.name = PREFIX + name
+        self.help = help
+        self.kind = kind
+        self.collect = collect
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        suffix = "_total" if self.kind == "counter" else ""
+        for labels, value in self.collect():
+            yield self.name + suffix, labels, value
+
+
+_registry: Dict[str, object] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+
+def counter(name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labels, buckets))
+
+
+def collected(name: str, help: str, kind: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> Collected:
+    """Register (or replace) a metric computed at scrape time; kind is "gauge" or "counter"."""
+    metric = Collected(name, help, kind, collect)
+    with _registry_lock:
+        _registry[metric.name] = metric
+    return metric
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        try:
+            samples = list(metric.samples())
+        except Exception as e:
+            print(f"⚠️ Metric {metric.name} failed to collect: {e}")
+            continue
+        lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Built-in metrics ----------
+STAGE_SECONDS = histogram("stage_seconds", "Seconds spent in each query / ingest pipeline stage", ("stage",))
+HTTP_SECONDS = histogram("http_request_seconds", "HTTP request handling time (to the response headers)",
+                         ("method", "route", "status"))
+CACHE_LOOKUPS = counter("cache_lookups", "Embedding and answer cache lookups", ("cache", "result"))
+QUERIES = counter("queries", "Queries retrieved, by retrieval mode", ("mode",))
+CHUNKS = counter("chunks", "Chunks produced by ingestion (extract + chunk)")
+VECTORS = counter("vectors_added", "Vectors (chunks) added to the index stores")
+DOCUMENTS = counter("ingest_documents", "Documents seen by ingestion, by outcome", ("result",))
+
+
+# ---------- Stages and traces ----------
+class Trace:
+    """Spans of one sampled request (or extract task): stage, start offset and duration."""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.dropped = 0
+        self.attrs: Dict = {}
+
+    def add_span(self, stage: str, started: float, seconds: float, **attrs):
+        # list.append is atomic, so spans can come from the CPU pool and ingest threads at once
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append({"stage": stage, "start_ms": round((started - self._t0) * 1000, 3),
+                           "ms": round(seconds * 1000, 3), **attrs})
+
+    def as_dict(self) -> Dict:
+        return {"trace_id": self.id, "name": self.name, "started_at": self.started_at, **self.attrs,
+                "spans": sorted(self.spans, key=lambda s: s["start_ms"]), "dropped_spans": self.dropped}
+
+
+class TraceGroup:
+    """Several requests' traces served by one batch: every span goes to each of them."""
+
+    def __init__(self, traces: List[Trace]):
+        self.traces = traces
+
+    def add_span(self, stage: str, started: float, seconds: float, **attrs):
+        for trace in self.traces:
+            trace.add_span(stage, started, seconds, batch=len(self.traces), **attrs)
+
+
+_current = ContextVar("trace", default=None)
+_finished = deque(maxlen=max(1, TRACE_BUFFER_SIZE))
+
+
+def current_trace():
+    return _current.get()
+
+
+def start_trace(name: str, force: bool = False) -> Optional[Trace]:
+    """A new trace for the current context if this request is sampled (or forced), else None."""
+    if not force and (TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE):
+        return None
+    trace = Trace(name)
+    _current.set(trace)
+    return trace
+
+
+def finish_trace(trace: Trace, **attrs):
+    trace.attrs.update(attrs, ms=round((time.perf_counter() - trace._t0) * 1000, 3))
+    _finished.append(trace)
+
+
+def recent_traces(limit: int = 50) -> List[Dict]:
+    """Most recent finished traces first."""
+    return [t.as_dict() for t in list(_finished)[::-1][:max(0, limit)]]
+
+
+class use_trace:
+    """Run a block with `trace` (a Trace, TraceGroup or None) as the current trace."""
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __enter__(self):
+        self._token = _current.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+
+
+def record_stage(name: str, seconds: float, started: float = None, **attrs):
+    """Record a stage timed by the caller (started is a perf_counter() reading)."""
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage=name)
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, time.perf_counter() - seconds if started is None else started, seconds, **attrs)
+
+
+def record_spans(spans: Iterable[Dict]):
+    """Stages recorded in another process (see Trace), replayed into this one's histograms and trace."""
+    now = time.perf_counter()
+    for span in spans:
+        record_stage(span["stage"], span["ms"] / 1000, now - span["ms"] / 1000)
+
+
+class stage:
+    """
+    Times a block into the stage histogram, and into the current trace as a
+    span when the request is sampled:
+
+        with metrics.stage("vector_search"):
+            ...
+
+    A class rather than a generator context manager: this sits on the query hot path.
+    """
+    __slots__ = ("name", "attrs", "started")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not METRICS_ENABLED:
+            return
+        seconds = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(seconds, stage=self.name)
+        trace = _current.get()
+        if trace is not None:
+            if exc_type is not None:
+                trace.add_span(self.name, self.started, seconds, error=exc_type.__name__, **self.attrs)
+            else:
+                trace.add_span(self.name, self.started, seconds, **self.attrs)
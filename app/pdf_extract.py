@@ -0,0 +1,165 @@
+# app/pdf_extract.py
+
+from concurrent.futures import Executor, TimeoutError as FutureTimeout
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Union
+import tempfile
+import threading
+import time
+import io
+import os
+import pdfplumber
+
+# ---------- Configuration ----------
+# auto = pymupdf if installed, else pdfium (installed with pdfplumber); pdfplumber = layout-aware but slow
+PDF_BACKEND = os.getenv("PDF_BACKEND", "auto")
+# Pages per extraction task; longer PDFs are split into page ranges across the extract process pool
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+# Seconds one document may spend in extraction before it is failed
+PDF_EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", "300"))
+
+BACKENDS = ("pymupdf", "pdfium", "pdfplumber")
+
+Source = Union[bytes, str]  # PDF bytes, or a path to them
+
+# pdfium is not thread-safe: worker processes are single-threaded, in-process calls are serialized
+_pdfium_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def resolve_backend(backend: str = None) -> str:
+    backend = backend or PDF_BACKEND
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown PDF backend {backend!r}; expected auto or one of {BACKENDS}")
+        return backend
+    for candidate, module in (("pymupdf", "fitz"), ("pdfium", "pypdfium2")):
+        try:
+            __import__(module)
+            return candidate
+        except ImportError:
+            continue
+    return "pdfplumber"
+
+
+# ---------- Backends ----------
+def _normalize(text: str) -> str:
+    """Same shape as pdfplumber's output: \\n line breaks, no trailing spaces, no soft-hyphen markers."""
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n").replace("\x02", "").replace("\ufffe", "")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def _pdfium_pages(source: Source, start: int, end: int) -> List[str]:
+    import pypdfium2 as pdfium
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            pages = []
+            for i in range(start, min(end, len(pdf))):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                pages.append(_normalize(textpage.get_text_range()))
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+
+
+def _pymupdf_pages(source: Source, start: int, end: int) -> List[str]:
+    import fitz
+    doc = fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)
+    try:
+        return [_normalize(doc[i].get_text()) for i in range(start, min(end, doc.page_count))]
+    finally:
+        doc.close()
+
+
+def _plumber_pages(source: Source, page_numbers: Sequence[int]) -> List[str]:
+    stream = io.BytesIO(source) if isinstance(source, bytes) else source
+    with pdfplumber.open(stream, pages=[i + 1 for i in page_numbers]) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def page_count(source: Source, backend: str = None) -> int:
+    backend = resolve_backend(backend)
+    if backend == "pymupdf":
+        import fitz
+        with (fitz.open(stream=source, filetype="pdf") if isinstance(source, bytes) else fitz.open(source)) as doc:
+            return doc.page_count
+    if backend == "pdfium":
+        import pypdfium2 as pdfium
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(source)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+    stream = io.BytesIO(source) if isinstance(source, bytes) else source
+    with pdfplumber.open(stream) as pdf:
+        return len(pdf.pages)
+
+
+def _looks_broken(text: str) -> bool:
+    """Heuristic for pages a fast extractor mangled (unmapped glyphs, words run together)."""
+    if len(text) < 200:
+        return False
+    if text.count("\ufffd") > 0.02 * len(text):
+        return True
+    return text.count(" ") + text.count("\n") < 0.02 * len(text)
+
+
+def extract_page_range(source: Source, start: int, end: int, backend: str = None) -> List[str]:
+    """
+    Text of pages [start, end). Top-level so page ranges can run in worker processes.
+    Pages the fast backend garbles are re-read with pdfplumber.
+    """
+    backend = resolve_backend(backend)
+    if backend == "pdfplumber":
+        return _plumber_pages(source, range(start, end))
+    pages = (_pymupdf_pages if backend == "pymupdf" else _pdfium_pages)(source, start, end)
+    redo = [i for i, text in enumerate(pages) if _looks_broken(text)]
+    if redo:
+        for i, text in zip(redo, _plumber_pages(source, [start + i for i in redo])):
+            pages[i] = text
+    return pages
+
+
+# ---------- PDF extraction ----------
+def iter_pdf_pages(file_bytes: bytes, pool: Optional[Executor] = None, backend: str = None,
+                   pages_per_task: int = PDF_PAGES_PER_TASK, timeout: float = PDF_EXTRACT_TIMEOUT) -> Iterator[str]:
+    """
+    Page texts in order, as they become available. With a process pool, a long PDF
+    is extracted as parallel page ranges; raises TimeoutError past `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    backend = resolve_backend(backend)
+    n_pages = page_count(file_bytes, backend)
+    if pool is None or n_pages <= pages_per_task:
+        for start in range(0, n_pages, pages_per_task):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"PDF extraction exceeded {timeout}s")
+            yield from extract_page_range(file_bytes, start, start + pages_per_task, backend)
+        return
+    # workers read one temp copy instead of each being sent the whole file
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(file_bytes)
+        futures = [pool.submit(extract_page_range, path, start, start + pages_per_task, backend)
+                   for start in range(0, n_pages, pages_per_task)]
+        try:
+            for future in futures:
+                yield from future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            raise TimeoutError(f"PDF extraction exceeded {timeout}s")
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        os.remove(path)
+
+
+def extract_text_from_pdf_bytes(file_bytes: bytes, pool: Optional[Executor] = None, backend: str = None) -> str:
+    """Extract text from PDF bytes (non-empty pages joined by newlines)."""
+    return "\n".join(text for text in iter_pdf_pages(file_bytes, pool=pool, backend=backend) if text)
@@ -0,0 +1,242 @@
+# app/query_cache.py
+
+from collections import OrderedDict
+from typing import Optional, Iterable, Dict
+import threading
+import hashlib
+import zlib
+import time
+import re
+import os
+import numpy as np
+
+# ---------- Configuration ----------
+EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_TTL = float(os.getenv("QUERY_EMBED_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
+# cosine similarity two query embeddings need to share a cached answer
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+# Cross-encoder scores of (query, chunk) pairs kept by the reranker
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive cache key for a query."""
+    return _WHITESPACE.sub(" ", query).strip().casefold()
+
+
+class _Counters:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self, size: int) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class EmbeddingCache:
+    """LRU + TTL cache of normalized query text -> query embedding."""
+
+    def __init__(self, max_size: int = EMBED_CACHE_SIZE, ttl: float = EMBED_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (expires_at, embedding)
+        self._lock = threading.Lock()
+        self.counters = _Counters()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = normalize_query(query)
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._items[key]
+                self.counters.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.counters.hits += 1
+            return item[1]
+
+    def put(self, query: str, embedding: np.ndarray):
+        if self.max_size <= 0:
+            return
+        key = normalize_query(query)
+        embedding = np.asarray(embedding, dtype="float32")
+        embedding.setflags(write=False)  # shared between requests
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, embedding)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.counters.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict:
+        return self.counters.stats(len(self._items))
+
+
+class AnswerCache:
+    """
+    Semantic cache of LLM answers.
+
+    An answer is reused when a new query retrieved exactly the same chunk ids
+    and its embedding is within ANSWER_CACHE_SIMILARITY (cosine) of the query
+    that produced it. Everything is dropped when a newer index version is
+    seen; requests still on an older snapshot neither read nor write it.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL, similarity: float = ANSWER_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.version = None
+        self._items = OrderedDict()  # (chunk_key, query_key) -> (expires_at, unit embedding, answer)
+        self._by_chunks: Dict[frozenset, set] = {}
+        self._lock = threading.Lock()
+        self.counters = _Counters()
+        self.invalidations = 0
+
+    def _check_version(self, version) -> bool:
+        """Move the cache forward to `version`; False if it is older than the cache's."""
+        if self.version is not None and version < self.version:
+            return False
+        if version != self.version:
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+            self._by_chunks.clear()
+            self.version = version
+        return True
+
+    def get(self, query_emb: np.ndarray, chunk_ids: Iterable[str], version) -> Optional[str]:
+        chunk_key = frozenset(chunk_ids)
+        unit = _unit(query_emb)
+        now = time.monotonic()
+        with self._lock:
+            if not self._check_version(version):
+                self.counters.misses += 1
+                return None
+            best_key, best_sim = None, self.similarity
+            for query_key in self._by_chunks.get(chunk_key, ()):
+                expires_at, emb, _ = self._items[(chunk_key, query_key)]
+                if expires_at < now:
+                    continue
+                sim = float(np.dot(unit, emb))
+                if sim >= best_sim:
+                    best_key, best_sim = (chunk_key, query_key), sim
+            if best_key is None:
+                self.counters.misses += 1
+                return None
+            self._items.move_to_end(best_key)
+            self.counters.hits += 1
+            return self._items[best_key][2]
+
+    def put(self, query: str, query_emb: np.ndarray, chunk_ids: Iterable[str], version, answer: str):
+        if self.max_size <= 0:
+            return
+        key = (frozenset(chunk_ids), normalize_query(query))
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._items[key] = (time.monotonic() + self.ttl, _unit(query_emb), answer)
+            self._items.move_to_end(key)
+            self._by_chunks.setdefault(key[0], set()).add(key[1])
+            while len(self._items) > self.max_size:
+                (chunk_key, query_key), _ = self._items.popitem(last=False)
+                bucket = self._by_chunks[chunk_key]
+                bucket.discard(query_key)
+                if not bucket:
+                    del self._by_chunks[chunk_key]
+                self.counters.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._by_chunks.clear()
+
+    def stats(self) -> Dict:
+        stats = self.counters.stats(len(self._items))
+        stats["invalidations"] = self.invalidations
+        stats["index_version"] = self.version
+        return stats
+
+
+class PairScoreCache:
+    """
+    LRU + TTL cache of reranker scores keyed by (query hash, chunk id). The
+    key also carries a checksum of the chunk text, so a re-ingested chunk
+    (same id, new text) or another tenant's chunk of the same id is rescored.
+    """
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE, ttl: float = RERANK_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()  # (query hash, chunk_id, text crc) -> (expires_at, score)
+        self._lock = threading.Lock()
+        self.counters = _Counters()
+
+    @staticmethod
+    def query_key(query: str) -> str:
+        return hashlib.blake2b(normalize_query(query).encode("utf-8"), digest_size=8).hexdigest()
+
+    @staticmethod
+    def _key(query_key: str, row: Dict):
+        return query_key, row.get("chunk_id"), zlib.crc32((row.get("text") or "").encode("utf-8"))
+
+    def get_many(self, query_key: str, rows: Iterable[Dict]) -> list:
+        """Cached score per row, None where there is none."""
+        keys = [self._key(query_key, row) for row in rows]
+        now = time.monotonic()
+        scores = []
+        with self._lock:
+            for key in keys:
+                item = self._items.get(key)
+                if item is None or item[0] < now:
+                    scores.append(None)
+                    self.counters.misses += 1
+                    continue
+                self._items.move_to_end(key)
+                scores.append(item[1])
+                self.counters.hits += 1
+        return scores
+
+    def put_many(self, query_key: str, rows: Iterable[Dict], scores: Iterable[float]):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        items = [(self._key(query_key, row), float(score)) for row, score in zip(rows, scores)]
+        with self._lock:
+            for key, score in items:
+                self._items[key] = (expires_at, score)
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.counters.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict:
+        return self.counters.stats(len(self._items))
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    v = np.asarray(v, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
@@ -0,0 +1,145 @@
+# app/reranker.py
+
+from typing import Dict, List, Optional
+from query_cache import PairScoreCache
+import threading
+import metrics
+import time
+import os
+
+# ---------- Configuration ----------
+# Rerank retrieved chunks with a cross-encoder (per request: QueryInput.rerank)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# First-stage hits scored per query; the best top_k of them are returned
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+# Tokens of query + chunk the cross-encoder reads; longer pairs are truncated
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+# Milliseconds one rerank call may spend scoring; queries it could not finish keep their first-stage order. 0 = no cap
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+
+# rough characters per token, to bucket pairs by length without tokenizing them
+_CHARS_PER_TOKEN = 4
+# weight of the newest call in the per-pair cost estimate
+_COST_SMOOTHING = 0.2
+
+RERANKS = metrics.counter("reranks", "Queries through the rerank stage, by outcome", ("result",))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_reranker():
+    """The shared cross-encoder, loaded on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+                print(f"🔹 Loading reranker {RERANK_MODEL}...")
+                _model = CrossEncoder(RERANK_MODEL, max_length=RERANK_MAX_LENGTH, device="cpu")
+    return _model
+
+
+class Reranker:
+    """
+    Second retrieval stage: scores (query, chunk) pairs with a cross-encoder
+    and reorders each query's first-stage hits by that score.
+
+    Every pair of a call (all queries of a micro-batch) is scored in one pass:
+    pairs are sorted by length and cut into batches of similar length, so
+    little of each batch is padding. Scores are cached per (query, chunk).
+    Scoring stops once it has used the budget (or is estimated to exceed it);
+    queries left with unscored hits keep their first-stage order.
+    """
+
+    def __init__(self, budget_ms: float = RERANK_BUDGET_MS, batch_size: int = RERANK_BATCH_SIZE,
+                 cache: Optional[PairScoreCache] = None):
+        self.budget = budget_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self.cache = cache if cache is not None else PairScoreCache()
+        self.pair_seconds = None  # smoothed scoring cost per pair
+        self.queries = 0
+        self.fallbacks = 0
+        self.pairs_scored = 0
+        self._lock = threading.Lock()
+
+    def rerank(self, queries: List[str], candidates: List[List[Dict]], top_k: int) -> List[List[Dict]]:
+        """
+        Best top_k of each query's candidates (first-stage rows, best first) by cross-encoder
+        score, which is added to the rows as "rerank_score".
+        """
+        with metrics.stage("rerank", queries=len(queries)):
+            return self._rerank(queries, candidates, top_k)
+
+    def _rerank(self, queries: List[str], candidates: List[List[Dict]], top_k: int) -> List[List[Dict]]:
+        query_keys = [self.cache.query_key(q) for q in queries]
+        scores = [self.cache.get_many(key, rows) for key, rows in zip(query_keys, candidates)]
+        missing = [(i, j) for i, row_scores in enumerate(scores) for j, s in enumerate(row_scores) if s is None]
+        n_pairs = sum(len(rows) for rows in candidates)
+        metrics.CACHE_LOOKUPS.inc(n_pairs - len(missing), cache="rerank", result="hit")
+        metrics.CACHE_LOOKUPS.inc(len(missing), cache="rerank", result="miss")
+        if missing:
+            self._score(queries, candidates, scores, missing)
+            fresh: Dict[int, List[int]] = {}
+            for i, j in missing:
+                if scores[i][j] is not None:
+                    fresh.setdefault(i, []).append(j)
+            for i, js in fresh.items():
+                self.cache.put_many(query_keys[i], [candidates[i][j] for j in js], [scores[i][j] for j in js])
+
+        out = []
+        fallbacks = 0
+        for rows, row_scores in zip(candidates, scores):
+            if any(s is None for s in row_scores):
+                fallbacks += 1
+                out.append(rows[:top_k])
+                continue
+            for row, s in zip(rows, row_scores):
+                row["rerank_score"] = s
+            order = sorted(range(len(rows)), key=lambda j: -row_scores[j])
+            out.append([rows[j] for j in order[:top_k]])
+        with self._lock:
+            self.queries += len(queries)
+            self.fallbacks += fallbacks
+        RERANKS.inc(len(queries) - fallbacks, result="reranked")
+        RERANKS.inc(fallbacks, result="fallback")
+        return out
+
+    def _score(self, queries: List[str], candidates: List[List[Dict]], scores: List[list], missing: List[tuple]):
+        """Fill scores[i][j] for the missing pairs, shortest first, while the budget lasts."""
+        max_chars = RERANK_MAX_LENGTH * _CHARS_PER_TOKEN
+        missing = sorted(missing, key=lambda p: min(len(queries[p[0]]) + len(candidates[p[0]][p[1]].get("text") or ""),
+                                                    max_chars))
+        model = get_reranker()
+        started = time.perf_counter()
+        scored = 0
+        for b in range(0, len(missing), self.batch_size):
+            batch = missing[b:b + self.batch_size]
+            if self.budget > 0 and b:
+                # stop before a batch that would end past the budget (the first one always runs)
+                elapsed = time.perf_counter() - started
+                if elapsed + len(batch) * (self.pair_seconds or elapsed / b) > self.budget:
+                    break
+            # the tokenizer truncates to max_length; cutting the text first saves tokenizing all of it
+            pairs = [(queries[i], (candidates[i][j].get("text") or "")[:max_chars]) for i, j in batch]
+            for (i, j), s in zip(batch, model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)):
+                scores[i][j] = float(s)
+            scored += len(batch)
+        if scored:
+            cost = (time.perf_counter() - started) / scored
+            with self._lock:
+                self.pair_seconds = cost if self.pair_seconds is None else \
+                    (1 - _COST_SMOOTHING) * self.pair_seconds + _COST_SMOOTHING * cost
+                self.pairs_scored += scored
+
+    def stats(self) -> Dict:
+        return {"queries": self.queries, "fallbacks": self.fallbacks, "pairs_scored": self.pairs_scored,
+                "pair_ms": round(1000 * self.pair_seconds, 3) if self.pair_seconds is not None else None,
+                "budget_ms": round(1000 * self.budget, 1), "candidates": RERANK_CANDIDATES,
+                "cache": self.cache.stats()}
+
+
+# shared by every router (and tenant: cached scores are keyed by chunk text too)
+reranker = Reranker()
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+from jobs import ingest_jobs
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/")
+async def list_jobs(limit: int = 50):
+    """Most recent ingest jobs first, plus queue counters."""
+    return {"jobs": [job.as_dict() for job in ingest_jobs.list(limit)], **ingest_jobs.stats()}
+
+
+@router.get("/{job_id}")
+async def job_status(job_id: str):
+    """Status, progress (documents / chunks so far) and result of one ingest job."""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"unknown job {job_id}")
+    return job.as_dict()
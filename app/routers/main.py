@@ -1,72 +1,275 @@
-import faiss
-import pandas as pd
 import numpy as np
 import os
 from dotenv import load_dotenv
-from fastapi import APIRouter
-from agno.agent import Agent
-from agno.models.google import Gemini
-from global_resources import model, faiss_index, metadata_df  # ✅ Global imports
-from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException
+from ann_index import MAX_EF_SEARCH, MAX_NPROBE
+from global_resources import get_model, get_tenant, tenant_manager  # ✅ Global imports (loaded once per process)
+from index_store import filter_key
+from tenant_manager import request_tenant
+from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Literal, Optional, Tuple
+from query_cache import EmbeddingCache
+from batcher import MicroBatcher
+from workers import run_cpu
+from reranker import reranker, RERANK_CANDIDATES, RERANK_ENABLED
+from concurrent.futures import ThreadPoolExecutor
+import context_builder
+import lexical_index
+import metrics
+import llm
+import contextvars
+import asyncio
+import json
+import time
 
 load_dotenv()
 
 router = APIRouter(prefix="/queries", tags=["main"])
 
-gemini_model = Gemini()
-assistant = Agent(model=gemini_model)
+# Hits retrieved for /queries/ and /queries/stream; the context builder merges them into the prompt
+QUERY_TOP_K = int(os.getenv("QUERY_TOP_K", "2"))
+# Questions accepted by one /queries/batch call
+QUERY_BATCH_MAX_QUERIES = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "1000"))
+# LLM calls one /queries/batch call may have in flight when it asks for answers
+QUERY_BATCH_LLM_CONCURRENCY = int(os.getenv("QUERY_BATCH_LLM_CONCURRENCY", "4"))
+# /queries/batch retrieves in slices of this many questions, in parallel on the CPU pool
+_BATCH_SLICE = 256
 
-# Constants
-INDEX_PATH = "../database/faiss_index.bin"
-META_PATH = "../database/metadata.parquet"
+assistant = llm.create_assistant()
+
+# query text -> embedding is the same for every tenant; answer caches live in each tenant's shard
+embedding_cache = EmbeddingCache()
+
+# BM25 lookups run here, concurrently with the batched encode + FAISS search of the same queries
+lexical_pool = ThreadPoolExecutor(max_workers=lexical_index.LEXICAL_SEARCH_WORKERS, thread_name_prefix="lexical")
+
+class QueryFilters(BaseModel):
+    # each field matches any of its values; fields are combined with AND
+    source_name: Optional[List[str]] = None
+    mimeType: Optional[List[str]] = None
+    doc_id: Optional[List[str]] = None
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {col: values for col, values in
+                (("source_name", self.source_name), ("mimeType", self.mimeType), ("doc_id", self.doc_id)) if values}
 
 class QueryInput(BaseModel):
     q: str
+    # ANN recall/latency knobs; ignored by backends they don't apply to
+    nprobe: Optional[int] = Field(None, ge=1, le=MAX_NPROBE)
+    ef_search: Optional[int] = Field(None, ge=1, le=MAX_EF_SEARCH)
+    # hybrid = BM25 + vectors fused by reciprocal rank; defaults to RETRIEVAL_MODE
+    mode: Optional[Literal["hybrid", "vector", "lexical"]] = None
+    # restrict retrieval to matching chunks, e.g. {"mimeType": ["application/pdf"]}
+    filters: Optional[QueryFilters] = None
+    # rerank the top RERANK_CANDIDATES hits with the cross-encoder; defaults to RERANK_ENABLED
+    rerank: Optional[bool] = None
+
+class BatchQueryInput(BaseModel):
+    queries: List[QueryInput]
+    top_k: int = 2
+    # False = retrieval only (chunks + scores), e.g. for evaluation runs
+    generate: bool = False
+    # LLM calls in flight for this request; capped by QUERY_BATCH_LLM_CONCURRENCY
+    concurrency: Optional[int] = None
+    include_text: bool = True
 
-def load_faiss_index():
-    """Return the global FAISS index (no local load)."""
-    return faiss_index  # ✅ Use shared FAISS index
+def embed_queries(queries: List[str]) -> np.ndarray:
+    """Query embeddings (n, dim): cache hits are reused, misses go through one batched encode."""
+    embs = [embedding_cache.get(q) for q in queries]
+    missing = [i for i, e in enumerate(embs) if e is None]
+    metrics.CACHE_LOOKUPS.inc(len(queries) - len(missing), cache="embedding", result="hit")
+    metrics.CACHE_LOOKUPS.inc(len(missing), cache="embedding", result="miss")
+    if missing:
+        with metrics.stage("query_encode", queries=len(missing)):
+            encoded = get_model().encode([queries[i] for i in missing], convert_to_numpy=True).astype("float32")
+        for i, emb in zip(missing, encoded):
+            embs[i] = emb[None, :]
+            embedding_cache.put(queries[i], embs[i])
+    return np.vstack(embs)
 
-def load_metadata():
-    """Return the global metadata dataframe."""
-    return metadata_df  # ✅ Use shared metadata
+def embed_query(query: str) -> np.ndarray:
+    """Query embedding (1, dim), served from the embedding cache when possible."""
+    return embed_queries([query])
 
-def search_query(query: str, top_k: int = 2):
+def hits_to_rows(snapshot, indices, distances) -> List[dict]:
+    """Metadata rows (with score) for one query's FAISS hits."""
+    df_meta = snapshot.metadata
+    results = []
+    for idx, dist in zip(indices, distances):
+        if 0 <= idx < len(df_meta):  # ✅ safe index check
+            row = df_meta.row(int(idx))
+            row["score"] = float(dist)
+            results.append(row)
+    return results
+
+def fuse_hits(snapshot, mode: str, vector_hits, lexical_hits, top_k: int) -> List[dict]:
     """
-    Search the FAISS index using a natural language query.
-    Returns top_k relevant chunks with metadata.
+    Rows for one query from its FAISS hits (distances, ids) and/or BM25 hits (rows, scores).
+    "score" is the L2 distance, the BM25 score, or the fused RRF score depending on mode.
     """
-    # Use global resources
-    index = load_faiss_index()
-    df_meta = load_metadata()
+    with metrics.stage("metadata_lookup"):
+        return _fuse_hits(snapshot, mode, vector_hits, lexical_hits, top_k)
 
-    # Encode query using global model
-    query_emb = model.encode([query], convert_to_numpy=True).astype("float32")
+def _fuse_hits(snapshot, mode: str, vector_hits, lexical_hits, top_k: int) -> List[dict]:
+    if mode == "vector":
+        distances, indices = vector_hits
+        return hits_to_rows(snapshot, indices[:top_k], distances[:top_k])
+    if mode == "lexical":
+        rows, scores = lexical_hits
+        return hits_to_rows(snapshot, rows[:top_k], scores[:top_k])
+    fused = lexical_index.rrf_fuse([vector_hits[1], lexical_hits[0]], top_k)
+    return hits_to_rows(snapshot, [row for row, _ in fused], [score for _, score in fused])
 
-    # Search in FAISS
-    distances, indices = index.search(query_emb, top_k)
+def lexical_search(snapshot, query: str, depth: int, row_filter):
+    with metrics.stage("lexical_search"):
+        return snapshot.lexical_search(query, depth, row_filter)
 
-    # Get top results
-    results = []
-    if len(df_meta) == 0:
-        return results
+def submit_lexical(snapshot, query: str, depth: int, row_filter):
+    """BM25 lookup on lexical_pool, in the caller's context (and trace)."""
+    return lexical_pool.submit(contextvars.copy_context().run, lexical_search, snapshot, query, depth, row_filter)
 
-    for idx, dist in zip(indices[0], distances[0]):
-        if 0 <= idx < len(df_meta):  # ✅ safe index check
-            row = df_meta.iloc[idx].to_dict()
-            row["score"] = float(dist)
-            results.append(f"{row}")
+def candidate_depth(mode: str, top_k: int) -> int:
+    """Hits taken from each retriever: fusion needs a deeper list than it returns."""
+    return max(top_k, lexical_index.HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+
+def first_stage_k(top_k: int, rerank: bool) -> int:
+    """Hits taken from the indexes: the reranker scores RERANK_CANDIDATES of them and keeps top_k."""
+    return max(top_k, RERANK_CANDIDATES) if rerank else top_k
 
-    return results 
+def search_query(query: str, top_k: int = QUERY_TOP_K, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                 snapshot=None, query_emb: np.ndarray = None, mode: Optional[str] = None,
+                 filters: Optional[Dict[str, List[str]]] = None, tenant: Optional[str] = None,
+                 rerank: Optional[bool] = None):
+    """
+    Search the FAISS index and/or the BM25 index using a natural language query.
+    Returns top_k relevant chunks with metadata; with rerank, the cross-encoder picks them from RERANK_CANDIDATES hits.
+    """
+    # Pin one consistent version of the tenant's index + metadata for this query
+    snapshot = snapshot or get_tenant(tenant).store.snapshot()
+    if len(snapshot.metadata) == 0:
+        return []
+    mode = mode or lexical_index.RETRIEVAL_MODE
+    rerank = RERANK_ENABLED if rerank is None else rerank
+    first_k = first_stage_k(top_k, rerank)
+    depth = candidate_depth(mode, first_k)
+    row_filter = snapshot.filter(filters)
+    lexical = submit_lexical(snapshot, query, depth, row_filter) if mode != "vector" else None
+    metrics.QUERIES.inc(mode=mode)
+
+    vector_hits = None
+    if mode != "lexical":
+        # Encode query using global model
+        if query_emb is None:
+            query_emb = embed_query(query)
+        with metrics.stage("vector_search"):
+            distances, indices = snapshot.search(query_emb, depth, nprobe=nprobe, ef_search=ef_search,
+                                                 row_filter=row_filter)
+        vector_hits = (distances[0], indices[0])
+    rows = fuse_hits(snapshot, mode, vector_hits, lexical.result() if lexical else None, first_k)
+    return reranker.rerank([query], [rows], top_k)[0] if rerank else rows
+
+def retrieve_batch(items: List[Tuple[str, QueryInput]], top_k: int = QUERY_TOP_K):
+    """
+    CPU half of many (tenant, query) pairs at once: each tenant's queries are
+    pinned to one snapshot of its shard, BM25 lookups start on lexical_pool,
+    then one batched encode for all queries and one batched FAISS search per
+    distinct (tenant, nprobe, ef_search, depth, filter), and one cross-encoder
+    pass over the candidates of every query that reranks.
+    Returns (shard, snapshot, query_emb, rows) per query, or the exception
+    that failed its tenant, its search group, its BM25 lookup or the rerank
+    pass, so one bad query does not fail the others. Only a failed encode
+    raises for the whole batch.
+    """
+    started = time.perf_counter()
+    out = [None] * len(items)
+    shards, snapshots = {}, {}
+    for tenant in dict.fromkeys(tenant for tenant, _ in items):
+        try:
+            shards[tenant] = get_tenant(tenant)
+            snapshots[tenant] = shards[tenant].store.snapshot()
+        except Exception as e:
+            for i, (t, _) in enumerate(items):
+                if t == tenant:
+                    out[i] = e
+    datas = [d for _, d in items]
+    snaps = [snapshots.get(tenant) for tenant, _ in items]
+    modes = [d.mode or lexical_index.RETRIEVAL_MODE for d in datas]
+    reranks = [RERANK_ENABLED if d.rerank is None else d.rerank for d in datas]
+    first_ks = [first_stage_k(top_k, r) for r in reranks]
+    filters = [d.filters.as_dict() if d.filters else None for d in datas]
+    row_filters = [None] * len(items)
+    lexical = [None] * len(items)
+    for i in range(len(items)):
+        if out[i] is not None:
+            continue
+        try:
+            row_filters[i] = snaps[i].filter(filters[i])
+            if modes[i] != "vector":
+                lexical[i] = submit_lexical(snaps[i], datas[i].q, candidate_depth(modes[i], first_ks[i]),
+                                            row_filters[i])
+        except Exception as e:
+            out[i] = e
+    for m in modes:
+        metrics.QUERIES.inc(mode=m)
+    # the embedding is also the answer cache key, so lexical-only queries are encoded too
+    embs = embed_queries([d.q for d in datas])
+    vector_hits = [None] * len(datas)
+    groups = {}
+    for i, ((tenant, d), m) in enumerate(zip(items, modes)):
+        if m != "lexical" and out[i] is None:
+            key = (tenant, d.nprobe, d.ef_search, candidate_depth(m, first_ks[i]), filter_key(filters[i]))
+            groups.setdefault(key, []).append(i)
+    for (tenant, nprobe, ef_search, depth, _), members in groups.items():
+        try:
+            with metrics.stage("vector_search", queries=len(members)):
+                distances, indices = snapshots[tenant].search(embs[members], depth, nprobe=nprobe,
+                                                              ef_search=ef_search, row_filter=row_filters[members[0]])
+        except Exception as e:
+            for i in members:
+                out[i] = e
+            continue
+        for j, i in enumerate(members):
+            vector_hits[i] = (distances[j], indices[j])
+    rows = [None] * len(items)
+    for i in range(len(items)):
+        if out[i] is not None:
+            continue
+        try:
+            rows[i] = fuse_hits(snaps[i], modes[i], vector_hits[i], lexical[i].result() if lexical[i] else None,
+                                first_ks[i])
+        except Exception as e:
+            out[i] = e
+    reranked = [i for i, r in enumerate(reranks) if r and out[i] is None]
+    if reranked:
+        try:
+            best = reranker.rerank([datas[i].q for i in reranked], [rows[i] for i in reranked], top_k)
+        except Exception as e:
+            for i in reranked:
+                out[i] = e
+        else:
+            for i, r in zip(reranked, best):
+                rows[i] = r
+    for i, (tenant, _) in enumerate(items):
+        if out[i] is None:
+            out[i] = (shards[tenant], snaps[i], embs[i:i + 1], rows[i])
+    elapsed = time.perf_counter() - started
+    for tenant, shard in shards.items():
+        shard.record_search(elapsed, sum(1 for t, _ in items if t == tenant))
+    return out
 
-def compose_prompt(query: str, retrieved_chunks: list) -> str:
-    context_text = "\n\n".join(retrieved_chunks)
+# Coalesces concurrent /queries calls into batched encode + search
+query_batcher = MicroBatcher(retrieve_batch, name="query")
+
+def compose_prompt(query: str, context_text: str) -> str:
+    """The LLM prompt for a question and its context (see context_builder.build_context)."""
     prompt = f"""You are an advanced AI assistant developed by Tanish Raghav. 
 This system is part of a project built by Tanish to demonstrate his expertise in AI and LLM-based application development. 
 The goal of this application is to provide companies with a personalized AI system that can understand and respond using their own internal data and documents — securely connected through sources like Google Drive, Notion, or uploaded PDFs.
 
 Your role is to analyze the provided context and answer the user's query accurately. 
+Each context passage starts with a [n] citation of the document it comes from; cite it when you use the passage.
 All data used here is securely handled and remains private.
 
 Context:
@@ -79,10 +282,121 @@ Provide a complete, clear, easy-to-understand and CONCISE response
 """
     return prompt
 
+def prompt_for(snapshot, q: str, search: list) -> str:
+    """Prompt from the hits, merged and expanded to the context token budget within the snapshot they came from."""
+    return compose_prompt(q, context_builder.build_context(search, snapshot).text())
+
+async def answer_for(shard, snapshot, query_emb, q: str, search: list) -> Tuple[str, bool]:
+    """(answer, cached): the tenant's cached answer for these chunks at this index version, else a new one."""
+    answer_cache = shard.answer_cache
+    chunk_ids = [row["chunk_id"] for row in search]
+    cached = answer_cache.get(query_emb, chunk_ids, snapshot.version)
+    metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return cached, True
+    with metrics.stage("llm_generate"):
+        answer = await llm.agenerate(assistant, prompt_for(snapshot, q, search))
+    answer_cache.put(q, query_emb, chunk_ids, snapshot.version, answer)
+    return answer, False
+
+def query_tenant(tenant: str = Depends(request_tenant)) -> str:
+    """request_tenant for queries: a tenant nothing was ingested into is a 404, not a new shard."""
+    if not tenant_manager.exists(tenant):
+        raise HTTPException(status_code=404, detail=f"unknown tenant {tenant}")
+    return tenant
+
 @router.post("/")
-def answer_query(data: QueryInput) -> str:
+async def answer_query(data: QueryInput, tenant: str = Depends(query_tenant)) -> str:
+    shard, snapshot, query_emb, search = await query_batcher.submit((tenant, data))
+    answer, cached = await answer_for(shard, snapshot, query_emb, data.q, search)
+    return JSONResponse(content={"answer": answer, "cached": cached})
+
+@router.post("/batch")
+async def answer_batch(data: BatchQueryInput, tenant: str = Depends(query_tenant)):
+    """
+    Many questions in one call: one batched encode and grouped FAISS / BM25 searches
+    (in parallel slices), then optionally answers with at most `concurrency` LLM calls at once.
+    """
+    if len(data.queries) > QUERY_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"at most {QUERY_BATCH_MAX_QUERIES} queries per batch")
+    if not 1 <= data.top_k <= lexical_index.HYBRID_CANDIDATES:
+        raise HTTPException(status_code=422, detail=f"top_k must be between 1 and {lexical_index.HYBRID_CANDIDATES}")
+    started = time.perf_counter()
+    items = [(tenant, q) for q in data.queries]
+    slices = await asyncio.gather(*(run_cpu(retrieve_batch, items[i:i + _BATCH_SLICE], data.top_k)
+                                    for i in range(0, len(items), _BATCH_SLICE)))
+    retrieved = [r for part in slices for r in part]
+    results = []
+    for q, r in zip(data.queries, retrieved):
+        if isinstance(r, Exception):
+            results.append({"q": q.q, "chunks": [], "error": str(r)})
+            continue
+        search = r[3]
+        results.append({"q": q.q, "chunks": [row if data.include_text else {k: v for k, v in row.items() if k != "text"}
+                                             for row in search]})
+
+    if data.generate:
+        limit = asyncio.Semaphore(max(1, min(data.concurrency or QUERY_BATCH_LLM_CONCURRENCY,
+                                             QUERY_BATCH_LLM_CONCURRENCY)))
+
+        async def generate(result, shard, snapshot, query_emb, search):
+            async with limit:
+                try:
+                    result["answer"], result["cached"] = await answer_for(shard, snapshot, query_emb, result["q"], search)
+                except Exception as e:
+                    result["error"] = str(e)
+
+        await asyncio.gather(*(generate(result, *r) for result, r in zip(results, retrieved)
+                               if not isinstance(r, Exception)))
+    return JSONResponse(content={"count": len(results), "seconds": round(time.perf_counter() - started, 3),
+                                 "results": results})
+
+def _sse(payload: dict, event: str = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
+
+@router.post("/stream")
+async def stream_query(data: QueryInput, tenant: str = Depends(query_tenant)):
+    """Same as POST /queries/ but streams the answer as server-sent events while Gemini generates it."""
     q = data.q
-    search = search_query(q)
-    prompt = compose_prompt(q, search)
-    answer = assistant.run(prompt)
-    return JSONResponse(content={"answer": answer.content})
+    shard, snapshot, query_emb, search = await query_batcher.submit((tenant, data))
+    answer_cache = shard.answer_cache
+    chunk_ids = [row["chunk_id"] for row in search]
+    cached = answer_cache.get(query_emb, chunk_ids, snapshot.version)
+    metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss" if cached is None else "hit")
+
+    async def events():
+        if cached is not None:
+            yield _sse({"token": cached})
+            yield _sse({"cached": True}, event="done")
+            return
+        parts = []
+        started = time.perf_counter()
+        try:
+            async for token in llm.astream(assistant, prompt_for(snapshot, q, search)):
+                if not parts:
+                    metrics.record_stage("llm_first_token", time.perf_counter() - started, started)
+                parts.append(token)
+                yield _sse({"token": token})
+        except Exception as e:
+            yield _sse({"message": str(e)}, event="error")
+            return
+        metrics.record_stage("llm_stream", time.perf_counter() - started, started)
+        answer_cache.put(q, query_emb, chunk_ids, snapshot.version, "".join(parts))
+        yield _sse({"cached": False}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.get("/cache/stats")
+def cache_stats():
+    return {"embedding_cache": embedding_cache.stats(),
+            "answer_cache": {tenant: shard.answer_cache.stats() for tenant, shard in tenant_manager.loaded().items()},
+            "rerank_cache": reranker.cache.stats()}
+
+@router.get("/rerank/stats")
+def rerank_stats():
+    return reranker.stats()
+
+@router.get("/batcher/stats")
+def batcher_stats():
+    return query_batcher.stats()
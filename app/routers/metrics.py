@@ -0,0 +1,61 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from global_resources import startup_timings, tenant_manager
+from http_pool import all_connector_stats
+from jobs import ingest_jobs
+from routers.main import query_batcher
+import metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---------- Scrape-time metrics ----------
+def _tenant_values(field):
+    return [({"tenant": tenant}, field(shard)) for tenant, shard in tenant_manager.loaded().items()]
+
+
+def _connector_values(field):
+    return [({"connector": name}, stats[field]) for name, stats in all_connector_stats().items()]
+
+
+metrics.collected("index_chunks", "Live chunks in each loaded tenant's index", "gauge",
+                  lambda: _tenant_values(lambda shard: shard.store.snapshot().total_chunks))
+metrics.collected("index_version", "Published index version of each loaded tenant", "gauge",
+                  lambda: _tenant_values(lambda shard: shard.store.version))
+metrics.collected("index_duplicate_chunks", "Chunks of each loaded tenant stored as a duplicate, without an index entry",
+                  "gauge", lambda: _tenant_values(lambda shard: shard.store.metadata_store.n_duplicates))
+metrics.collected("index_memory_bytes", "Estimated resident size of each loaded tenant's index", "gauge",
+                  lambda: _tenant_values(lambda shard: shard.store.memory_bytes()))
+metrics.collected("tenants_loaded", "Tenant shards in memory", "gauge",
+                  lambda: [({}, len(tenant_manager.loaded()))])
+metrics.collected("ingest_jobs", "Ingest jobs kept by the job queue, by status", "gauge",
+                  lambda: [({"status": status}, n) for status, n in ingest_jobs.stats()["counts"].items()])
+metrics.collected("query_batches", "Batches run by the query micro-batcher", "counter",
+                  lambda: [({}, query_batcher.batches)])
+metrics.collected("query_batched_items", "Queries run by the query micro-batcher", "counter",
+                  lambda: [({}, query_batcher.items)])
+metrics.collected("connector_requests", "HTTP requests made by each connector", "counter",
+                  lambda: _connector_values("requests"))
+metrics.collected("connector_retries", "Retried connector requests", "counter",
+                  lambda: _connector_values("retries"))
+metrics.collected("connector_throttled", "Connector requests answered 429", "counter",
+                  lambda: _connector_values("throttled"))
+metrics.collected("connector_bytes", "Document bytes downloaded by each connector", "counter",
+                  lambda: _connector_values("bytes"))
+metrics.collected("startup_seconds", "Seconds spent in each startup step", "gauge",
+                  lambda: [({"step": step}, seconds) for step, seconds in startup_timings.items()])
+
+
+# ---------- Endpoints ----------
+@router.get("")
+def prometheus_metrics():
+    """Stage latency histograms, counters and index / job / connector gauges in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/traces")
+def recent_traces(limit: int = 50):
+    """Most recent sampled request traces (TRACE_SAMPLE_RATE, or the X-Trace: 1 header), newest first."""
+    return {"sample_rate": metrics.TRACE_SAMPLE_RATE, "traces": metrics.recent_traces(limit)}
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException
+from global_resources import tenant_manager
+from tenant_manager import validate_tenant, DEFAULT_TENANT
+
+router = APIRouter(prefix="/tenants", tags=["tenants"])
+
+
+@router.get("/")
+async def list_tenants():
+    """Loaded shards (size, memory, search latency) and tenants only on disk, plus the memory budget."""
+    return tenant_manager.stats()
+
+
+@router.get("/{tenant}")
+async def tenant_stats(tenant: str):
+    """One tenant's stats; does not load an unloaded shard."""
+    try:
+        tenant = validate_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    shard = tenant_manager.loaded().get(tenant)
+    if shard is not None:
+        return shard.stats()
+    if tenant != DEFAULT_TENANT and tenant not in tenant_manager.on_disk():
+        raise HTTPException(status_code=404, detail=f"unknown tenant {tenant}")
+    return {"tenant": tenant, "loaded": False}
@@ -1,167 +1,83 @@
-from supabase import create_client, Client
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer
-from typing import List, Dict, Tuple
-from fastapi import APIRouter
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
-import faiss
+from pydantic import BaseModel
+from global_resources import tenant_manager
+from tenant_manager import request_tenant
+from connectors import SupabaseStorageConnector
+from ingest_pipeline import INGEST_FLUSH_CHUNKS, IngestPipeline
+from jobs import ingest_jobs, JobFailed
+import sys
 import os
-import pandas as pd
-import numpy as np
-import io
-import pdfplumber
 
 load_dotenv()
 
 router = APIRouter(prefix="/pdfData", tags=["pdfData"])
 
-# ---------- CONFIG ----------
-modelName = "sentence-transformers/all-MiniLM-L6-v2"
-model = SentenceTransformer(modelName)
-CHUNK_SIZE_TOKENS = 400
-CHUNK_OVERLAP_TOKENS = 64
-EMBED_DIM = 384
+# PDFs accepted by one /pdfData call; a multi-file ingest holds all their embeddings until its single publish
+PDF_BATCH_MAX_FILES = int(os.getenv("PDF_BATCH_MAX_FILES", "100"))
 
-# ---------- Utilities ----------
-tokenizer = AutoTokenizer.from_pretrained(modelName)
 
-# ========= Your existing function =========
-def extract_text_from_pdf_bytes(file_bytes: bytes) -> str:
-    """Extract text from PDF bytes using pdfplumber."""
-    text_chunks = []
-    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-        for page in pdf.pages:
-            txt = page.extract_text()
-            if txt:
-                text_chunks.append(txt)
-    return "\n".join(text_chunks)
+class PdfInput(BaseModel):
+    # either one name (what the frontend sends) or a list of them
+    pdf_file: Optional[str] = None
+    pdf_files: Optional[List[str]] = None
 
 # ========= Supabase Setup =========
-def initialize_supabase():
-    """Initialize Supabase client using environment variables or constants."""
-    SUPABASE_URL = os.getenv(SUPABASE_URL)
-    SUPABASE_KEY = os.getenv(SUPABASE_KEY)
-
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    return supabase
-
-
-# ========= Fetch and Extract Function =========
-def fetch_pdf_and_extract(pdf_name: str):
-    """
-    Fetch a PDF file from a given folder in Supabase Storage
-    and extract its text using pdfplumber.
-    """
-    supabase = initialize_supabase()
-    bucket_name = "Pdfs"  # change this to your bucket name
-
-    # Download the file
-    response = supabase.storage.from_(bucket_name).download(pdf_name)
-
-    if not response:
-        print(f"File not found: {pdf_name}")
-        return None
-
-    # Extract text from bytes
-    pdf_bytes = response
-    extracted_text = extract_text_from_pdf_bytes(pdf_bytes)
-
-    print(f"Successfully extracted text from {pdf_name}")
-    return extracted_text
-
-def chunk_text_token_level(text: str, chunk_size: int = CHUNK_SIZE_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Tuple[str,int,int]]:
+def initialize_supabase(names: List[str] = None) -> SupabaseStorageConnector:
     """
-    Returns list of tuples: (chunk_text, start_token_idx, end_token_idx)
-    Uses tokenizer.encode(add_special_tokens=False) so chunks are decoded back to text.
+    Supabase Storage connector (SUPABASE_URL / SUPABASE_KEY / SUPABASE_BUCKET).
+    Requests go through the process-wide pooled HTTP session, with retries.
     """
-    token_ids = tokenizer.encode(text, add_special_tokens=False)
-    chunks = []
-    if len(token_ids) == 0:
-        return chunks
-    step = chunk_size - overlap
-    for start in range(0, max(1, len(token_ids)), step):
-        end = start + chunk_size
-        chunk_tokens = token_ids[start:end]
-        # decode back to text; keep it safe by ignoring special tokens cleanup
-        chunk_text = tokenizer.decode(chunk_tokens, clean_up_tokenization_spaces=True)
-        chunks.append((chunk_text, start, min(end, len(token_ids))))
-        if end >= len(token_ids):
-            break
-    return chunks
+    return SupabaseStorageConnector(names=names)
 
-# ---------- Build FAISS index and metadata store ----------
-def build_or_load_faiss(index_path: str, dim: int = EMBED_DIM):
-    if index_path and os.path.exists(index_path):
-        idx = faiss.read_index(index_path)
-    else:
-        idx = faiss.IndexFlatL2(dim)  # use L2 
-    return idx
 
-def save_faiss_and_metadata(index, index_path: str, metadata: List[Dict], meta_path: str):
-    faiss.write_index(index, index_path)
-    pd.DataFrame(metadata).to_parquet(meta_path, index=False)
+def requested_pdfs(pdf_file: Optional[str], body: Optional[PdfInput]) -> List[str]:
+    """File names from the query parameter and/or JSON body, in order, without blanks or repeats."""
+    names = [pdf_file]
+    if body:
+        names += [body.pdf_file] + list(body.pdf_files or [])
+    return list(dict.fromkeys(n for n in names if n))
 
-def load_metadata(meta_path: str) -> List[Dict]:
-    if not os.path.exists(meta_path):
-        return []  # Return empty list if file does not exist
-    return pd.read_parquet(meta_path).to_dict(orient="records")
-
-# ---------- Pipeline: ingest docs to FAISS ----------
-def ingest_documents_to_faiss(docs: List[Dict], index, metadata_store: List[Dict], persist_every: int = 1000):
-    """
-    docs: list of {"id","name","mimeType","text"}
-    index: faiss index
-    metadata_store: list to append chunk metadata
-    returns index, metadata_store
-    """
-    all_chunk_texts = []
-    meta_batch = []
-    for doc in docs:
-        doc_id = doc.get("id")
-        name = doc.get("name")
-        text = doc.get("text", "")
-        if not text or len(text.strip()) == 0:
-            continue
-        chunks = chunk_text_token_level(text, chunk_size=CHUNK_SIZE_TOKENS, overlap=CHUNK_OVERLAP_TOKENS)
-        for i, (c_text, start_t, end_t) in enumerate(chunks):
-            chunk_id = f"{doc_id}__{i}"
-            meta = {
-                "doc_id": doc_id,
-                "chunk_id": chunk_id,
-                "source_name": name,
-                "mimeType": doc.get("mimeType"),
-                "start_token": int(start_t),
-                "end_token": int(end_t),
-                "text": c_text
-            }
-            meta_batch.append(meta)
-            all_chunk_texts.append(c_text)
-    if not all_chunk_texts:
-        return index, metadata_store
-    # create embeddings in batches for memory control
-    B = 64
-    embeddings_list = []
-    for i in range(0, len(all_chunk_texts), B):
-        batch_texts = all_chunk_texts[i:i+B]
-        embs = model.encode(batch_texts, convert_to_numpy=True, show_progress_bar=False)
-        embeddings_list.append(embs)
-    embeddings = np.vstack(embeddings_list)
-    embeddings = embeddings.astype("float32")
-    index.add(embeddings)
-    metadata_store.extend(meta_batch)
-    return index, metadata_store
 
 @router.post("/")
-def fetch_data(pdf_file: str):
-
-    text = fetch_pdf_and_extract(pdf_file)
-    INDEX_PATH = "../database/faiss_index.bin"
-    META_PATH = "../database/metadata.parquet"
-    index = build_or_load_faiss(INDEX_PATH, EMBED_DIM)
-    metadata_store = load_metadata(META_PATH)
-
-    index, metadata_store = ingest_documents_to_faiss(text, index, metadata_store)
-
-    # Persist
-    save_faiss_and_metadata(index, INDEX_PATH, metadata_store, META_PATH)
-    return {"message": "Ingest complete. total chunks in metadata:", "total_chunks": len(metadata_store)}
\ No newline at end of file
+async def fetch_data(pdf_file: Optional[str] = None, body: Optional[PdfInput] = None, wait: bool = False,
+                     tenant: str = Depends(request_tenant)):
+    """Ingest one PDF (?pdf_file= or {"pdf_file"}) or several ({"pdf_files": [...]}) from the bucket."""
+    names = requested_pdfs(pdf_file, body)
+    if not names:
+        raise HTTPException(status_code=422, detail="pdf_file or pdf_files is required")
+    if len(names) > PDF_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"at most {PDF_BATCH_MAX_FILES} PDFs per call")
+
+    def run(job):
+        # the pipeline downloads the PDFs concurrently, extracts them in its process pool (page ranges
+        # in parallel) and streams the pages into the chunker
+        storage = initialize_supabase(names)
+        # several files are embedded in shared batches and published (persisted) once, at the end
+        flush_chunks = sys.maxsize if len(names) > 1 else INGEST_FLUSH_CHUNKS
+        # Appends to the tenant's store, which persists and publishes the new version
+        with tenant_manager.use(tenant, create=True) as shard:
+            pipeline = IngestPipeline(store=shard.store, flush_chunks=flush_chunks,
+                                      on_progress=lambda r: job.update(r.as_dict()))
+            report = pipeline.run([storage])
+        job.update(report.as_dict())
+        result = {"tenant": tenant, "files": len(names), "total_chunks": report.total_chunks,
+                  "chunks_added": report.vectors_added, "duplicate_chunks": report.duplicate_chunks,
+                  "publishes": report.publishes,
+                  "documents_failed": report.documents_failed, "errors": report.errors}
+        # failed files make the job partial, or failed when no file got through
+        if report.status == "failed":
+            raise JobFailed(f"no file was ingested: {report.errors[0]}", result)
+        job.partial = report.status == "partial"
+        return result
+
+    job = ingest_jobs.submit("pdfData", run)
+    if not wait:
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status, "tenant": tenant,
+                                                      "files": len(names), "status_url": f"/jobs/{job.id}"})
+    await ingest_jobs.wait(job)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    return {"message": "Ingest complete. total chunks in metadata:", "job_id": job.id, "status": job.status, **job.result}
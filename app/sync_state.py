@@ -0,0 +1,161 @@
+# app/sync_state.py
+
+from typing import Dict, List, Optional, Iterable
+import threading
+import json
+import os
+
+# logged changes save() lets accumulate before rewriting the JSON (or one per doc, if more)
+COMPACT_MIN_ENTRIES = 1024
+
+
+class SyncState:
+    """
+    What the last syncs saw, persisted as JSON next to the index.
+
+    docs:    doc_id -> {"scope", "content_hash", "modified_time", "chunks"}
+    cursors: scope  -> {"cursor": <resume token or None>, "seen": [doc ids seen in the current pass]}
+
+    A scope is one listing (a Drive query for one account, one Notion
+    database). Docs of a scope that a *complete* pass did not see have been
+    deleted at the source.
+
+    save() appends the changes made since the previous save to a log beside
+    the JSON (one JSON line each), so a sync saving after every publish
+    writes what changed, not every doc. Once the log has more entries than
+    there are docs (and COMPACT_MIN_ENTRIES), save() rewrites the JSON and
+    empties the log instead.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.log_path = path + ".log"
+        self._lock = threading.Lock()
+        self.docs: Dict[str, Dict] = {}
+        self.cursors: Dict[str, Dict] = {}
+        self._pending: List[list] = []  # changes not logged yet
+        self._logged = 0  # entries in the log
+        if os.path.exists(path):
+            with open(path) as fh:
+                data = json.load(fh)
+            self.docs = data.get("docs", {})
+            self.cursors = data.get("cursors", {})
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as fh:
+            lines = fh.read().split(b"\n")
+        # the last line is empty, or a torn append from a crash
+        for line in lines[:-1]:
+            self._apply(json.loads(line))
+        self._logged = len(lines) - 1
+        if lines[-1]:
+            with open(self.log_path, "r+b") as fh:
+                fh.truncate(sum(len(line) + 1 for line in lines[:-1]))
+
+    def _apply(self, entry: list):
+        op = entry[0]
+        if op == "record":
+            self.docs[entry[1]] = entry[2]
+        elif op == "forget":
+            for doc_id in entry[1]:
+                self.docs.pop(doc_id, None)
+        elif op == "checkpoint":
+            _, scope, cursor, ids, extends = entry
+            seen = self.cursors.get(scope, {}).get("seen", []) if extends else []
+            self.cursors[scope] = {"cursor": cursor, "seen": sorted(set(seen).union(ids))}
+        elif op == "finish_pass":
+            self.cursors.pop(entry[1], None)
+
+    def _change(self, entry: list):
+        # callers hold the lock
+        self._apply(entry)
+        self._pending.append(entry)
+
+    def save(self):
+        """Make the changes so far durable: appended to the log, or compacted into the JSON."""
+        with self._lock:
+            if self._logged + len(self._pending) > max(COMPACT_MIN_ENTRIES, len(self.docs)):
+                self._compact()
+                return
+            if not self._pending:
+                return
+            data = "".join(json.dumps(entry) + "\n" for entry in self._pending)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.log_path, "a") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            self._logged += len(self._pending)
+            self._pending = []
+
+    def _compact(self):
+        """Rewrite the JSON with the whole state and empty the log."""
+        data = json.dumps({"docs": self.docs, "cursors": self.cursors})
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        # a crash before this truncate replays the log onto the JSON it is already part of: same state
+        if os.path.exists(self.log_path):
+            os.truncate(self.log_path, 0)
+        self._logged = 0
+        self._pending = []
+
+    # ---------- documents ----------
+    def get(self, doc_id: str) -> Optional[Dict]:
+        return self.docs.get(doc_id)
+
+    def is_unchanged_at_source(self, doc_id: str, modified_time: Optional[str]) -> bool:
+        """Cheap pre-download check: the source reports the same modification time as last sync."""
+        prev = self.docs.get(doc_id)
+        return bool(prev and modified_time and prev.get("modified_time") == modified_time)
+
+    def record(self, doc_id: str, scope: str, digest: str, modified_time: Optional[str], chunks: int):
+        with self._lock:
+            self._change(["record", doc_id, {"scope": scope, "content_hash": digest, "modified_time": modified_time,
+                                             "chunks": chunks}])
+
+    def touch(self, doc_id: str, modified_time: Optional[str], scope: Optional[str] = None):
+        """An unchanged doc seen again (by `scope`, if given); logged only if that changes anything."""
+        with self._lock:
+            prev = self.docs.get(doc_id)
+            if prev is None:
+                return
+            doc = {**prev, "modified_time": modified_time}
+            if scope is not None:
+                doc["scope"] = scope
+            if doc != prev:
+                self._change(["record", doc_id, doc])
+
+    def forget(self, doc_ids: Iterable[str]):
+        with self._lock:
+            self._change(["forget", [d for d in doc_ids if d in self.docs]])
+
+    def docs_in_scope(self, scope: str):
+        return [doc_id for doc_id, d in self.docs.items() if d.get("scope") == scope]
+
+    # ---------- cursors ----------
+    def cursor(self, scope: str) -> Optional[str]:
+        return self.cursors.get(scope, {}).get("cursor")
+
+    def seen(self, scope: str) -> set:
+        return set(self.cursors.get(scope, {}).get("seen", []))
+
+    def checkpoint(self, scope: str, cursor: Optional[str], seen: Iterable[str]):
+        """Every doc listed before `cursor` has been fully processed; resume from there next time."""
+        with self._lock:
+            # within a pass seen only grows: log just the ids added since the last checkpoint
+            seen, before = set(seen), set(self.cursors.get(scope, {}).get("seen", []))
+            if before <= seen:
+                self._change(["checkpoint", scope, cursor, sorted(seen - before), True])
+            else:
+                self._change(["checkpoint", scope, cursor, sorted(seen), False])
+
+    def finish_pass(self, scope: str):
+        with self._lock:
+            self._change(["finish_pass", scope])
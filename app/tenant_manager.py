@@ -0,0 +1,213 @@
+# app/tenant_manager.py
+
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from fastapi import Header, HTTPException
+from index_store import IndexStore
+from query_cache import AnswerCache
+import threading
+import time
+import re
+import os
+import numpy as np
+
+# ---------- Configuration ----------
+# Tenant used when a request names none; it is the store at DATABASE_DIR itself
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+# Estimated RAM all loaded tenant shards may use before the least recently used idle ones are unloaded
+TENANT_MEMORY_BUDGET_MB = int(os.getenv("TENANT_MEMORY_BUDGET_MB", "4096"))
+# Recent searches per tenant the latency percentiles are computed over
+TENANT_LATENCY_WINDOW = int(os.getenv("TENANT_LATENCY_WINDOW", "1000"))
+
+_TENANT_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def validate_tenant(tenant: Optional[str]) -> str:
+    """Tenant ids name directories, so only [A-Za-z0-9_.-] (starting alphanumeric, at most 64 chars)."""
+    tenant = tenant or DEFAULT_TENANT
+    if not _TENANT_RE.match(tenant):
+        raise ValueError(f"invalid tenant id {tenant!r}")
+    return tenant
+
+
+def request_tenant(x_tenant_id: Optional[str] = Header(None), tenant: Optional[str] = None) -> str:
+    """FastAPI dependency: the X-Tenant-ID header or ?tenant= parameter, else DEFAULT_TENANT."""
+    try:
+        return validate_tenant(x_tenant_id or tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+class UnknownTenant(LookupError):
+    """A tenant nothing was ingested into yet: only ingest creates a shard."""
+
+
+class TenantShard:
+    """One tenant's index store, answer cache and usage stats."""
+
+    def __init__(self, tenant: str, store: IndexStore, load_seconds: float, pinned: bool = False):
+        self.tenant = tenant
+        self.store = store
+        # answers are keyed by index version, which only means something within one tenant
+        self.answer_cache = AnswerCache()
+        self.load_seconds = round(load_seconds, 3)
+        self.pinned = pinned  # never unloaded (the default tenant)
+        self.loaded_at = time.time()
+        self.last_used = time.time()
+        self.active = 0  # requests / jobs currently using the shard
+        self.queries = 0
+        self._latencies = deque(maxlen=TENANT_LATENCY_WINDOW)
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self.store.rebuilding
+
+    def record_search(self, seconds: float, queries: int = 1):
+        self.queries += queries
+        self._latencies.extend([seconds] * queries)
+
+    def stats(self) -> Dict:
+        snapshot = self.store.snapshot()
+        lat = np.array(self._latencies) * 1000 if self._latencies else np.zeros(1)
+        return {
+            "tenant": self.tenant,
+            "loaded": True,
+            "pinned": self.pinned,
+            "chunks": snapshot.total_chunks,
+            "index_version": snapshot.version,
+            "memory_mb": round(self.store.memory_bytes() / 2 ** 20, 2),
+            "dedup": self.store.dedup_stats(),
+            "queries": self.queries,
+            "search_p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "search_p95_ms": round(float(np.percentile(lat, 95)), 3),
+            "active": self.active,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "answer_cache": self.answer_cache.stats(),
+        }
+
+
+class TenantManager:
+    """
+    One IndexStore shard per tenant under root_dir/<tenant>/, loaded on first
+    use. After each load, least recently used idle shards are unloaded until
+    the estimated memory of all loaded shards fits the budget; their data
+    stays on disk and is reloaded on the next request. In-flight queries keep
+    the snapshot they pinned, so unloading never breaks them. Shards in use
+    (see use()) or rebuilding are never unloaded.
+    """
+
+    def __init__(self, root_dir: str, dim: int, default_loader: Callable[[], IndexStore] = None,
+                 budget_mb: int = TENANT_MEMORY_BUDGET_MB):
+        self.root_dir = root_dir
+        self.dim = dim
+        self.default_loader = default_loader
+        self.budget_bytes = budget_mb * 2 ** 20
+        self._shards: "OrderedDict[str, TenantShard]" = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, tenant: Optional[str] = None, create: bool = False) -> TenantShard:
+        """
+        The tenant's shard, loading it if needed. Without create, a tenant
+        that has no shard on disk raises UnknownTenant instead of getting one.
+        """
+        return self._get(validate_tenant(tenant), acquire=False, create=create)
+
+    @contextmanager
+    def use(self, tenant: Optional[str] = None, create: bool = False):
+        """The tenant's shard, protected from unloading until the block exits."""
+        shard = self._get(validate_tenant(tenant), acquire=True, create=create)
+        try:
+            yield shard
+        finally:
+            with self._lock:
+                shard.active -= 1
+
+    def _get(self, tenant: str, acquire: bool, create: bool) -> TenantShard:
+        shard = self._touch(tenant, acquire)
+        if shard is not None:
+            return shard
+        if not create and not self.exists(tenant):
+            raise UnknownTenant(tenant)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(tenant, threading.Lock())
+        # loading one tenant never blocks requests for the others
+        with load_lock:
+            shard = self._touch(tenant, acquire)
+            if shard is None:
+                shard = self._load(tenant)
+                with self._lock:
+                    self._shards[tenant] = shard
+                    self.loads += 1
+                shard = self._touch(tenant, acquire)
+        self._evict(keep=tenant)
+        return shard
+
+    def _touch(self, tenant: str, acquire: bool) -> Optional[TenantShard]:
+        with self._lock:
+            shard = self._shards.get(tenant)
+            if shard is not None:
+                self._shards.move_to_end(tenant)
+                shard.last_used = time.time()
+                if acquire:
+                    shard.active += 1
+            return shard
+
+    def _load(self, tenant: str) -> TenantShard:
+        started = time.perf_counter()
+        if tenant == DEFAULT_TENANT and self.default_loader is not None:
+            return TenantShard(tenant, self.default_loader(), time.perf_counter() - started, pinned=True)
+        print(f"🔹 Loading tenant {tenant}...")
+        data_dir = os.path.join(self.root_dir, tenant)
+        os.makedirs(data_dir, exist_ok=True)
+        store = IndexStore(os.path.join(data_dir, "faiss_index.bin"), os.path.join(data_dir, "metadata"), self.dim)
+        store.load()
+        return TenantShard(tenant, store, time.perf_counter() - started)
+
+    def _evict(self, keep: str):
+        with self._lock:
+            sizes = {tenant: shard.store.memory_bytes() for tenant, shard in self._shards.items()}
+            total = sum(sizes.values())
+            for tenant, shard in list(self._shards.items()):
+                if total <= self.budget_bytes:
+                    break
+                if tenant == keep or shard.pinned or not shard.idle:
+                    continue
+                del self._shards[tenant]
+                total -= sizes[tenant]
+                self.evictions += 1
+                print(f"♻️ Unloaded tenant {tenant} ({sizes[tenant] / 2 ** 20:.1f} MB)")
+        if total > self.budget_bytes:
+            print(f"⚠️ Loaded tenants use {total / 2 ** 20:.1f} MB, over the {self.budget_bytes / 2 ** 20:.0f} MB budget")
+
+    def loaded(self) -> Dict[str, TenantShard]:
+        with self._lock:
+            return dict(self._shards)
+
+    def exists(self, tenant: str) -> bool:
+        """Whether the tenant has a shard (the default tenant always has one)."""
+        return tenant == DEFAULT_TENANT or tenant in self._shards or os.path.isdir(os.path.join(self.root_dir, tenant))
+
+    def on_disk(self):
+        """Tenants with a shard directory (loaded or not)."""
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(name for name in os.listdir(self.root_dir) if _TENANT_RE.match(name))
+
+    def stats(self) -> Dict:
+        shards = self.loaded()
+        tenants = [shard.stats() for shard in shards.values()]
+        tenants += [{"tenant": t, "loaded": False} for t in self.on_disk() if t not in shards]
+        return {
+            "budget_mb": round(self.budget_bytes / 2 ** 20, 2),
+            "memory_mb": round(sum(t.get("memory_mb", 0) for t in tenants), 2),
+            "loaded": len(shards),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "tenants": tenants,
+        }
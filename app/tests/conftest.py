@@ -0,0 +1,28 @@
+# app/tests/conftest.py
+
+import os
+import sys
+import numpy as np
+import pytest
+
+# the app uses flat imports from app/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_store import IndexStore  # noqa: E402
+
+DIM = 8
+
+
+def chunks(doc_id, n, version):
+    """n chunk rows of one document and random vectors for them (seeded by version)."""
+    rows = [{"doc_id": doc_id, "chunk_id": f"{doc_id}__{i}", "source_name": f"{doc_id}.pdf",
+             "mimeType": "application/pdf", "start_token": 64 * i, "end_token": 64 * i + 128,
+             "text": f"{doc_id} version {version} chunk {i}"} for i in range(n)]
+    return np.random.default_rng(version).random((n, DIM), dtype=np.float32), rows
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = IndexStore(str(tmp_path / "faiss_index.bin"), str(tmp_path / "metadata"), DIM)
+    s.load()
+    return s
@@ -0,0 +1,22 @@
+# app/tests/test_ann_index.py
+
+import faiss
+import numpy as np
+import ann_index
+from conftest import DIM
+
+
+def test_search_params_clamp_nprobe_to_nlist():
+    vectors = np.random.default_rng(0).random((400, DIM), dtype=np.float32)
+    index = faiss.IndexIVFFlat(faiss.IndexFlatL2(DIM), DIM, 4)
+    index.train(vectors)
+    index.nprobe = 2
+    assert ann_index.search_params(index).nprobe == 2
+    assert ann_index.search_params(index, nprobe=3).nprobe == 3
+    assert ann_index.search_params(index, nprobe=100).nprobe == 4
+
+
+def test_search_params_keep_explicit_ef_search():
+    index = faiss.IndexHNSWFlat(DIM, 8)
+    assert ann_index.search_params(index).efSearch == ann_index.HNSW_EF_SEARCH
+    assert ann_index.search_params(index, ef_search=1).efSearch == 1
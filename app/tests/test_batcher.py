@@ -0,0 +1,32 @@
+# app/tests/test_batcher.py
+
+import asyncio
+import pytest
+from batcher import MicroBatcher
+
+
+def process(items):
+    return [ValueError(item) if item < 0 else item * 2 for item in items]
+
+
+def test_failed_item_fails_only_its_request():
+    batcher = MicroBatcher(process, max_size=8, window_ms=50)
+
+    async def outcome(item):
+        try:
+            return await batcher.submit(item)
+        except ValueError:
+            return "failed"
+
+    async def run():
+        return await asyncio.gather(*(outcome(i) for i in (1, -1, 3)))
+
+    assert asyncio.run(run()) == [2, "failed", 6]
+    assert batcher.batches == 1
+
+
+def test_unbatched_failed_item_raises():
+    batcher = MicroBatcher(process, window_ms=0)
+    assert asyncio.run(batcher.submit(2)) == 4
+    with pytest.raises(ValueError):
+        asyncio.run(batcher.submit(-1))
@@ -0,0 +1,13 @@
+# app/tests/test_connectors.py
+
+from connectors import DriveConnector
+
+
+def test_drive_scope_is_per_account():
+    first = DriveConnector({"token": "ya29.first"})
+    second = DriveConnector({"token": "ya29.second"})
+    assert first.scope != second.scope
+    refreshable = {"client_id": "app", "client_secret": "s", "refresh_token": "1//r"}
+    # a refreshed access token is still the same account
+    assert DriveConnector({**refreshable, "token": "ya29.a"}).scope == DriveConnector({**refreshable, "token": "ya29.b"}).scope
+    assert DriveConnector(refreshable).scope != DriveConnector({**refreshable, "refresh_token": "1//other"}).scope
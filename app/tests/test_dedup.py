@@ -0,0 +1,27 @@
+# app/tests/test_dedup.py
+
+import numpy as np
+from conftest import DIM
+
+TEXT = "Reset the printer by holding the power button for ten seconds until the status light blinks twice"
+
+
+def row(doc_id, text, duplicate_of=None):
+    r = {"doc_id": doc_id, "chunk_id": f"{doc_id}__0", "source_name": f"{doc_id}.pdf", "mimeType": "application/pdf",
+         "start_token": 0, "end_token": 20, "text": text}
+    if duplicate_of is not None:
+        r["duplicate_of"] = duplicate_of
+    return r
+
+
+def test_near_duplicate_keeps_its_terms_in_bm25(store):
+    vector = np.random.default_rng(0).random((1, DIM), dtype=np.float32)
+    store.add(vector, [row("A", TEXT)])
+    # near-duplicate: shares A's vector, but names an identifier A does not
+    store.add(np.zeros((1, DIM), dtype=np.float32), [row("B", TEXT + " see INC-20431", duplicate_of=0)])
+    snapshot = store.snapshot()
+
+    _, ids = snapshot.search(vector, 2)
+    assert [i for i in ids[0].tolist() if i >= 0] == [0]  # one vector for the group
+    rows, _ = snapshot.lexical_search("INC-20431", 5)
+    assert rows.tolist() == [1]
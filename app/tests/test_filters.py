@@ -0,0 +1,43 @@
+# app/tests/test_filters.py
+
+import numpy as np
+import pytest
+import index_store
+from conftest import DIM, chunks
+
+PDF = {"mimeType": ["application/pdf"]}
+
+
+def add(store, doc_id, n, version, mime="application/pdf", replace=False):
+    vectors, rows = chunks(doc_id, n, version)
+    for r in rows:
+        r["mimeType"] = mime
+    store.add(vectors, rows, replace_doc_ids=[doc_id] if replace else ())
+    return vectors
+
+
+@pytest.mark.parametrize("exact_max_rows", [index_store.FILTER_EXACT_MAX_ROWS, 0])  # exact scan / FAISS bitmap
+def test_filter_combined_with_delete(store, monkeypatch, exact_max_rows):
+    monkeypatch.setattr(index_store, "FILTER_EXACT_MAX_ROWS", exact_max_rows)
+    old_a = add(store, "A", 3, 1)                  # rows 0-2
+    add(store, "B", 2, 2, mime="text/plain")       # rows 3-4
+    add(store, "C", 2, 3)                          # rows 5-6
+    pinned = store.snapshot()
+    add(store, "A", 2, 4, replace=True)            # rows 7-8, rows 0-2 deleted
+    store.add(np.empty((0, DIM), dtype=np.float32), [], replace_doc_ids=["C"])
+    snapshot = store.snapshot()
+
+    row_filter = snapshot.filter(PDF)
+    assert row_filter.rows.tolist() == [7, 8]
+    _, ids = snapshot.search(old_a[:1], 5, row_filter=row_filter)
+    assert sorted(i for i in ids[0].tolist() if i >= 0) == [7, 8]
+    rows, _ = snapshot.lexical_search("version chunk", 5, row_filter)
+    assert sorted(rows.tolist()) == [7, 8]
+
+    # a snapshot pinned before the deletes still filters over its own rows
+    pinned_filter = pinned.filter(PDF)
+    assert pinned_filter.rows.tolist() == [0, 1, 2, 5, 6]
+    _, ids = pinned.search(old_a[:1], 1, row_filter=pinned_filter)
+    assert ids[0].tolist() == [0]
+    rows, _ = pinned.lexical_search("version chunk", 10, pinned_filter)
+    assert sorted(rows.tolist()) == [0, 1, 2, 5, 6]
@@ -0,0 +1,48 @@
+# app/tests/test_lexical_index.py
+
+import numpy as np
+from conftest import DIM
+from lexical_index import LexicalSegment, LexicalView, rrf_fuse
+
+TEXTS = ["printer jam in tray two", "reset the printer after a jam", "error INC-20431 on the scanner",
+         "scanner calibration guide", "replace the toner cartridge"]
+
+
+def arrays(segment):
+    return [np.asarray(a) for a in (segment.doc_lens, segment.terms, segment.offsets, segment.rows, segment.tfs)]
+
+
+def test_merged_and_reloaded_segments_match_one_build(tmp_path):
+    whole = LexicalSegment.build(0, TEXTS)
+    merged = LexicalSegment.merge([LexicalSegment.build(0, TEXTS[:2]), LexicalSegment.build(2, TEXTS[2:])])
+    for a, b in zip(arrays(whole), arrays(merged)):
+        assert np.array_equal(a, b)
+    whole.save(str(tmp_path / "seg"))
+    loaded = LexicalSegment.load(str(tmp_path / "seg"))
+    for a, b in zip(arrays(whole), arrays(loaded)):
+        assert np.array_equal(a, b)
+    view, loaded_view = LexicalView([whole]), LexicalView([loaded])
+    for query in ("printer jam", "INC-20431", "scanner"):
+        rows, scores = view.search(query, 3, len(TEXTS))
+        loaded_rows, loaded_scores = loaded_view.search(query, 3, len(TEXTS))
+        assert np.array_equal(rows, loaded_rows) and np.allclose(scores, loaded_scores)
+    rows, _ = view.search("INC-20431", 3, len(TEXTS))
+    assert rows.tolist() == [2]
+
+
+def test_lexical_only_hit_survives_fusion(store):
+    rng = np.random.default_rng(0)
+    query = rng.random((1, DIM), dtype=np.float32)
+    # every row but the ticket sits right next to the query vector; the ticket is far away
+    vectors = np.vstack([query + 0.01 * rng.random((5, DIM), dtype=np.float32), query + 10])
+    texts = [f"printer manual page {i}" for i in range(5)] + ["ticket INC-20431 printer offline"]
+    store.add(vectors.astype(np.float32), [{"doc_id": f"D{i}", "chunk_id": f"D{i}__0", "source_name": f"D{i}.pdf",
+                                            "mimeType": "application/pdf", "start_token": 0, "end_token": 8,
+                                            "text": t} for i, t in enumerate(texts)])
+    snapshot = store.snapshot()
+    _, vector_rows = snapshot.search(query, 3)
+    assert 5 not in vector_rows[0].tolist()
+    lexical_rows, _ = snapshot.lexical_search("INC-20431 printer", 3)
+    assert lexical_rows[0] == 5
+    fused = [row for row, _ in rrf_fuse([vector_rows[0], lexical_rows], 3)]
+    assert 5 in fused
@@ -0,0 +1,64 @@
+# app/tests/test_metadata_store.py
+
+import numpy as np
+from conftest import DIM, chunks
+
+
+def test_row_for_chunk_after_replace(store):
+    store.add(*chunks("A", 3, 1))
+    store.add(*chunks("A", 3, 2), replace_doc_ids=["A"])
+    metadata = store.metadata_store
+    for i in range(3):
+        row = metadata.row_for_chunk(f"A__{i}")
+        assert row is not None
+        assert metadata.row(row)["text"] == f"A version 2 chunk {i}"
+    assert metadata.row_for_chunk("A__3") is None
+
+
+def test_row_for_chunk_after_replace_reload(store, tmp_path):
+    from index_store import IndexStore
+    store.add(*chunks("A", 3, 1))
+    store.add(*chunks("A", 3, 2), replace_doc_ids=["A"])
+    reloaded = IndexStore(str(tmp_path / "faiss_index.bin"), str(tmp_path / "metadata"), DIM)
+    reloaded.load()
+    row = reloaded.metadata_store.row_for_chunk("A__1")
+    assert reloaded.metadata_store.row(row)["text"] == "A version 2 chunk 1"
+
+
+def test_doc_continued_across_appends(store):
+    vectors, rows = chunks("A", 4, 1)
+    store.add(vectors[:2], rows[:2])
+    store.add(vectors[2:], rows[2:])
+    metadata = store.metadata_store
+    assert [metadata.row_for_chunk(f"A__{i}") for i in range(4)] == [0, 1, 2, 3]
+
+
+def test_pinned_view_keeps_its_deletes(store, tmp_path):
+    from index_store import IndexStore
+    store.add(*chunks("A", 2, 1))
+    store.add(*chunks("B", 1, 1))
+    pinned = store.snapshot().metadata
+    store.add(*chunks("A", 2, 2), replace_doc_ids=["A"])
+    current = store.snapshot().metadata
+    rows = np.arange(3)
+    assert pinned.live_mask(rows).tolist() == [True, True, True]
+    assert not pinned.is_deleted(0)
+    assert pinned.rows_matching({"doc_id": ["A"]}).tolist() == [0, 1]
+    assert pinned.row_for_chunk("A__1") == 1
+    assert current.live_mask(rows).tolist() == [False, False, True]
+    assert current.rows_matching({"doc_id": ["A"]}).tolist() == [3, 4]
+    reloaded = IndexStore(str(tmp_path / "faiss_index.bin"), str(tmp_path / "metadata"), DIM)
+    reloaded.load()
+    assert reloaded.snapshot().metadata.live_mask(rows).tolist() == [False, False, True]
+
+
+def test_pinned_view_keeps_its_shadowed_duplicates(store):
+    vectors, rows = chunks("A", 1, 1)
+    store.add(vectors, rows)
+    _, dup = chunks("B", 1, 1)
+    dup[0]["duplicate_of"] = 0
+    store.add(vectors, dup)
+    pinned = store.snapshot().metadata
+    store.add(np.empty((0, DIM), dtype=np.float32), [], replace_doc_ids=["A"])  # B is promoted in A's place
+    assert pinned.indexed_mask(np.arange(2)).tolist() == [True, False]
+    assert store.snapshot().metadata.indexed_mask(np.arange(2)).tolist() == [False, True]
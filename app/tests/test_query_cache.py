@@ -0,0 +1,18 @@
+# app/tests/test_query_cache.py
+
+import numpy as np
+from query_cache import AnswerCache
+
+
+def test_answer_cache_only_moves_forward():
+    cache = AnswerCache()
+    emb = np.ones(4, dtype=np.float32)
+    cache.put("q", emb, ["a__0"], 2, "answer at v2")
+    # a request still pinned to v1 during a publish
+    assert cache.get(emb, ["a__0"], 1) is None
+    cache.put("q", emb, ["a__0"], 1, "answer at v1")
+    assert cache.get(emb, ["a__0"], 2) == "answer at v2"
+    assert cache.invalidations == 0
+
+    assert cache.get(emb, ["a__0"], 3) is None
+    assert cache.invalidations == 1 and cache.version == 3
@@ -0,0 +1,69 @@
+# app/tests/test_sync_state.py
+
+import json
+import os
+import sync_state
+from sync_state import SyncState
+
+
+def test_changes_are_logged_then_compacted(tmp_path, monkeypatch):
+    path = str(tmp_path / "sync_state.json")
+    state = SyncState(path)
+    state.record("a", "drive", "h1", "t1", 3)
+    state.checkpoint("drive", "page2", {"a"})
+    state.save()
+    state.record("b", "drive", "h2", "t1", 1)
+    state.touch("a", "t2")
+    state.checkpoint("drive", "page3", {"a", "b"})
+    state.save()
+    assert not os.path.exists(path)  # only the log so far
+
+    reloaded = SyncState(path)
+    assert reloaded.docs == state.docs
+    assert reloaded.get("a")["modified_time"] == "t2"
+    assert reloaded.seen("drive") == {"a", "b"} and reloaded.cursor("drive") == "page3"
+
+    reloaded.forget(["b"])
+    reloaded.finish_pass("drive")
+    monkeypatch.setattr(sync_state, "COMPACT_MIN_ENTRIES", 0)
+    reloaded.save()
+    assert os.path.getsize(path + ".log") == 0
+    with open(path) as fh:
+        assert json.load(fh) == {"docs": {"a": reloaded.get("a")}, "cursors": {}}
+
+
+def test_restarted_pass_replaces_seen(tmp_path):
+    path = str(tmp_path / "sync_state.json")
+    state = SyncState(path)
+    state.checkpoint("drive", None, {"a", "b"})
+    state.checkpoint("drive", "page2", {"c"})
+    state.save()
+    assert SyncState(path).seen("drive") == {"c"}
+
+
+def test_torn_log_line_is_dropped(tmp_path):
+    path = str(tmp_path / "sync_state.json")
+    state = SyncState(path)
+    state.record("a", "drive", "h1", "t1", 3)
+    state.save()
+    with open(path + ".log", "a") as fh:
+        fh.write('["record", "b"')
+    reloaded = SyncState(path)
+    assert list(reloaded.docs) == ["a"]
+    reloaded.record("c", "drive", "h3", "t1", 1)
+    reloaded.save()
+    assert sorted(SyncState(path).docs) == ["a", "c"]
+
+
+def test_touch_moves_scope_and_skips_no_ops(tmp_path):
+    path = str(tmp_path / "sync_state.json")
+    state = SyncState(path)
+    state.record("a", "drive:old", "h1", "t1", 3)
+    state.save()
+    size = os.path.getsize(path + ".log")
+    state.touch("a", "t1")
+    state.save()
+    assert os.path.getsize(path + ".log") == size  # nothing changed, nothing logged
+    state.touch("a", "t1", "drive:new")
+    state.save()
+    assert SyncState(path).docs_in_scope("drive:new") == ["a"]
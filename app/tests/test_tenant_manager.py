@@ -0,0 +1,19 @@
+# app/tests/test_tenant_manager.py
+
+import os
+import pytest
+from conftest import DIM
+from tenant_manager import TenantManager, UnknownTenant
+
+
+def test_reads_do_not_create_shards(tmp_path):
+    manager = TenantManager(str(tmp_path / "tenants"), DIM)
+    assert not manager.exists("acme")
+    with pytest.raises(UnknownTenant):
+        manager.get("acme")
+    assert not os.path.exists(tmp_path / "tenants" / "acme")
+
+    with manager.use("acme", create=True) as shard:
+        assert shard.tenant == "acme"
+    assert manager.exists("acme")
+    assert manager.get("acme") is shard
@@ -0,0 +1,37 @@
+# app/workers.py
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import contextvars
+import asyncio
+import os
+
+# ---------- Configuration ----------
+# Threads for CPU-bound query work (embedding, FAISS search). Both release the GIL.
+QUERY_CPU_WORKERS = int(os.getenv("QUERY_CPU_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Max jobs queued or running on the pool before callers wait (backpressure)
+QUERY_CPU_MAX_PENDING = int(os.getenv("QUERY_CPU_MAX_PENDING", str(QUERY_CPU_WORKERS * 4)))
+
+# Dedicated pool so query work never competes with FastAPI's default threadpool
+cpu_executor = ThreadPoolExecutor(max_workers=QUERY_CPU_WORKERS, thread_name_prefix="query-cpu")
+
+_pending = None
+
+
+def _semaphore() -> asyncio.Semaphore:
+    # created lazily so it binds to the running event loop
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(QUERY_CPU_MAX_PENDING)
+    return _pending
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the bounded CPU pool without blocking the event loop,
+    in a copy of the caller's context (so the request's trace follows it).
+    """
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(cpu_executor, partial(context.run, fn, *args, **kwargs))